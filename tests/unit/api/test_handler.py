@@ -0,0 +1,264 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+import threading
+import time
+
+import mock
+
+from zaqar.api import handler
+from zaqar.api.v1_1 import endpoints
+from zaqar.common.api import request
+from zaqar.common import errors
+from zaqar.tests import base
+
+
+class TestHandler(base.TestBase):
+
+    def setUp(self):
+        super(TestHandler, self).setUp()
+
+        self.endpoints = mock.Mock(spec=endpoints.Endpoints)
+        self.endpoints.queue_get.side_effect = lambda req: 'get'
+        self.endpoints.message_post_group.side_effect = (
+            lambda reqs: ['post'] * len(reqs))
+
+        with mock.patch.object(handler.endpoints, 'Endpoints',
+                               return_value=self.endpoints):
+            self.handler = handler.Handler(mock.Mock(), mock.Mock(),
+                                           mock.Mock())
+
+        self.headers = {'Client-ID': 'c', 'X-Project-ID': 'p'}
+
+    def _post(self, queue, client='c'):
+        return request.Request(action='message_post',
+                               body={'queue_name': queue},
+                               headers={'Client-ID': client,
+                                        'X-Project-ID': 'p'})
+
+    def test_process_batch_groups_posts(self):
+        reqs = [self._post('a'), self._post('b'), self._post('a'),
+                self._post('a', client='other')]
+        resps = self.handler.process_batch(reqs)
+
+        self.assertEqual(['post'] * 4, resps)
+
+        groups = [call[0][0]
+                  for call in self.endpoints.message_post_group.call_args_list]
+        self.assertEqual([[reqs[0], reqs[2]], [reqs[1]], [reqs[3]]], groups)
+
+    def test_process_batch_checks_headers_of_posts(self):
+        headerless = request.Request(action='message_post',
+                                     body={'queue_name': 'a'})
+        reqs = [self._post('a'), headerless, self._post('a')]
+        resps = self.handler.process_batch(reqs)
+
+        self.assertEqual('post', resps[0])
+        self.assertEqual(400, resps[1]._headers['status'])
+        self.assertIn('Missing header', resps[1]._body['error'])
+        self.assertEqual('post', resps[2])
+        self.endpoints.message_post_group.assert_called_once_with(
+            [reqs[0], reqs[2]])
+
+    def test_process_batch_keeps_order(self):
+        reqs = [self._post('a'),
+                request.Request(action='queue_get', headers=self.headers),
+                self._post('a')]
+        resps = self.handler.process_batch(reqs)
+
+        self.assertEqual(['post', 'get', 'post'], resps)
+        self.assertEqual(2, self.endpoints.message_post_group.call_count)
+
+    def test_process_request_dispatches(self):
+        req = request.Request(action='queue_get', headers=self.headers)
+        self.assertEqual('get', self.handler.process_request(req))
+
+    def test_unknown_action(self):
+        for req in (request.Request(action='queue_frobnicate'),
+                    request.Request(action=None),
+                    request.Request(action='queue_get', api='v9')):
+            resp = self.handler.process_request(req)
+            self.assertEqual(400, resp._headers['status'])
+
+        self.assertFalse(self.endpoints.queue_get.called)
+
+    def test_missing_headers(self):
+        req = request.Request(action='queue_get',
+                              headers={'Client-ID': 'c'})
+        resp = self.handler.process_request(req)
+
+        self.assertEqual(400, resp._headers['status'])
+        self.assertIn('X-Project-ID', resp._body['error'])
+        self.assertFalse(self.endpoints.queue_get.called)
+
+    def test_actions_without_endpoint(self):
+        req = request.Request(action='authenticate', headers=self.headers)
+        resp = self.handler.process_request(req)
+        self.assertEqual(400, resp._headers['status'])
+
+    def test_validate(self):
+        document = {'action': 'queue_get', 'headers': self.headers,
+                    'body': {'queue_name': 'q'}}
+        self.assertTrue(self.handler.validate(document))
+
+        del document['body']
+        self.assertFalse(self.handler.validate(document))
+
+        self.assertRaises(errors.InvalidAction, self.handler.validate,
+                          {'action': 'queue_frobnicate'})
+
+
+class TestClaimLeases(base.TestBase):
+
+    def setUp(self):
+        super(TestClaimLeases, self).setUp()
+        self.storage = mock.Mock()
+        self.storage.claim_controller.create.return_value = (
+            'c1', [{'id': 'm1', 'ttl': 60, 'age': 0, 'body': {}}])
+        self.handler = handler.Handler(self.storage, mock.Mock(), mock.Mock())
+
+        # Passes are run by the tests rather than by the thread.
+        self.handler._leases._thread = mock.Mock()
+
+    def _claim(self, connection, **body):
+        body['queue_name'] = 'q'
+        req = request.Request(action='claim_create', body=body,
+                              headers={'Client-ID': 'c', 'X-Project-ID': 'p'},
+                              connection=connection)
+        return self.handler.process_request(req)
+
+    def test_renewed_claim_is_released_on_close(self):
+        resp = self._claim('conn', renew=True)
+        self.assertEqual(201, resp._headers['status'])
+        self.assertEqual('c1', resp._body['claim_id'])
+        self.assertEqual(1, len(self.handler._leases))
+
+        self.handler.connection_closed('conn')
+        self.handler._leases.run_once(0)
+        self.storage.claim_controller.delete.assert_called_once_with(
+            'q', claim_id='c1', project='p')
+
+    def test_claims_are_not_renewed_by_default(self):
+        self._claim('conn')
+        self.assertEqual(0, len(self.handler._leases))
+
+    def test_renewed_claim_requires_connection(self):
+        resp = self._claim(None, renew=True)
+        self.assertEqual(400, resp._headers['status'])
+        self.assertFalse(self.storage.claim_controller.create.called)
+
+
+class TestLongPoll(base.TestBase):
+
+    def setUp(self):
+        super(TestLongPoll, self).setUp()
+        self.storage = mock.Mock()
+        self.handler = handler.Handler(self.storage, mock.Mock(), mock.Mock())
+        self.claimed = [{'id': 'm1', 'ttl': 60, 'age': 0, 'body': {}}]
+
+    def _claim(self, wait):
+        req = request.Request(action='claim_create',
+                              body={'queue_name': 'q', 'wait': wait},
+                              headers={'Client-ID': 'c', 'X-Project-ID': 'p'})
+        return self.handler.process_request(req)
+
+    def test_post_wakes_waiting_claim(self):
+        results = [(None, []), ('c1', self.claimed)]
+        self.storage.claim_controller.create.side_effect = (
+            lambda *args, **kwargs: results.pop(0))
+
+        def post():
+            time.sleep(0.1)
+            self.handler._fanout.notify('p', 'q', self.claimed)
+
+        poster = threading.Thread(target=post)
+        poster.start()
+        started = time.time()
+        resp = self._claim(wait=10)
+        poster.join()
+
+        self.assertEqual(201, resp._headers['status'])
+        self.assertTrue(time.time() - started < 5)
+        self.assertEqual(2, self.storage.claim_controller.create.call_count)
+        self.assertFalse(self.handler._fanout.has_subscribers('p', 'q'))
+
+    def test_wait_expires(self):
+        self.storage.claim_controller.create.return_value = (None, [])
+
+        started = time.time()
+        resp = self._claim(wait=1)
+
+        self.assertEqual(204, resp._headers['status'])
+        self.assertTrue(time.time() - started >= 1)
+        self.assertFalse(self.handler._fanout.has_subscribers('p', 'q'))
+
+    def test_no_wait(self):
+        self.storage.claim_controller.create.return_value = (None, [])
+
+        resp = self._claim(wait=0)
+        self.assertEqual(204, resp._headers['status'])
+        self.assertEqual(1, self.storage.claim_controller.create.call_count)
+
+
+class TestRateLimiting(base.TestBase):
+
+    def setUp(self):
+        super(TestRateLimiting, self).setUp()
+        self.endpoints = mock.Mock(spec=endpoints.Endpoints)
+        self.endpoints.message_list.side_effect = lambda req: 'list'
+        self.endpoints.message_post_group.side_effect = (
+            lambda reqs: ['post'] * len(reqs))
+
+        self.limiter = mock.Mock()
+        self.limiter.check.return_value = 0
+
+        with mock.patch.object(handler.endpoints, 'Endpoints',
+                               return_value=self.endpoints):
+            self.handler = handler.Handler(mock.Mock(), mock.Mock(),
+                                           mock.Mock(), limiter=self.limiter)
+
+    def _request(self, action):
+        return request.Request(action=action, body={'queue_name': 'q'},
+                               headers={'Client-ID': 'c',
+                                        'X-Project-ID': 'p'},
+                               connection='conn')
+
+    def test_throttled_request(self):
+        self.assertEqual('list', self.handler.process_request(
+            self._request('message_list')))
+        self.limiter.check.assert_called_once_with('message_list', 'p',
+                                                   'conn')
+
+        self.limiter.check.return_value = 0.5
+        resp = self.handler.process_request(self._request('message_list'))
+
+        self.assertEqual(429, resp._headers['status'])
+        self.assertEqual(0.5, resp._body['retry_after'])
+        self.assertEqual(1, self.endpoints.message_list.call_count)
+
+    def test_throttled_batch_posts(self):
+        self.limiter.check.side_effect = [0, 1, 0]
+        reqs = [self._request('message_post') for _i in range(3)]
+
+        resps = self.handler.process_batch(reqs)
+
+        self.assertEqual('post', resps[0])
+        self.assertEqual(429, resps[1]._headers['status'])
+        self.assertEqual('post', resps[2])
+        self.endpoints.message_post_group.assert_called_once_with(
+            [reqs[0], reqs[2]])
+
+    def test_connection_closed_releases_buckets(self):
+        self.handler.connection_closed('conn')
+        self.limiter.release.assert_called_once_with('conn')
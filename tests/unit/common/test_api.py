@@ -55,3 +55,24 @@ class TestApi(base.TestBase):
     def test_invalid_operation(self):
         self.assertRaises(errors.InvalidAction, self.api.validate,
                           'super_secret_op', {})
+
+    def test_invalid_type(self):
+        self.assertFalse(self.api.validate('test_operation',
+                                           {'name': 42}))
+
+    def test_validators_are_compiled(self):
+        self.assertIn('test_operation', self.api.validators)
+
+    def test_validators_not_shared(self):
+
+        class OtherApi(api.Api):
+            schema = {
+                'test_operation': {
+                    'properties': {'name': {'type': 'integer'}}
+                }
+            }
+
+        other = OtherApi()
+        self.assertTrue(other.validate('test_operation', {'name': 42}))
+        self.assertFalse(self.api.validate('test_operation',
+                                           {'name': 42}))
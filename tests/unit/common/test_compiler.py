@@ -0,0 +1,79 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import ddt
+
+from zaqar.api.v1_1 import request
+from zaqar.common.api import compiler
+from zaqar.tests import base
+
+
+@ddt.ddt
+class TestCompiler(base.TestBase):
+
+    schema = {
+        'type': 'object',
+        'properties': {
+            'name': {'type': 'string', 'pattern': '^[a-z]+$'},
+            'ttl': {'type': 'integer', 'minimum': 60},
+            'tags': {'type': 'array', 'items': {'type': 'string'},
+                     'maxItems': 2},
+            'kind': {'enum': ['a', 'b']},
+        },
+        'required': ['name'],
+        'additionalProperties': False,
+    }
+
+    def setUp(self):
+        super(TestCompiler, self).setUp()
+        self.validate = compiler.compile_schema(self.schema)
+
+    @ddt.data(
+        {'name': 'abc'},
+        {'name': 'abc', 'ttl': 60, 'tags': ['x', 'y'], 'kind': 'b'},
+    )
+    def test_valid(self, document):
+        self.assertTrue(self.validate(document))
+
+    @ddt.data(
+        {},
+        [],
+        {'name': 'ABC'},
+        {'name': 'abc', 'ttl': 59},
+        {'name': 'abc', 'ttl': True},
+        {'name': 'abc', 'tags': ['x', 1]},
+        {'name': 'abc', 'tags': ['x', 'y', 'z']},
+        {'name': 'abc', 'kind': 'c'},
+        {'name': 'abc', 'extra': 1},
+    )
+    def test_invalid(self, document):
+        self.assertFalse(self.validate(document))
+
+    def test_unsupported_keywords_fall_back(self):
+        validate = compiler.compile_schema({'type': 'number',
+                                            'multipleOf': 2})
+        self.assertTrue(validate(4))
+        self.assertFalse(validate(3))
+
+    def test_request_schema(self):
+        schema = request.RequestSchema()
+        frame = {'action': 'queue_create',
+                 'headers': {'Client-ID': 'abc', 'X-Project-ID': 'p'},
+                 'body': {'queue_name': 'q'}}
+
+        self.assertTrue(schema.validate('queue_create', frame))
+
+        del frame['body']
+        self.assertFalse(schema.validate('queue_create', frame))
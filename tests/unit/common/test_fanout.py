@@ -0,0 +1,79 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from zaqar.common.api import fanout
+from zaqar.tests import base
+
+
+class TestFanoutRegistry(base.TestBase):
+
+    def setUp(self):
+        super(TestFanoutRegistry, self).setUp()
+        self.registry = fanout.Registry()
+        self.received = []
+
+    def _callback(self, name):
+        return lambda messages: self.received.append((name, messages))
+
+    def test_notify_without_subscribers(self):
+        self.assertFalse(self.registry.has_subscribers('p', 'q'))
+        self.assertEqual(0, self.registry.notify('p', 'q', [1]))
+
+    def test_notify_subscribers(self):
+        self.registry.subscribe('p', 'q', 'a', self._callback('a'))
+        self.registry.subscribe('p', 'q', 'b', self._callback('b'))
+        self.registry.subscribe('p', 'other', 'c', self._callback('c'))
+
+        self.assertEqual(2, self.registry.notify('p', 'q', [1]))
+        self.assertEqual([('a', [1]), ('b', [1])], sorted(self.received))
+
+    def test_failing_callback_does_not_stop_others(self):
+        def fail(messages):
+            raise RuntimeError()
+
+        self.registry.subscribe('p', 'q', 'a', fail)
+        self.registry.subscribe('p', 'q', 'b', self._callback('b'))
+
+        self.assertEqual(2, self.registry.notify('p', 'q', [1]))
+        self.assertEqual([('b', [1])], self.received)
+
+    def test_unsubscribe(self):
+        self.registry.subscribe('p', 'q', 'a', self._callback('a'))
+
+        self.assertTrue(self.registry.unsubscribe('p', 'q', 'a'))
+        self.assertFalse(self.registry.unsubscribe('p', 'q', 'a'))
+        self.assertFalse(self.registry.has_subscribers('p', 'q'))
+
+    def test_remove_owner(self):
+        self.registry.subscribe('p', 'q1', 'a', self._callback('a'))
+        self.registry.subscribe('p', 'q2', 'a', self._callback('a'))
+        self.registry.subscribe('p', 'q2', 'b', self._callback('b'))
+
+        self.registry.remove('a')
+
+        self.assertFalse(self.registry.has_subscribers('p', 'q1'))
+        self.assertEqual(1, self.registry.notify('p', 'q2', [1]))
+        self.assertEqual([('b', [1])], self.received)
+
+    def test_subscribe_after_remove(self):
+        # The subscription completed while its connection was closing
+        self.registry.remove('a')
+
+        self.assertFalse(self.registry.subscribe('p', 'q', 'a',
+                                                 self._callback('a')))
+        self.assertFalse(self.registry.has_subscribers('p', 'q'))
+
+        self.assertTrue(self.registry.subscribe('p', 'q', 'b',
+                                                self._callback('b')))
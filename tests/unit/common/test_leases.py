@@ -0,0 +1,108 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+import time
+
+import mock
+
+from zaqar.common.api import leases
+from zaqar.storage import errors as storage_errors
+from zaqar.tests import base
+
+
+class TestLeaseKeeper(base.TestBase):
+
+    def setUp(self):
+        super(TestLeaseKeeper, self).setUp()
+        self.controller = mock.Mock()
+        self.keeper = leases.Keeper(self.controller)
+
+        # Passes are run by the tests rather than by the thread.
+        self.keeper._thread = mock.Mock()
+
+        self.metadata = {'ttl': 60, 'grace': 30}
+
+    def test_renews_when_half_the_ttl_elapsed(self):
+        self.keeper.hold('a', 'p', 'q', 'c1', self.metadata)
+        now = time.time()
+
+        self.keeper.run_once(now)
+        self.assertFalse(self.controller.update.called)
+
+        timeout = self.keeper.run_once(now + 31)
+        self.controller.update.assert_called_once_with(
+            'q', claim_id='c1', metadata=self.metadata, project='p')
+        self.assertTrue(timeout > 25)
+
+    def test_update_changes_the_renewal(self):
+        self.keeper.hold('a', 'p', 'q', 'c1', self.metadata)
+        self.keeper.update('p', 'q', 'c1', {'ttl': 120, 'grace': 30})
+
+        self.keeper.run_once(time.time() + 31)
+        self.assertFalse(self.controller.update.called)
+
+    def test_remove_releases_claims(self):
+        self.keeper.hold('a', 'p', 'q', 'c1', self.metadata)
+        self.keeper.hold('a', 'p', 'q', 'c2', self.metadata)
+        self.keeper.hold('b', 'p', 'q', 'c3', self.metadata)
+
+        self.keeper.remove('a')
+        self.assertEqual(1, len(self.keeper))
+
+        self.keeper.run_once(time.time())
+        deleted = sorted(call[1]['claim_id']
+                         for call in self.controller.delete.call_args_list)
+        self.assertEqual(['c1', 'c2'], deleted)
+
+        self.keeper.run_once(time.time())
+        self.assertEqual(2, self.controller.delete.call_count)
+
+    def test_hold_after_remove_releases_claim(self):
+        # The claim was created while its connection was being closed
+        self.keeper.remove('a')
+        self.keeper.hold('a', 'p', 'q', 'c1', self.metadata)
+        self.assertEqual(0, len(self.keeper))
+
+        self.keeper.run_once(time.time() + 31)
+        self.controller.delete.assert_called_once_with(
+            'q', claim_id='c1', project='p')
+        self.assertFalse(self.controller.update.called)
+
+    def test_forget_stops_renewing(self):
+        self.keeper.hold('a', 'p', 'q', 'c1', self.metadata)
+        self.keeper.forget('p', 'q', 'c1')
+        self.keeper.remove('a')
+
+        self.keeper.run_once(time.time() + 31)
+        self.assertFalse(self.controller.update.called)
+        self.assertFalse(self.controller.delete.called)
+
+    def test_expired_claim_is_dropped(self):
+        self.controller.update.side_effect = storage_errors.ClaimDoesNotExist(
+            'c1', 'q', 'p')
+        self.keeper.hold('a', 'p', 'q', 'c1', self.metadata)
+
+        self.keeper.run_once(time.time() + 31)
+        self.assertEqual(0, len(self.keeper))
+
+    def test_failed_renewal_is_retried(self):
+        self.controller.update.side_effect = RuntimeError()
+        self.keeper.hold('a', 'p', 'q', 'c1', self.metadata)
+        now = time.time() + 31
+
+        self.keeper.run_once(now)
+        self.assertEqual(1, len(self.keeper))
+
+        self.keeper.run_once(now + 2)
+        self.assertEqual(2, self.controller.update.call_count)
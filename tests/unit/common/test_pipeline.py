@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import mock
+
 from zaqar.common import pipeline
 from zaqar.tests import base
 
@@ -93,3 +95,116 @@ class TestPipeLine(base.TestBase):
 
         with ctxt as consumer:
             self.assertIsNone(consumer())
+
+    def test_single_stage_is_called_directly(self):
+        first = FirstClass()
+        pipe = pipeline.Pipeline([object(), first])
+
+        self.assertEqual(first.with_args, pipe.with_args)
+
+    def test_stages_are_resolved_once(self):
+        stage = mock.Mock(spec=['does_nothing'])
+        stage.does_nothing.return_value = None
+        pipe = pipeline.Pipeline([stage, SecondClass()])
+
+        with mock.patch.object(pipeline, 'LOG') as log:
+            for _i in range(3):
+                self.assertIsNone(pipe.does_nothing())
+                self.assertTrue(pipe.calls_the_latest())
+
+        self.assertEqual(3, stage.does_nothing.call_count)
+
+        # Looking the method up on the stage lacking it is logged
+        # when the consumer is built only.
+        self.assertEqual(1, log.debug.call_count)
+        self.assertFalse(log.warning.called)
+
+    def test_append_rebuilds_consumers(self):
+        pipe = pipeline.Pipeline([FirstClass()])
+        self.assertIsNone(pipe.calls_the_latest())
+
+        pipe.append(SecondClass())
+        self.assertTrue(pipe.calls_the_latest())
+
+
+class Observer(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def with_args(self, result, name):
+        self.calls.append((result, name))
+
+    def gen(self, result):
+        self.calls.append(result)
+
+    def fails(self, result):
+        raise RuntimeError()
+
+
+class TestObservers(base.TestBase):
+
+    def setUp(self):
+        super(TestObservers, self).setUp()
+        self.queue = pipeline.ObserverQueue(maxsize=2)
+
+        # Calls are made by run_once() rather than by a thread
+        self.queue._thread = mock.Mock()
+
+        self.observer = Observer()
+        self.stage = mock.Mock(spec=['with_args', 'gen', 'fails'])
+        self.pipeline = pipeline.Pipeline([self.stage],
+                                          observers=[self.observer],
+                                          queue=self.queue)
+
+    def test_observers_are_notified_later(self):
+        self.stage.with_args.return_value = 'James'
+
+        self.assertEqual('James', self.pipeline.with_args('Bond'))
+        self.assertEqual([], self.observer.calls)
+
+        self.assertTrue(self.queue.run_once(block=False))
+        self.assertEqual([('James', 'Bond')], self.observer.calls)
+        self.assertFalse(self.queue.run_once(block=False))
+
+    def test_generators_are_not_passed(self):
+        self.stage.gen.return_value = (i for i in range(3))
+
+        result = self.pipeline.gen()
+        self.queue.run_once(block=False)
+
+        self.assertEqual([0, 1, 2], list(result))
+        self.assertEqual([None], self.observer.calls)
+
+    def test_failures_are_counted(self):
+        self.pipeline.fails()
+        self.queue.run_once(block=False)
+
+        self.assertEqual(1, self.queue.submitted)
+        self.assertEqual(1, self.queue.failed)
+
+    def test_calls_are_dropped_when_full(self):
+        with mock.patch.object(pipeline, 'LOG') as log:
+            for name in ('a', 'b', 'c', 'd'):
+                self.pipeline.with_args(name)
+
+        self.assertEqual(2, len(self.queue))
+        self.assertEqual(2, self.queue.submitted)
+        self.assertEqual(2, self.queue.dropped)
+        self.assertEqual(1, log.warning.call_count)
+
+        while self.queue.run_once(block=False):
+            pass
+
+        self.assertEqual(['a', 'b'],
+                         [name for _res, name in self.observer.calls])
+
+    def test_background_thread(self):
+        queue = pipeline.ObserverQueue()
+        pipe = pipeline.Pipeline([self.stage], observers=[self.observer],
+                                 queue=queue)
+
+        pipe.with_args('Bond')
+        queue.join()
+
+        self.assertEqual(1, len(self.observer.calls))
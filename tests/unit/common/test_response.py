@@ -0,0 +1,40 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+from zaqar.common.api import request
+from zaqar.common.api import response
+from zaqar.tests import base
+
+
+class TestResponse(base.TestBase):
+
+    def test_response_echoes_request_id(self):
+        req = request.Request(action='queue_list', request_id='42')
+        resp = response.Response(req, {'queues': []}, {'status': 200})
+
+        data = json.loads(resp.to_json())
+        self.assertEqual({'action': 'queue_list', 'request_id': '42'},
+                         data['request'])
+        self.assertEqual({'queues': []}, data['body'])
+        self.assertEqual({'status': 200}, data['headers'])
+
+    def test_response_without_request_id(self):
+        req = request.Request(action='queue_list')
+        resp = response.Response(req, {}, {'status': 204})
+
+        data = json.loads(resp.to_json())
+        self.assertEqual({'action': 'queue_list'}, data['request'])
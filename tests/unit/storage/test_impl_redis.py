@@ -17,15 +17,20 @@ import time
 import uuid
 
 import mock
+import msgpack
+from oslo_utils import encodeutils
 from oslo_utils import timeutils
 import redis
+import six
 
 from zaqar.common import errors
+from zaqar.common import raw
 from zaqar.openstack.common.cache import cache as oslo_cache
 from zaqar import storage
 from zaqar.storage.redis import controllers
 from zaqar.storage.redis import driver
 from zaqar.storage.redis import messages
+from zaqar.storage.redis import models
 from zaqar.storage.redis import options
 from zaqar.storage.redis import utils
 from zaqar import tests as testing
@@ -152,6 +157,22 @@ class RedisUtilsTest(testing.TestBase):
         self.assertEqual(basic_msg['body'], body)
         self.assertEqual(basic_msg['ttl'], msg.ttl)
 
+    def test_raw_message_body(self):
+        body = {'event': 'ping', 'unicode': u'ab\u00e7'}
+        msg = _create_sample_message(body=body)
+
+        hmap = dict((key.encode('utf-8'), encodeutils.safe_encode(
+            value) if isinstance(value, six.string_types) else value)
+            for key, value in models._msgenv_to_hmap(msg).items())
+        hmap[b'b'] = msgpack.packb(body, use_bin_type=True)
+
+        raw_msg = messages.Message.from_hmap(hmap, raw_body=True)
+        self.assertIsInstance(raw_msg.body, raw.RawBody)
+        self.assertEqual(hmap[b'b'], raw_msg.body.data)
+        self.assertEqual(body, raw_msg.body.decode())
+
+        self.assertEqual(body, messages.Message.from_hmap(hmap).body)
+
     def test_retries_on_connection_error(self):
         num_calls = [0]
 
@@ -0,0 +1,109 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+import mock
+from oslo_config import cfg
+
+from zaqar.openstack.common.cache import cache as oslo_cache
+from zaqar import storage
+from zaqar.storage import errors
+from zaqar.tests import base
+
+
+class QueueController(storage.Queue):
+    """Queue controller keeping queues in a dict."""
+
+    def __init__(self, driver):
+        super(QueueController, self).__init__(driver)
+        self.queues = {}
+        self.calls = []
+
+    def _list(self, project=None, marker=None, limit=10, detailed=False):
+        raise NotImplementedError()
+
+    def _get(self, name, project=None):
+        self.calls.append('get')
+        try:
+            return self.queues[(project, name)]
+        except KeyError:
+            raise errors.QueueDoesNotExist(name, project)
+
+    def _create(self, name, metadata=None, project=None):
+        created = (project, name) not in self.queues
+        self.queues[(project, name)] = metadata or {}
+        return created
+
+    def _exists(self, name, project=None):
+        self.calls.append('exists')
+        return (project, name) in self.queues
+
+    def _set_metadata(self, name, metadata, project=None):
+        self.queues[(project, name)] = metadata
+
+    def _delete(self, name, project=None):
+        self.queues.pop((project, name), None)
+
+    def _stats(self, name, project=None):
+        raise NotImplementedError()
+
+
+class TestQueueCache(base.TestBase):
+
+    def setUp(self):
+        super(TestQueueCache, self).setUp()
+
+        conf = cfg.ConfigOpts()
+        oslo_cache.register_oslo_configs(conf)
+        driver = mock.Mock(cache=oslo_cache.get_cache(conf.cache_url))
+
+        self.controller = QueueController(driver)
+
+    def test_existence_is_cached(self):
+        self.assertFalse(self.controller.exists('q', 'p'))
+        self.assertTrue(self.controller.create('q', project='p'))
+
+        # Missing queues aren't cached, so they show up once created
+        for _i in range(3):
+            self.assertTrue(self.controller.exists('q', project='p'))
+
+        self.assertEqual(['exists', 'exists'], self.controller.calls)
+
+        self.controller.delete('q', project='p')
+        self.assertFalse(self.controller.exists('q', 'p'))
+
+    def test_metadata_is_cached(self):
+        self.controller.create('q', metadata={'a': 1}, project='p')
+
+        for _i in range(3):
+            self.assertEqual({'a': 1}, self.controller.get('q', 'p'))
+
+        self.assertEqual(['get'], self.controller.calls)
+
+        self.controller.set_metadata('q', {'a': 2}, project='p')
+        self.assertEqual({'a': 2}, self.controller.get('q', project='p'))
+
+        self.controller.create('q', metadata={'a': 3}, project='p')
+        self.assertEqual({'a': 3}, self.controller.get('q', project='p'))
+
+        self.controller.delete('q', project='p')
+        self.assertRaises(errors.QueueDoesNotExist,
+                          self.controller.get, 'q', 'p')
+
+    def test_without_cache(self):
+        controller = QueueController(None)
+        controller.create('q', project='p')
+
+        self.assertTrue(controller.exists('q', 'p'))
+        self.assertTrue(controller.exists('q', 'p'))
+        self.assertEqual(['exists', 'exists'], controller.calls)
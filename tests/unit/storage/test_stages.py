@@ -0,0 +1,393 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+import threading
+
+import mock
+from oslo_config import cfg
+
+from zaqar import common
+from zaqar.storage import errors
+from zaqar.storage import pipeline
+from zaqar.storage.stages import caching
+from zaqar.storage.stages import coalescing
+from zaqar.tests import base
+
+
+class TestPostCoalescer(base.TestBase):
+
+    def setUp(self):
+        super(TestPostCoalescer, self).setUp()
+
+        self.downstream = mock.Mock()
+        self.downstream.post.side_effect = (
+            lambda queue, messages, client_uuid, project:
+            [m['body'] for m in messages])
+
+        self.conf.register_opts(coalescing._COALESCING_OPTIONS,
+                                group=coalescing._COALESCING_GROUP)
+
+    def _stage(self, **kwargs):
+        self.config(group=coalescing._COALESCING_GROUP, **kwargs)
+        stage = coalescing.PostCoalescer()
+        stage.bind(self.conf, self.downstream)
+        return stage
+
+    def _post_concurrently(self, stage, posts):
+        results = [None] * len(posts)
+
+        def post(index, queue, bodies):
+            results[index] = stage.post(
+                queue, [{'ttl': 60, 'body': b} for b in bodies],
+                client_uuid='c', project='p')
+
+        threads = [threading.Thread(target=post, args=(i,) + args)
+                   for i, args in enumerate(posts)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return results
+
+    def _hold_first_post(self, stage):
+        """Starts a post held in storage until the returned event is set."""
+
+        storing, release = threading.Event(), threading.Event()
+        post = self.downstream.post.side_effect
+
+        def hold(queue, messages, client_uuid, project):
+            if messages[0]['body'] == 0:
+                storing.set()
+                release.wait()
+            return post(queue, messages, client_uuid, project)
+
+        self.downstream.post.side_effect = hold
+
+        thread = threading.Thread(target=stage.post,
+                                  args=('q', [{'ttl': 60, 'body': 0}], 'c'),
+                                  kwargs={'project': 'p'})
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+
+        storing.wait()
+        return release
+
+    def test_uncontended_posts_are_not_delayed(self):
+        stage = self._stage(window=10)
+
+        for body in (1, 2):
+            self.assertEqual([body], stage.post(
+                'q', [{'ttl': 60, 'body': body}], 'c', project='p'))
+
+        self.assertEqual(2, self.downstream.post.call_count)
+
+    def test_concurrent_posts_are_batched(self):
+        stage = self._stage(window=10, max_messages=4)
+        release = self._hold_first_post(stage)
+
+        results = self._post_concurrently(stage, [('q', [1]),
+                                                  ('q', [2, 3]),
+                                                  ('q', [4])])
+        release.set()
+
+        self.assertEqual(2, self.downstream.post.call_count)
+        self.assertEqual([[1], [2, 3], [4]],
+                         sorted(results, key=lambda ids: ids[0]))
+
+    def test_queues_are_batched_apart(self):
+        stage = self._stage(window=0.01)
+
+        results = self._post_concurrently(stage, [('q1', [1]), ('q2', [2])])
+
+        self.assertEqual(2, self.downstream.post.call_count)
+        self.assertEqual([[1], [2]], results)
+
+    def test_errors_are_raised_to_every_caller(self):
+        stage = self._stage(window=10, max_messages=2)
+        release = self._hold_first_post(stage)
+        self.downstream.post.side_effect = errors.QueueDoesNotExist('q',
+                                                                    'p')
+        failures = []
+
+        def post():
+            try:
+                stage.post('q', [{'ttl': 60, 'body': 1}], 'c', project='p')
+            except errors.QueueDoesNotExist as ex:
+                failures.append(ex)
+
+        threads = [threading.Thread(target=post) for _i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        release.set()
+
+        self.assertEqual(2, len(failures))
+        self.assertIsNot(failures[0], failures[1])
+        self.assertEqual(failures[0].args, failures[1].args)
+
+    def test_max_messages_below_one(self):
+        stage = self._stage(window=10, max_messages=0)
+        release = self._hold_first_post(stage)
+
+        self.assertEqual([[1]], self._post_concurrently(stage, [('q', [1])]))
+        release.set()
+
+    def test_bound_by_storage_pipeline(self):
+        stage = coalescing.PostCoalescer()
+        controller = mock.Mock(spec=['post'])
+        controller.post.return_value = ['id']
+
+        with mock.patch.object(pipeline, '_load_stages',
+                               return_value=[stage]):
+            pipe = pipeline._get_storage_pipeline('message', self.conf,
+                                                  controller)
+
+        self.assertEqual(['id'], pipe.post('q', [{'ttl': 60, 'body': 1}],
+                                           client_uuid='c', project='p'))
+        self.assertEqual(1, controller.post.call_count)
+
+
+class _Messages(object):
+    """Message controller keeping messages in a dict."""
+
+    def __init__(self):
+        self.messages = {}
+        self.calls = []
+
+    def get(self, queue, message_id, project=None):
+        self.calls.append('get')
+        try:
+            return dict(self.messages[message_id])
+        except KeyError:
+            raise errors.MessageDoesNotExist(message_id, queue, project)
+
+    def bulk_get(self, queue, message_ids, project=None):
+        self.calls.append('bulk_get')
+        return (dict(self.messages[mid]) for mid in message_ids
+                if mid in self.messages)
+
+    def list(self, queue, project=None, marker=None, limit=10, echo=False,
+             client_uuid=None, include_claimed=False):
+        self.calls.append('list')
+        ids = sorted(mid for mid in self.messages
+                     if marker is None or mid > marker)[:limit]
+
+        yield iter([dict(self.messages[mid]) for mid in ids])
+        yield ids[-1]
+
+    def post(self, queue, messages, client_uuid, project=None):
+        self.calls.append('post')
+        ids = []
+        for message in messages:
+            mid = str(len(self.messages)).zfill(4)
+            self.messages[mid] = {'id': mid, 'age': 0,
+                                  'ttl': message['ttl'],
+                                  'body': message['body'],
+                                  'claim_id': None}
+            ids.append(mid)
+
+        return ids
+
+    def delete(self, queue, message_id, project=None, claim=None):
+        self.calls.append('delete')
+        self.messages.pop(message_id, None)
+
+
+class TestMessageCache(base.TestBase):
+
+    def setUp(self):
+        super(TestMessageCache, self).setUp()
+
+        self.now = 1000.0
+        patcher = mock.patch.object(caching.time, 'time',
+                                    side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.controller = _Messages()
+        self.cache = self._stage(max_age=10)
+
+        self.claims = caching.ClaimInvalidation()
+        self.claims.bind(self.cache._cache._conf, mock.Mock())
+
+    def _stage(self, **kwargs):
+        # Stages share their cache by configuration
+        conf = cfg.ConfigOpts()
+        conf.register_opts(caching._MESSAGE_CACHE_OPTIONS,
+                           group=caching._MESSAGE_CACHE_GROUP)
+        for name, value in kwargs.items():
+            conf.set_override(name, value, caching._MESSAGE_CACHE_GROUP)
+
+        stage = caching.MessageCache()
+        stage.bind(conf, common.Pipeline([self.controller]))
+        return stage
+
+    def _post(self, *bodies):
+        return self.cache.post('q', [{'ttl': 60, 'body': b} for b in bodies],
+                               client_uuid='c', project='p')
+
+    def _list(self, **kwargs):
+        results = self.cache.list('q', project='p', **kwargs)
+        return list(next(results)), next(results)
+
+    def test_posted_messages_are_served(self):
+        mid, = self._post('a')
+        self.now += 5
+
+        message = self.cache.get('q', mid, project='p')
+
+        self.assertEqual({'id': mid, 'age': 5, 'ttl': 60, 'body': 'a',
+                          'claim_id': None}, message)
+        self.assertEqual(['post'], self.controller.calls)
+
+    def test_read_through(self):
+        mid = self.controller.post('q', [{'ttl': 60, 'body': 'a'}],
+                                   'c', project='p')[0]
+
+        for _i in range(3):
+            self.assertEqual('a', self.cache.get('q', mid, 'p')['body'])
+
+        self.assertEqual(['post', 'get'], self.controller.calls)
+
+    def test_entries_expire(self):
+        mid, = self._post('a')
+
+        self.now += 11
+        self.cache.get('q', mid, project='p')
+        self.assertEqual(['post', 'get'], self.controller.calls)
+
+        # Messages past their TTL are never served
+        cache = self._stage(max_age=120)
+        mid, = cache.post('q', [{'ttl': 60, 'body': 'b'}], 'c', project='p')
+
+        self.now += 61
+        del self.controller.messages[mid]
+        self.assertRaises(errors.MessageDoesNotExist,
+                          cache.get, 'q', mid, project='p')
+
+    def test_bulk_get_fetches_missing_messages(self):
+        cached, = self._post('a')
+        uncached = self.controller.post('q', [{'ttl': 60, 'body': 'b'}],
+                                        'c', project='p')[0]
+        del self.controller.calls[:]
+
+        with mock.patch.object(self.controller, 'bulk_get',
+                               wraps=self.controller.bulk_get) as bulk_get:
+            messages = list(self.cache.bulk_get(
+                'q', [uncached, 'missing', cached], project='p'))
+
+        self.assertEqual(['b', 'a'], [m['body'] for m in messages])
+        bulk_get.assert_called_once_with(
+            'q', message_ids=[uncached, 'missing'], project='p')
+
+    def test_list_pages(self):
+        self._post('a', 'b', 'c')
+        del self.controller.calls[:]
+
+        for _i in range(2):
+            messages, marker = self._list(limit=2)
+            self.assertEqual(['a', 'b'], [m['body'] for m in messages])
+            self.assertEqual(messages[-1]['id'], marker)
+
+        self.assertEqual(['list'], self.controller.calls)
+
+        # The last page wasn't full, so a post drops it
+        self.assertEqual(1, len(self._list(marker=marker)[0]))
+        self._post('d')
+        self.assertEqual(2, len(self._list(marker=marker)[0]))
+
+        self.assertEqual(['list', 'list', 'post', 'list'],
+                         self.controller.calls)
+
+    def test_delete_invalidates(self):
+        mid, = self._post('a')
+        self._list()
+
+        self.cache.delete('q', mid, project='p')
+
+        self.assertRaises(errors.MessageDoesNotExist,
+                          self.cache.get, 'q', mid, project='p')
+        self.assertEqual([], self._list()[0])
+
+    def test_claim_invalidates(self):
+        mid, = self._post('a')
+        self._list()
+
+        self.claims.create('q', {'ttl': 60, 'grace': 60}, project='p')
+        self.controller.messages[mid]['claim_id'] = 'cid'
+
+        self.assertEqual('cid', self.cache.get('q', mid, 'p')['claim_id'])
+        self.assertEqual('cid', self._list()[0][0]['claim_id'])
+
+        # Claimed messages aren't cached
+        self.cache.get('q', mid, 'p')
+        self.assertEqual(2, self.controller.calls.count('get'))
+
+    def test_stale_reads_are_not_stored(self):
+        mid = self.controller.post('q', [{'ttl': 60, 'body': 'a'}],
+                                   'c', project='p')[0]
+
+        def get(queue, message_id, project=None):
+            # A claim completes while the message is being read
+            message = _Messages.get(self.controller, queue, message_id,
+                                    project)
+            self.claims.delete('q', 'cid', project='p')
+            return message
+
+        with mock.patch.object(self.controller, 'get', side_effect=get):
+            self.cache.get('q', mid, project='p')
+            self.cache.get('q', mid, project='p')
+
+        self.assertEqual(2, self.controller.calls.count('get'))
+
+    def test_posts_claimed_right_away_are_not_stored(self):
+        def post(queue, messages, client_uuid, project=None):
+            # The messages are claimed before the post returns
+            ids = _Messages.post(self.controller, queue, messages,
+                                 client_uuid, project)
+            self.claims.create('q', {'ttl': 60, 'grace': 60}, project='p')
+            for mid in ids:
+                self.controller.messages[mid]['claim_id'] = 'cid'
+            return ids
+
+        with mock.patch.object(self.controller, 'post', side_effect=post):
+            mid, = self._post('a')
+
+        self.assertEqual('cid', self.cache.get('q', mid, 'p')['claim_id'])
+
+    def test_entries_are_bounded(self):
+        cache = self._stage(max_entries=2)
+
+        ids = cache.post('q', [{'ttl': 60, 'body': b} for b in 'abc'],
+                         'c', project='p')
+        del self.controller.calls[:]
+
+        cache.get('q', ids[0], project='p')
+        cache.get('q', ids[2], project='p')
+        self.assertEqual(['get'], self.controller.calls)
+
+    def test_stages_share_cache(self):
+        stage = caching.QueueInvalidation()
+        stage.bind(self.cache._cache._conf, mock.Mock())
+        self.assertIs(self.cache._cache, stage._cache)
+
+        mid, = self._post('a')
+        stage.delete('q', project='p')
+        del self.controller.messages[mid]
+
+        self.assertRaises(errors.MessageDoesNotExist,
+                          self.cache.get, 'q', mid, project='p')
@@ -15,8 +15,12 @@
 
 """Test Auth."""
 
+import datetime
+
+import mock
 from oslo_config import cfg
 
+from zaqar.openstack.common import timeutils
 from zaqar import tests as testing
 from zaqar.transport import auth
 
@@ -33,3 +37,81 @@ class TestTransportAuth(testing.TestBase):
     def test_configs(self):
         auth.strategy('keystone')._register_opts(self.cfg)
         self.assertIn('keystone_authtoken', self.cfg)
+
+
+class TestTokenValidator(testing.TestBase):
+
+    def setUp(self):
+        super(TestTokenValidator, self).setUp()
+        self.calls = []
+        self.expires = timeutils.utcnow() + datetime.timedelta(hours=1)
+
+        def install(app, conf):
+            def middleware(env, start_response):
+                self.calls.append(env['HTTP_X_AUTH_TOKEN'])
+                if not env['HTTP_X_AUTH_TOKEN'].startswith('good'):
+                    start_response('401 Unauthorized', [])
+                    return []
+
+                env.update({
+                    'HTTP_X_IDENTITY_STATUS': 'Confirmed',
+                    'HTTP_X_PROJECT_ID': 'p',
+                    'HTTP_X_USER_ID': 'u',
+                    'HTTP_X_ROLES': 'admin,member',
+                    'keystone.token_info': {'token': {
+                        'expires_at': timeutils.isotime(self.expires)}},
+                })
+                return app(env, start_response)
+
+            return middleware
+
+        patcher = mock.patch.object(auth.KeystoneAuth, 'install',
+                                    side_effect=install)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.validator = auth.TokenValidator(cfg.ConfigOpts(), 'keystone',
+                                             max_entries=2)
+
+    def test_valid_token(self):
+        identity = self.validator.validate('good')
+
+        self.assertEqual('p', identity.project_id)
+        self.assertEqual('u', identity.user_id)
+        self.assertEqual(['admin', 'member'], identity.roles)
+        self.assertEqual(self.expires.replace(microsecond=0),
+                         identity.expires)
+
+    def test_invalid_token(self):
+        self.assertIsNone(self.validator.validate('bad'))
+
+    def test_identity_is_cached_until_expiry(self):
+        self.validator.validate('good')
+        self.validator.validate('good')
+        self.assertEqual(['good'], self.calls)
+
+        self.expires = timeutils.utcnow() - datetime.timedelta(seconds=1)
+        self.validator._cache.clear()
+        self.validator.validate('good')
+        self.validator.validate('good')
+        self.assertEqual(['good'] * 3, self.calls)
+
+    def test_cache_is_lru(self):
+        for token in ('good1', 'good2', 'good1', 'good3'):
+            self.validator.validate(token)
+
+        # good2 was the least recently used token
+        self.validator.validate('good1')
+        self.validator.validate('good2')
+        self.assertEqual(['good1', 'good2', 'good3', 'good2'], self.calls)
+
+    @mock.patch.object(auth.time, 'time')
+    def test_invalid_token_is_cached_briefly(self, now):
+        now.return_value = 1000.0
+        self.assertIsNone(self.validator.validate('bad'))
+        self.assertIsNone(self.validator.validate('bad'))
+        self.assertEqual(['bad'], self.calls)
+
+        now.return_value += auth._INVALID_TOKEN_TTL
+        self.assertIsNone(self.validator.validate('bad'))
+        self.assertEqual(['bad', 'bad'], self.calls)
@@ -0,0 +1,110 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+import mock
+
+from zaqar.tests import base
+from zaqar.transport import ratelimit
+
+
+class TestRateLimiter(base.TestBase):
+
+    def setUp(self):
+        super(TestRateLimiter, self).setUp()
+        self.conf.register_opts(ratelimit._RATE_LIMIT_OPTIONS,
+                                group=ratelimit._RATE_LIMIT_GROUP)
+
+        self.now = 1000.0
+        patcher = mock.patch.object(ratelimit.time, 'time',
+                                    side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _limiter(self, **kwargs):
+        self.config(group=ratelimit._RATE_LIMIT_GROUP, **kwargs)
+        return ratelimit.RateLimiter(self.conf)
+
+    def test_disabled_by_default(self):
+        limiter = self._limiter()
+        self.assertFalse(limiter.enabled)
+
+        for _i in range(100):
+            self.assertEqual(0, limiter.check('message_post', 'p', 'c'))
+
+    def test_project_bucket(self):
+        limiter = self._limiter(project_rates={'post': '2'},
+                                burst_seconds=2)
+        self.assertTrue(limiter.enabled)
+
+        for _i in range(4):
+            self.assertEqual(0, limiter.check('message_post', 'p'))
+
+        self.assertAlmostEqual(0.5, limiter.check('message_post', 'p'))
+
+        # Other projects and action classes have buckets of their own
+        self.assertEqual(0, limiter.check('message_post', 'other'))
+        self.assertEqual(0, limiter.check('message_list', 'p'))
+
+        self.now += 0.5
+        self.assertEqual(0, limiter.check('message_post', 'p'))
+        self.assertTrue(limiter.check('message_post', 'p') > 0)
+
+    def test_connection_bucket(self):
+        limiter = self._limiter(connection_rates={'claim': '1'})
+
+        self.assertEqual(0, limiter.check('claim_create', 'p', 'c1'))
+        self.assertTrue(limiter.check('claim_update', 'p', 'c1') > 0)
+        self.assertEqual(0, limiter.check('claim_create', 'p', 'c2'))
+
+        # Without a connection, only the project is limited
+        self.assertEqual(0, limiter.check('claim_create', 'p'))
+
+    def test_rejected_requests_take_no_token(self):
+        limiter = self._limiter(project_rates={'list': '10'},
+                                connection_rates={'list': '1'})
+
+        self.assertEqual(0, limiter.check('message_list', 'p', 'c1'))
+        for _i in range(5):
+            self.assertTrue(limiter.check('message_list', 'p', 'c1') > 0)
+
+        # Only one token was taken from the project's bucket
+        for _i in range(9):
+            self.assertEqual(0, limiter.check('message_list', 'p', 'c2'))
+            self.now += 1
+
+    def test_unclassified_actions_are_not_limited(self):
+        limiter = self._limiter(project_rates={'post': '1'})
+
+        for _i in range(10):
+            self.assertEqual(0, limiter.check('queue_list', 'p'))
+
+    def test_buckets_are_bounded(self):
+        limiter = self._limiter(connection_rates={'post': '1'},
+                                max_buckets=2)
+
+        for connection in ('c1', 'c2', 'c3'):
+            limiter.check('message_post', 'p', connection)
+
+        self.assertEqual(2, len(limiter._buckets))
+
+        # c1's bucket was dropped, so it starts full again
+        self.assertEqual(0, limiter.check('message_post', 'p', 'c1'))
+
+    def test_release_connection(self):
+        limiter = self._limiter(connection_rates={'post': '1'})
+
+        limiter.check('message_post', 'p', 'c1')
+        limiter.release('c1')
+
+        self.assertEqual(0, len(limiter._buckets))
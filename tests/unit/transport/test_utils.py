@@ -0,0 +1,213 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+import io
+import json
+
+import mock
+import msgpack
+
+from zaqar.common import raw
+from zaqar.tests import base
+from zaqar.transport import utils
+
+
+class TestRawBodies(base.TestBase):
+
+    def setUp(self):
+        super(TestRawBodies, self).setUp()
+        self.body = {'event': 'ping', 'unicode': u'abç', 'n': [1, 2]}
+        self.packed = msgpack.packb(self.body, use_bin_type=True)
+        self.encoded = json.dumps(self.body).encode('utf-8')
+
+    def _document(self, body):
+        return {'messages': [{'id': '1', 'body': body},
+                             {'id': '2', 'body': u'\x00not raw'}]}
+
+    def test_to_json_splices_json_bodies(self):
+        document = utils.to_json(
+            self._document(raw.RawBody(self.encoded, raw.JSON)))
+
+        self.assertIn(self.encoded.decode('utf-8'), document)
+        self.assertEqual(self._document(self.body), json.loads(document))
+
+    def test_to_json_transcodes_msgpack_bodies(self):
+        document = utils.to_json(
+            self._document(raw.RawBody(self.packed, raw.MSGPACK)))
+
+        self.assertEqual(self._document(self.body), json.loads(document))
+
+    def test_to_msgpack_splices_msgpack_bodies(self):
+        document = utils.to_msgpack(
+            self._document(raw.RawBody(self.packed, raw.MSGPACK)))
+
+        self.assertIn(self.packed, document)
+        self.assertEqual(self._document(self.body),
+                         msgpack.unpackb(document, encoding='utf-8'))
+
+    def test_to_msgpack_transcodes_json_bodies(self):
+        document = utils.to_msgpack(
+            self._document(raw.RawBody(self.encoded, raw.JSON)))
+
+        self.assertEqual(self._document(self.body),
+                         msgpack.unpackb(document, encoding='utf-8'))
+
+    def test_many_bodies(self):
+        bodies = [raw.RawBody(msgpack.packb(i), raw.MSGPACK)
+                  for i in range(40)]
+
+        self.assertEqual(list(range(40)), json.loads(utils.to_json(bodies)))
+        self.assertEqual(list(range(40)),
+                         msgpack.unpackb(utils.to_msgpack(bodies)))
+
+    def test_unserializable_objects_still_fail(self):
+        self.assertRaises(TypeError, utils.to_json, {'a': object()})
+        self.assertRaises(TypeError, utils.to_msgpack, {'a': object()})
+
+    def test_raw_body_compares_decoded(self):
+        self.assertEqual(self.body, raw.RawBody(self.packed, raw.MSGPACK))
+        self.assertEqual(raw.RawBody(self.encoded, raw.JSON),
+                         raw.RawBody(self.packed, raw.MSGPACK))
+
+
+class TestIterJSONArray(base.TestBase):
+
+    def setUp(self):
+        super(TestIterJSONArray, self).setUp()
+
+        # Small reads make values straddle them
+        patcher = mock.patch.object(utils, '_READ_SIZE', 3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _iter(self, document, key=None):
+        data = document.encode('utf-8')
+        return utils.iter_json_array(io.BytesIO(data), len(data), key)
+
+    def test_array(self):
+        array = [{u'body': u'abç' * 20, u'ttl': 12345}, 678, [], u'x']
+
+        self.assertEqual(array, list(self._iter(json.dumps(array))))
+        self.assertEqual(array, list(self._iter(
+            json.dumps(array, ensure_ascii=False, indent=4))))
+        self.assertEqual([], list(self._iter(' [ ] ')))
+
+    def test_array_in_object(self):
+        document = {'a': {'b': [1, 2]}, 'messages': [{'x': 1}, 2], 'c': 3}
+
+        self.assertEqual([{'x': 1}, 2], list(self._iter(
+            json.dumps(document, sort_keys=True), key='messages')))
+
+    def test_items_are_read_lazily(self):
+        data = b'[1, 2, "' + b'x' * 1000 + b'"]'
+        stream = io.BytesIO(data)
+
+        items = utils.iter_json_array(stream, len(data))
+        self.assertEqual(1, next(items))
+        self.assertTrue(stream.tell() < 10)
+
+        self.assertEqual([2, 'x' * 1000], list(items))
+
+    def test_malformed(self):
+        for document in ('', '[', '[1,]', '[1 2]', '[1]]', '[1] x',
+                         '[{"a": }]', '{"messages": [1], }', '{1: []}'):
+            self.assertRaises(utils.MalformedJSON, list,
+                              self._iter(document, key=None
+                                         if document.startswith('[')
+                                         else 'messages'))
+
+        self.assertRaises(utils.MalformedJSON, list,
+                          utils.iter_json_array(io.BytesIO(b'["\xff"]'), 5))
+
+    def test_overflowed_integer(self):
+        self.assertRaises(utils.OverflowedJSONInteger, list,
+                          self._iter('[1, %d]' % 2 ** 64))
+
+    def test_unexpected_structure(self):
+        self.assertRaises(utils.UnexpectedJSONType, list,
+                          self._iter('{"a": 1}'))
+        self.assertRaises(utils.UnexpectedJSONType, list,
+                          self._iter('[1]', key='messages'))
+        self.assertRaises(utils.UnexpectedJSONType, list,
+                          self._iter('{"messages": 1}', key='messages'))
+        self.assertRaises(utils.MissingJSONField, list,
+                          self._iter('{"a": []}', key='messages'))
+
+
+class TestIterJSON(base.TestBase):
+
+    def _decode(self, chunks):
+        return json.loads(b''.join(chunks).decode('utf-8'))
+
+    def test_object(self):
+        items = [{'id': str(i), 'body': u'abç'} for i in range(3)]
+        chunks = utils.iter_json('messages', iter(items),
+                                 head={'href': '/v2/claims/1', 'ttl': 30},
+                                 tail=lambda: {'links': []})
+
+        self.assertEqual({'messages': items, 'href': '/v2/claims/1',
+                          'ttl': 30, 'links': []}, self._decode(chunks))
+
+        self.assertEqual({'messages': []},
+                         self._decode(utils.iter_json('messages', ())))
+
+    def test_items_are_encoded_lazily(self):
+        consumed = []
+
+        def items():
+            for i in range(100):
+                consumed.append(i)
+                yield {'body': 'x' * 1024}
+
+        def tail():
+            self.assertEqual(100, len(consumed))
+            return {'links': []}
+
+        chunks = utils.iter_json('messages', items(), tail=tail)
+        first = next(chunks)
+
+        self.assertTrue(len(consumed) < 100)
+        self.assertTrue(first.startswith(b'{"messages": [{'))
+
+        document = self._decode([first] + list(chunks))
+        self.assertEqual(100, len(document['messages']))
+
+    def test_raw_bodies(self):
+        body = {'event': 'ping'}
+        items = [{'body': raw.RawBody(msgpack.packb(body), raw.MSGPACK)}]
+
+        self.assertEqual({'messages': [{'body': body}]},
+                         self._decode(utils.iter_json('messages', items)))
+
+
+class TestFilterFields(base.TestBase):
+
+    spec = (('ttl', int, 300), ('body', '*', None))
+
+    def test_filter_fields(self):
+        self.assertEqual({'ttl': 300, 'body': [1]},
+                         utils.filter_fields({'body': [1], 'x': 2},
+                                             self.spec))
+        self.assertEqual({'ttl': 60, 'body': None},
+                         utils.filter_fields({'ttl': 60, 'body': None},
+                                             self.spec))
+
+    def test_invalid_fields(self):
+        for document in ({}, {'body': 1, 'ttl': '60'}):
+            self.assertRaises(utils.InvalidJSONField, utils.filter_fields,
+                              document, self.spec)
+
+        for document in (1, [], u'x'):
+            self.assertRaises(utils.UnexpectedJSONType, utils.filter_fields,
+                              document, self.spec)
@@ -0,0 +1,49 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+import mock
+
+from zaqar import tests as testing
+from zaqar.transport.websocket import driver
+
+
+class TestEventLoopPolicy(testing.TestBase):
+
+    def setUp(self):
+        super(TestEventLoopPolicy, self).setUp()
+        patcher = mock.patch.object(driver.asyncio, 'set_event_loop_policy')
+        self.set_policy = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_default_policy(self):
+        self.assertFalse(driver.set_event_loop_policy(None))
+        self.assertFalse(self.set_policy.called)
+
+    def test_import_path(self):
+        path = 'zaqar.tests.unit.transport.websocket.FakePolicy'
+        with mock.patch.object(driver.importutils, 'import_class') as imp:
+            self.assertTrue(driver.set_event_loop_policy(path))
+
+        imp.assert_called_once_with(path)
+        self.set_policy.assert_called_once_with(imp.return_value())
+
+    def test_shorthand(self):
+        with mock.patch.object(driver.importutils, 'import_class') as imp:
+            self.assertTrue(driver.set_event_loop_policy('uvloop'))
+
+        imp.assert_called_once_with('uvloop.EventLoopPolicy')
+
+    def test_missing_policy(self):
+        self.assertFalse(driver.set_event_loop_policy('not.a.Policy'))
+        self.assertFalse(self.set_policy.called)
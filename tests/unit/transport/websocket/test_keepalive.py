@@ -0,0 +1,106 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+from zaqar import tests as testing
+from zaqar.transport.websocket import keepalive
+
+
+class FakeLoop(object):
+    """Runs timers when the clock is advanced."""
+
+    def __init__(self):
+        self.now = 0
+        self.timers = []
+
+    def time(self):
+        return self.now
+
+    def call_later(self, delay, callback):
+        timer = (self.now + delay, callback)
+        self.timers.append(timer)
+        return timer
+
+    def advance(self, seconds):
+        self.now += seconds
+        due = [timer for timer in self.timers if timer[0] <= self.now]
+        self.timers = [timer for timer in self.timers if timer[0] > self.now]
+        for _when, callback in due:
+            callback()
+
+
+class TestTimerWheel(testing.TestBase):
+
+    def setUp(self):
+        super(TestTimerWheel, self).setUp()
+        self.loop = FakeLoop()
+        self.calls = []
+        self.next = {}
+        self.wheel = keepalive.TimerWheel(self.loop, self._callback)
+
+    def _callback(self, key, now):
+        self.calls.append((key, now))
+        return self.next.get(key)
+
+    def test_single_timer(self):
+        self.wheel.schedule('a', 2.5)
+        self.wheel.schedule('b', 2.5)
+        self.wheel.schedule('c', 10)
+        self.assertEqual(1, len(self.loop.timers))
+
+        for _i in range(3):
+            self.loop.advance(1)
+            self.assertLessEqual(len(self.loop.timers), 1)
+
+        self.assertEqual([('a', 3), ('b', 3)], sorted(self.calls))
+        self.assertEqual(1, len(self.wheel))
+
+    def test_reschedule_and_stop(self):
+        self.next['a'] = 4
+        self.wheel.schedule('a', 1)
+
+        self.loop.advance(2)
+        self.assertEqual([('a', 2)], self.calls)
+        self.assertEqual(1, len(self.wheel))
+
+        del self.next['a']
+        self.loop.advance(3)
+        self.assertEqual([('a', 2), ('a', 5)], self.calls)
+        self.assertEqual(0, len(self.wheel))
+        self.assertEqual([], self.loop.timers)
+
+    def test_cancel(self):
+        self.wheel.schedule('a', 1)
+        self.wheel.cancel('a')
+        self.wheel.cancel('a')
+
+        self.loop.advance(2)
+        self.assertEqual([], self.calls)
+        self.assertEqual([], self.loop.timers)
+
+    def test_late_tick_catches_up(self):
+        self.wheel.schedule('a', 1)
+        self.wheel.schedule('b', 3)
+
+        self.loop.now = 10
+        self.loop.advance(0)
+        self.assertEqual([('a', 10), ('b', 10)], self.calls)
+
+    def test_failing_callback(self):
+        def fail(key, now):
+            raise RuntimeError()
+
+        wheel = keepalive.TimerWheel(self.loop, fail)
+        wheel.schedule('a', 1)
+        self.loop.advance(2)
+        self.assertEqual(0, len(wheel))
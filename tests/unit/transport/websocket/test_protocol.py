@@ -0,0 +1,501 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+import datetime
+
+from autobahn.websocket import compress
+from concurrent import futures
+import mock
+import msgpack
+
+from zaqar.common.api import request
+from zaqar.common.api import response
+from zaqar.openstack.common import timeutils
+from zaqar import tests as testing
+from zaqar.transport.websocket import protocol
+from zaqar.transport.websocket import registry
+
+
+class FakeLoop(object):
+    """Collects submitted jobs instead of running them."""
+
+    def __init__(self):
+        self.pending = []
+        self.now = 0
+
+    def time(self):
+        return self.now
+
+    def run_in_executor(self, executor, func, *args):
+        future = futures.Future()
+        self.pending.append((future, func, args))
+        return future
+
+    def complete_next(self):
+        future, func, args = self.pending.pop(0)
+        try:
+            future.set_result(func(*args))
+        except Exception as ex:
+            future.set_exception(ex)
+
+
+class TestMessagingProtocol(testing.TestBase):
+
+    def setUp(self):
+        super(TestMessagingProtocol, self).setUp()
+
+        def process_request(req):
+            return response.Response(req, {}, {'status': 200})
+
+        self.handler = mock.Mock()
+        self.handler.process_request.side_effect = process_request
+        self.handler.process_batch.side_effect = (
+            lambda reqs: [process_request(req) for req in reqs])
+
+        self.loop = FakeLoop()
+        self.proto = protocol.MessagingProtocol(self.handler)
+        self.proto.factory = mock.Mock(loop=self.loop, max_inflight=2,
+                                       max_waiting=2,
+                                       max_waiting_per_connection=1,
+                                       max_batch_size=3, compression=None,
+                                       max_queued_bytes=0,
+                                       token_validator=None,
+                                       registry=registry.Registry(),
+                                       auto_ping_interval=0,
+                                       auto_ping_timeout=0, idle_timeout=0)
+        self.handler.validate.return_value = True
+        self.proto.transport = mock.Mock()
+        self.proto.transport.get_extra_info.return_value = None
+        self.proto.state = self.proto.STATE_OPEN
+        self.proto.peer = 'tcp4:127.0.0.1:1234'
+        self.proto._send = mock.Mock()
+
+    def _request(self, action='queue_list'):
+        return request.Request(action=action)
+
+    def _sent(self):
+        return self.proto._send.call_args[0][0]
+
+    def test_inline_dispatch(self):
+        self.proto.factory.executor = None
+        self.proto._dispatch(self._request())
+
+        self.assertEqual([], self.loop.pending)
+        self.assertEqual({'action': 'queue_list'}, self._sent()['request'])
+
+    def test_inline_dispatch_does_not_wait(self):
+        self.proto.factory.executor = None
+        req = self.proto._create_request({'action': 'message_list',
+                                          'body': {'wait': 10}})
+        self.assertEqual(0, req._body['wait'])
+
+    def test_waiting_requests_are_limited(self):
+        def wait_request():
+            return self.proto._create_request({'action': 'message_list',
+                                               'body': {'wait': 10}})
+
+        first, second = wait_request(), wait_request()
+        self.proto._dispatch(first)
+        self.proto._dispatch(second)
+
+        self.assertEqual(10, first._body['wait'])
+        self.assertEqual(0, second._body['wait'])
+        self.assertEqual(1, self.proto.factory.registry.waiting_requests)
+
+        self.loop.complete_next()
+        self.loop.complete_next()
+        self.assertEqual(0, self.proto.factory.registry.waiting_requests)
+
+        # Other connections' requests count against the process limit
+        self.proto.factory.registry.waiting_requests = 2
+        third = wait_request()
+        self.proto._dispatch(third)
+        self.assertEqual(0, third._body['wait'])
+
+    def test_executor_dispatch(self):
+        self.proto._dispatch(self._request())
+        self.assertEqual(1, len(self.loop.pending))
+        self.assertFalse(self.proto._send.called)
+
+        self.loop.complete_next()
+        self.assertEqual({'action': 'queue_list'}, self._sent()['request'])
+        self.assertEqual(0, self.proto._inflight)
+
+    def test_inflight_limit_pauses_reading(self):
+        for action in ('queue_list', 'queue_get', 'queue_delete'):
+            self.proto._dispatch(self._request(action))
+
+        self.assertEqual(2, len(self.loop.pending))
+        self.assertEqual(1, len(self.proto._backlog))
+        self.proto.transport.pause_reading.assert_called_once_with()
+
+        self.loop.complete_next()
+        self.assertEqual(2, len(self.loop.pending))
+        self.assertEqual(0, len(self.proto._backlog))
+        self.proto.transport.resume_reading.assert_called_once_with()
+
+    def test_executor_failure_returns_error(self):
+        self.handler.process_request.side_effect = RuntimeError
+        self.proto._dispatch(self._request())
+        self.loop.complete_next()
+
+        self.assertEqual(500, self._sent()['headers']['status'])
+
+    def test_batch_frame(self):
+        frame = [{'action': 'queue_list', 'request_id': 1},
+                 'not-an-object',
+                 {'action': 'queue_get', 'request_id': 2}]
+        self.proto.onMessage(protocol.utils.to_json(frame).encode(), False)
+        self.loop.complete_next()
+
+        self.assertEqual(1, self.handler.process_batch.call_count)
+        reqs = self.handler.process_batch.call_args[0][0]
+        self.assertEqual(['queue_list', 'queue_get'],
+                         [req._action for req in reqs])
+
+        sent = self._sent()
+        self.assertEqual(3, len(sent))
+        self.assertEqual(1, sent[0]['request']['request_id'])
+        self.assertEqual(400, sent[1]['headers']['status'])
+        self.assertEqual(2, sent[2]['request']['request_id'])
+
+    def test_frames_must_hold_objects_or_arrays(self):
+        self.proto.factory.executor = None
+
+        for payload in (b'5', b'"x"', b'null'):
+            self.proto.onMessage(payload, False)
+            self.assertEqual(400, self._sent()['headers']['status'])
+
+        self.proto.onMessage(msgpack.packb(5), True)
+        self.assertEqual(400, self._sent()['headers']['status'])
+        self.assertFalse(self.handler.process_request.called)
+
+    def test_batch_frame_too_large(self):
+        frame = [{'action': 'queue_list'}] * 4
+        self.proto.onMessage(protocol.utils.to_json(frame).encode(), False)
+
+        self.assertEqual([], self.loop.pending)
+        self.assertEqual(400, self._sent()['headers']['status'])
+
+    def test_batch_failure_returns_error(self):
+        self.handler.process_batch.side_effect = RuntimeError
+        frame = [{'action': 'queue_list'}]
+        self.proto.onMessage(protocol.utils.to_json(frame).encode(), False)
+        self.loop.complete_next()
+
+        self.assertEqual(500, self._sent()['headers']['status'])
+
+    def test_msgpack_frames(self):
+        def process_request(req):
+            return response.Response(req, {'queues': []}, {'status': 200})
+
+        self.handler.process_request.side_effect = process_request
+        self.proto.factory.executor = None
+        self.proto.sendMessage = mock.Mock()
+        del self.proto._send
+
+        frame = msgpack.packb({'action': 'queue_list',
+                               'headers': {'Client-ID': 'abc',
+                                           'X-Project-ID': 'p'},
+                               'request_id': 7}, use_bin_type=True)
+        self.proto.onMessage(frame, True)
+
+        payload, is_binary = self.proto.sendMessage.call_args[0]
+        self.assertTrue(is_binary)
+
+        data = msgpack.unpackb(payload, encoding='utf-8')
+        self.assertEqual({'action': 'queue_list', 'request_id': 7},
+                         data['request'])
+        self.assertEqual({'queues': []}, data['body'])
+
+    def test_compression_disabled(self):
+        self.proto.onConnect(mock.Mock(protocols=[]))
+        self.assertNotIn('perMessageCompressionAccept', vars(self.proto))
+
+    def test_accept_compression_offer(self):
+        self.proto.factory.compression = {'window_bits': 12,
+                                          'mem_level': 4,
+                                          'min_size': 1024}
+        self.proto.onConnect(mock.Mock(protocols=[]))
+
+        offer = compress.PerMessageDeflateOffer(True, True, False, 10)
+        accept = self.proto.perMessageCompressionAccept([offer])
+
+        self.assertIs(offer, accept.offer)
+        self.assertEqual(10, accept.window_bits)
+        self.assertEqual(4, accept.mem_level)
+
+    def test_small_frames_are_not_compressed(self):
+        self.proto.factory.compression = {'window_bits': 15,
+                                          'mem_level': 8,
+                                          'min_size': 64}
+        self.proto.sendMessage = mock.Mock()
+        del self.proto._send
+
+        self.proto._send({'body': {}})
+        self.assertTrue(
+            self.proto.sendMessage.call_args[1].get('doNotCompress'))
+
+        self.proto._send({'body': {'data': 'x' * 64}})
+        self.assertFalse(
+            self.proto.sendMessage.call_args[1].get('doNotCompress'))
+
+    def test_slow_reader_pauses_reading(self):
+        self.proto.pause_writing()
+        self.proto.transport.pause_reading.assert_called_once_with()
+        self.assertEqual(1, self.proto.factory.registry.paused_connections)
+
+        self.proto.resume_writing()
+        self.proto.transport.resume_reading.assert_called_once_with()
+        self.assertEqual(0, self.proto.factory.registry.paused_connections)
+        self.assertEqual(1, self.proto.factory.registry.pause_count)
+
+    def test_reading_resumes_once_every_reason_is_gone(self):
+        for action in ('queue_list', 'queue_get', 'queue_delete'):
+            self.proto._dispatch(self._request(action))
+        self.proto.pause_writing()
+
+        self.loop.complete_next()
+        self.assertFalse(self.proto.transport.resume_reading.called)
+
+        self.proto.resume_writing()
+        self.proto.transport.resume_reading.assert_called_once_with()
+        self.proto.transport.pause_reading.assert_called_once_with()
+
+    def test_close_while_paused(self):
+        self.proto.pause_writing()
+        self.proto.onClose(False, 1006, None)
+        self.assertEqual(0, self.proto.factory.registry.paused_connections)
+
+    def test_queued_bytes_cap_drops_connection(self):
+        self.proto.factory.max_queued_bytes = 100
+        self.proto.sendMessage = mock.Mock()
+        self.proto.dropConnection = mock.Mock()
+        self.proto.peer = 'tcp4:127.0.0.1:1234'
+        del self.proto._send
+
+        self.proto.transport.get_write_buffer_size.return_value = 100
+        self.proto._send({'body': {}})
+        self.assertFalse(self.proto.dropConnection.called)
+
+        self.proto.transport.get_write_buffer_size.return_value = 101
+        self.proto._send({'body': {}})
+        self.proto.dropConnection.assert_called_once_with(abort=True)
+        self.assertEqual(1, self.proto.factory.registry.overflow_closes)
+
+    def _frame(self, action='queue_list', headers=None):
+        frame = {'action': action}
+        if headers is not None:
+            frame['headers'] = headers
+        return protocol.utils.to_json(frame).encode()
+
+    def _enable_auth(self, project='p', expires_in=60):
+        identity = mock.Mock(project_id=project)
+        identity.expires = (timeutils.utcnow() +
+                            datetime.timedelta(seconds=expires_in))
+
+        validator = mock.Mock()
+        validator.validate.side_effect = (
+            lambda token: identity if token == 'good' else None)
+        self.proto.factory.token_validator = validator
+        self.proto.factory.executor = None
+        self.proto.peer = 'tcp4:127.0.0.1:1234'
+
+    def test_authenticate_binds_headers(self):
+        self.proto.factory.executor = None
+        headers = {'Client-ID': 'c', 'X-Project-ID': 'p'}
+
+        self.proto.onMessage(self._frame('authenticate', headers), False)
+        self.assertEqual(200, self._sent()['headers']['status'])
+
+        self.proto.onMessage(self._frame(), False)
+        req = self.handler.process_request.call_args[0][0]
+        self.assertEqual(headers, req._headers)
+
+    def test_frames_need_a_token(self):
+        self._enable_auth()
+
+        headers = {'Client-ID': 'c', 'X-Project-ID': 'p'}
+        self.proto.onMessage(self._frame(headers=headers), False)
+        self.assertEqual(401, self._sent()['headers']['status'])
+
+        headers['X-Auth-Token'] = 'good'
+        self.proto.onMessage(self._frame(headers=headers), False)
+        self.assertEqual(200, self._sent()['headers']['status'])
+
+    def test_privileged_peers_skip_authentication(self):
+        self._enable_auth()
+        headers = {'Client-ID': 'c', 'X-Project-ID': 'p'}
+
+        self.proto._trusted = True
+        self.proto.onMessage(self._frame(headers=headers), False)
+        self.assertEqual(401, self._sent()['headers']['status'])
+
+        self.proto._privileged = True
+        self.proto.onMessage(self._frame(headers=headers), False)
+        self.assertEqual(200, self._sent()['headers']['status'])
+
+    def test_authenticate_with_token(self):
+        self._enable_auth()
+
+        headers = {'Client-ID': 'c', 'X-Project-ID': 'p',
+                   'X-Auth-Token': 'good'}
+        self.proto.onMessage(self._frame('authenticate', headers), False)
+        self.assertEqual(200, self._sent()['headers']['status'])
+
+        self.proto.onMessage(self._frame(), False)
+        self.assertEqual(200, self._sent()['headers']['status'])
+        self.assertEqual(1, self.proto.factory.token_validator.validate
+                         .call_count)
+
+    def test_authenticate_failures(self):
+        self._enable_auth()
+
+        headers = {'Client-ID': 'c', 'X-Project-ID': 'p',
+                   'X-Auth-Token': 'bad'}
+        self.proto.onMessage(self._frame('authenticate', headers), False)
+        self.assertEqual(401, self._sent()['headers']['status'])
+
+        headers.update({'X-Project-ID': 'other', 'X-Auth-Token': 'good'})
+        self.proto.onMessage(self._frame('authenticate', headers), False)
+        self.assertEqual(403, self._sent()['headers']['status'])
+        self.assertIsNone(self.proto._bound_headers)
+
+    def test_frames_received_before_authentication_need_a_token(self):
+        self._enable_auth()
+        self.proto.factory.executor = mock.Mock()
+
+        headers = {'Client-ID': 'c', 'X-Project-ID': 'p',
+                   'X-Auth-Token': 'good'}
+        self.proto.onMessage(self._frame('authenticate', headers), False)
+
+        # Received while authenticate is still being processed
+        other = {'Client-ID': 'c', 'X-Project-ID': 'victim'}
+        self.proto.onMessage(self._frame(headers=other), False)
+        frame = [{'action': 'queue_list', 'headers': other}]
+        self.proto.onMessage(protocol.utils.to_json(frame).encode(), False)
+
+        for _i in range(3):
+            self.loop.complete_next()
+
+        sent = [call[0][0] for call in self.proto._send.call_args_list]
+        self.assertEqual(200, sent[0]['headers']['status'])
+        self.assertEqual(401, sent[1]['headers']['status'])
+        self.assertEqual(401, sent[2][0]['headers']['status'])
+        self.assertFalse(self.handler.process_request.called)
+        self.assertFalse(self.handler.process_batch.call_args[0][0])
+
+    def test_binding_expires_with_token(self):
+        self._enable_auth(expires_in=-1)
+
+        headers = {'Client-ID': 'c', 'X-Project-ID': 'p',
+                   'X-Auth-Token': 'good'}
+        self.proto.onMessage(self._frame('authenticate', headers), False)
+        self.proto.onMessage(self._frame(), False)
+
+        self.assertIsNone(self.proto._bound_headers)
+        self.assertFalse(self.handler.process_request.called)
+
+    def test_authenticate_in_batch(self):
+        frame = [{'action': 'authenticate',
+                  'headers': {'Client-ID': 'c', 'X-Project-ID': 'p'}}]
+        self.proto.onMessage(protocol.utils.to_json(frame).encode(), False)
+        self.loop.complete_next()
+
+        self.assertEqual(400, self._sent()[0]['headers']['status'])
+        self.assertIsNone(self.proto._bound_headers)
+
+    def test_traffic_is_counted(self):
+        self.proto.factory.executor = None
+        self.proto.sendMessage = mock.Mock()
+        del self.proto._send
+        self.proto.onOpen()
+
+        frame = self._frame(headers={})
+        self.proto.onMessage(frame, False)
+
+        stats = self.proto.factory.registry.list()[0]
+        self.assertEqual(1, stats['frames_in'])
+        self.assertEqual(len(frame), stats['bytes_in'])
+        self.assertEqual(1, stats['frames_out'])
+
+        self.proto.onClose(True, 1000, None)
+        self.assertEqual(0, len(self.proto.factory.registry))
+        self.assertEqual(1, self.proto.factory.registry.metrics()['frames_in'])
+
+    def test_connection_actions_are_restricted(self):
+        self.proto.factory.executor = None
+
+        for action in ('connection_list', 'connection_stats'):
+            self.proto.onMessage(self._frame(action, {}), False)
+            self.assertEqual(403, self._sent()['headers']['status'])
+
+        # Peers only trusted to send valid requests aren't admins
+        self.proto._trusted = True
+        self.proto.onMessage(self._frame('connection_stats', {}), False)
+        self.assertEqual(403, self._sent()['headers']['status'])
+
+        self.proto._privileged = True
+        self.proto.onMessage(self._frame('connection_stats', {}), False)
+        self.assertEqual(200, self._sent()['headers']['status'])
+        self.assertIn('connections', self._sent()['body']['metrics'])
+
+    def test_keepalive_disabled(self):
+        self.proto.onOpen()
+        self.assertIsNone(self.proto.check_keepalive(100))
+        self.assertFalse(self.proto.factory.timers.schedule.called)
+
+    def test_ping_and_reap(self):
+        self.proto.factory.auto_ping_interval = 30
+        self.proto.factory.auto_ping_timeout = 10
+        self.proto.sendPing = mock.Mock()
+        self.proto.dropConnection = mock.Mock()
+
+        self.proto.onOpen()
+        self.proto.factory.timers.schedule.assert_called_once_with(
+            self.proto, 30)
+
+        self.assertEqual(30, self.proto.check_keepalive(20))
+        self.assertEqual(40, self.proto.check_keepalive(30))
+        self.proto.sendPing.assert_called_once_with()
+
+        self.assertIsNone(self.proto.check_keepalive(40))
+        self.proto.dropConnection.assert_called_once_with(abort=True)
+        self.assertEqual(1, self.proto.factory.registry.reaped_connections)
+
+    def test_pong_keeps_connection_alive(self):
+        self.proto.factory.auto_ping_interval = 30
+        self.proto.factory.auto_ping_timeout = 10
+        self.proto.sendPing = mock.Mock()
+        self.proto.onOpen()
+
+        self.assertEqual(40, self.proto.check_keepalive(30))
+
+        self.loop.now = 35
+        self.proto.onPong(b'')
+        self.assertEqual(65, self.proto.check_keepalive(40))
+
+    def test_idle_timeout(self):
+        self.proto.factory.idle_timeout = 60
+        self.proto.factory.executor = None
+        self.proto.sendClose = mock.Mock()
+        self.proto.onOpen()
+
+        self.loop.now = 30
+        self.proto.onMessage(self._frame(headers={}), False)
+        self.assertEqual(90, self.proto.check_keepalive(60))
+
+        self.assertIsNone(self.proto.check_keepalive(90))
+        self.assertTrue(self.proto.sendClose.called)
+        self.assertEqual(1, self.proto.factory.registry.idle_closes)
@@ -0,0 +1,57 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+import mock
+
+from zaqar import tests as testing
+from zaqar.transport.websocket import registry
+
+
+class TestRegistry(testing.TestBase):
+
+    def setUp(self):
+        super(TestRegistry, self).setUp()
+        self.registry = registry.Registry()
+
+    def _connection(self, peer, bytes_in=0, inflight=0):
+        connection = mock.Mock(peer=peer, inflight=inflight,
+                               stats=registry.ConnectionStats())
+        self.registry.add(connection)
+        connection.stats.frames_in = 1
+        connection.stats.bytes_in = bytes_in
+        return connection
+
+    def test_list_busiest_first(self):
+        self._connection('a', bytes_in=10)
+        self._connection('b', bytes_in=30, inflight=2)
+        self._connection('c', bytes_in=20)
+
+        connections = self.registry.list(limit=2)
+        self.assertEqual(['b', 'c'], [c['peer'] for c in connections])
+        self.assertEqual(2, connections[0]['inflight'])
+        self.assertGreaterEqual(connections[0]['age'], 0)
+
+    def test_metrics_include_closed_connections(self):
+        first = self._connection('a', bytes_in=10)
+        self._connection('b', bytes_in=5, inflight=1)
+        self.registry.remove(first)
+        self.registry.remove(first)
+
+        metrics = self.registry.metrics()
+        self.assertEqual(1, metrics['connections'])
+        self.assertEqual(2, metrics['connections_opened'])
+        self.assertEqual(2, metrics['frames_in'])
+        self.assertEqual(15, metrics['bytes_in'])
+        self.assertEqual(1, metrics['inflight'])
+        self.assertEqual(0, metrics['paused_connections'])
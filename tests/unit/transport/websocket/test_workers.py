@@ -0,0 +1,94 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+import os
+import signal
+import threading
+import time
+
+import fixtures
+import mock
+
+from zaqar import tests as testing
+from zaqar.transport.websocket import workers
+
+
+def _sleep(heartbeat):
+    time.sleep(30)
+
+
+class TestSupervisor(testing.TestBase):
+
+    def _run(self, supervisor, target, stop_after=0.5):
+        timer = threading.Timer(stop_after, supervisor.stop)
+        timer.start()
+
+        started = time.time()
+        try:
+            supervisor.run(target)
+        finally:
+            timer.cancel()
+
+        return time.time() - started
+
+    def test_run_and_stop(self):
+        supervisor = workers.Supervisor(2)
+        with mock.patch.object(supervisor, '_spawn',
+                               wraps=supervisor._spawn) as spawn:
+            elapsed = self._run(supervisor, _sleep)
+
+        self.assertEqual(2, spawn.call_count)
+        self.assertEqual({}, supervisor._workers)
+        self.assertLess(elapsed, 10)
+
+    def test_dead_worker_is_restarted(self):
+        def exit_first(heartbeat):
+            if not os.path.exists(marker):
+                open(marker, 'w').close()
+                return
+            _sleep(heartbeat)
+
+        marker = os.path.join(self.useFixture(
+            fixtures.TempDir()).path, 'started')
+
+        supervisor = workers.Supervisor(1)
+        with mock.patch.object(workers, '_RESPAWN_DELAY', 0):
+            with mock.patch.object(supervisor, '_spawn',
+                                   wraps=supervisor._spawn) as spawn:
+                self._run(supervisor, exit_first, stop_after=2)
+
+        self.assertEqual(2, spawn.call_count)
+        self.assertEqual(0, spawn.call_args[0][0])
+
+    def test_unresponsive_worker_is_killed(self):
+        supervisor = workers.Supervisor(1, heartbeat_timeout=5)
+        worker = workers._Worker(0, 1234, None)
+        worker.last_beat -= 10
+        supervisor._workers[worker.pid] = worker
+
+        with mock.patch.object(supervisor, '_kill') as kill:
+            supervisor._check_health()
+
+        kill.assert_called_once_with(1234, signal.SIGKILL)
+
+    def test_health_check_disabled(self):
+        supervisor = workers.Supervisor(1, heartbeat_timeout=0)
+        worker = workers._Worker(0, 1234, None)
+        worker.last_beat -= 10
+        supervisor._workers[worker.pid] = worker
+
+        with mock.patch.object(supervisor, '_kill') as kill:
+            supervisor._check_health()
+
+        self.assertFalse(kill.called)
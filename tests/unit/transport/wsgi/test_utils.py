@@ -19,6 +19,7 @@ import falcon
 import six
 import testtools
 
+from zaqar.transport import utils as transport_utils
 from zaqar.transport.wsgi import utils
 
 
@@ -187,3 +188,41 @@ class TestUtils(testtools.TestCase):
         length = None
         self.assertRaises(falcon.HTTPBadRequest,
                           utils.deserialize, stream, length)
+
+    def test_deserialize_array_and_sanitize(self):
+        array = [{u'body': {u'x': 1}, u'ttl': 60}, {u'body': {u'x': 2}}]
+
+        document = six.text_type(json.dumps({'messages': array}))
+        stream = io.StringIO(document)
+        spec = [('body', dict, None)]
+
+        deserialized = utils.deserialize_array(stream, len(document),
+                                               key='messages')
+        filtered = utils.sanitize(deserialized, spec,
+                                  doctype=utils.JSONArray)
+        self.assertEqual(filtered, [{u'body': {u'x': 1}},
+                                    {u'body': {u'x': 2}}])
+
+    def test_deserialize_array_errors(self):
+        spec = [('body', dict, None)]
+
+        for document, key in (('[{"body": {}}', None),
+                              ('{"messages": [{"body": 1}]}', 'messages'),
+                              ('{"messages": {}}', 'messages'),
+                              ('[1]', None)):
+            deserialized = utils.deserialize_array(
+                io.StringIO(six.text_type(document)), len(document), key)
+
+            self.assertRaises(falcon.HTTPBadRequest, utils.sanitize,
+                              deserialized, spec, doctype=utils.JSONArray)
+
+        self.assertRaises(falcon.HTTPBadRequest,
+                          utils.deserialize_array, None, None)
+
+    def test_deserialize_array_missing_field(self):
+        document = u'{"other": []}'
+        deserialized = utils.deserialize_array(io.StringIO(document),
+                                               len(document), 'messages')
+
+        self.assertRaises(transport_utils.MissingJSONField, list,
+                          deserialized)
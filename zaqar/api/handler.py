@@ -12,18 +12,234 @@
 # License for the specific language governing permissions and limitations under
 # the License.
 
+import collections
+
+import six
+
 from zaqar.api.v1_1 import endpoints
+from zaqar.api.v1_1 import request as v1_1_request
+from zaqar.common.api import fanout
+from zaqar.common.api import leases
+from zaqar.common.api import response
+from zaqar.common import errors
+from zaqar.i18n import _
+
+
+class Route(object):
+    """An action of an API version, resolved once at startup.
+
+    :param endpoint: Bound endpoint processing the action, or None
+        for actions the transport processes on its own.
+    :param validator: Compiled validator of the action's requests.
+    :param required_headers: Names of the headers the action's
+        requests must carry.
+    """
+
+    __slots__ = ('endpoint', 'validator', 'required_headers')
+
+    def __init__(self, endpoint, validator, required_headers):
+        self.endpoint = endpoint
+        self.validator = validator
+        self.required_headers = required_headers
 
 
 class Handler(object):
     """Defines API handler
 
     The handler validates and process the requests
+
+    :param limiter: `zaqar.transport.ratelimit.RateLimiter` requests
+        are throttled with, or None not to throttle them.
     """
 
-    def __init__(self, storage, control, validate):
-        self.v1_1_endpoints = endpoints.Endpoints(storage, control, validate)
+    DEFAULT_API = 'v1.1'
+
+    def __init__(self, storage, control, validate, limiter=None):
+        self._limiter = limiter
+        self._fanout = fanout.Registry()
+        self._leases = leases.Keeper(storage.claim_controller)
+        self.v1_1_endpoints = endpoints.Endpoints(storage, control, validate,
+                                                  fanout=self._fanout,
+                                                  leases=self._leases)
+
+        self._schemas = {
+            'v1.1': v1_1_request.RequestSchema(),
+        }
+
+        self._routes = {
+            'v1.1': self._build_routes(self.v1_1_endpoints,
+                                       self._schemas['v1.1']),
+        }
+
+    @staticmethod
+    def _build_routes(endpoints, schema):
+        routes = {}
+        for action, spec in six.iteritems(schema.schema):
+            headers = spec['properties'].get('headers', {})
+            routes[action] = Route(getattr(endpoints, action, None),
+                                   schema.validators[action],
+                                   tuple(headers.get('required', ())))
+
+        return routes
+
+    def get_route(self, action, api=None):
+        """Looks up the route of an action.
+
+        :param action: Name of the action.
+        :param api: API version, defaults to `DEFAULT_API`.
+        :returns: The action's `Route`.
+        :raises: `errors.InvalidAction` if the API version or the
+            action doesn't exist.
+        """
+        api = api or self.DEFAULT_API
+
+        try:
+            routes = self._routes[api]
+        except KeyError:
+            msg = _('{0} is not a valid API version').format(api)
+            raise errors.InvalidAction(msg)
+
+        try:
+            return routes[action]
+        except (KeyError, TypeError):
+            msg = _('{0} is not a valid action').format(action)
+            raise errors.InvalidAction(msg)
+
+    def validate(self, document):
+        """Validates a request document against its action's schema.
+
+        :param document: The request, as received by the transport.
+        :type document: dict
+        :returns: True if the document is valid, False otherwise.
+        :raises: `errors.InvalidAction` if the API version or the
+            action doesn't exist.
+        """
+        action = document.get('action')
+        api = document.get('api') or self.DEFAULT_API
+
+        if self.get_route(action, api).validator(document):
+            return True
+
+        # Let the schema report why the document is invalid.
+        return self._schemas[api].validate(action, document)
 
     def process_request(self, req):
-        # FIXME(vkmc): Control API version
-        return getattr(self.v1_1_endpoints, req._action)(req)
\ No newline at end of file
+        """Dispatches a request to the endpoint of its action.
+
+        Requests for unknown actions, or missing any of the headers
+        their action requires, are turned down without reaching the
+        endpoints.
+
+        :param req: Request instance ready to be processed.
+        :type req: `api.common.Request`
+        :returns: A Response instance.
+        """
+        route, resp = self._admit(req)
+        if resp is not None:
+            return resp
+
+        return route.endpoint(req)
+
+    def _admit(self, req):
+        """Looks up the route of `req` and checks it may reach it.
+
+        :returns: A (route, response) tuple, where response is an
+            error response if `req` must be turned down, None
+            otherwise.
+        """
+        try:
+            route = self.get_route(req._action, req._api)
+        except errors.InvalidAction as ex:
+            body = {'error': six.text_type(ex)}
+            return None, response.Response(req, body, {'status': 400})
+
+        if route.endpoint is None:
+            body = {'error': _('{0} is not supported by this '
+                               'transport').format(req._action)}
+            return route, response.Response(req, body, {'status': 400})
+
+        headers = req._headers or {}
+        for name in route.required_headers:
+            if name not in headers:
+                body = {'error': _('Missing header {0}').format(name)}
+                return route, response.Response(req, body, {'status': 400})
+
+        return route, self._throttle(req)
+
+    def _throttle(self, req):
+        """Takes a token from the limiter for `req`.
+
+        :returns: An error response if `req` must be turned down,
+            None otherwise.
+        """
+        if self._limiter is None:
+            return None
+
+        wait = self._limiter.check(req._action,
+                                   req._headers.get('X-Project-ID'),
+                                   req._connection)
+        if not wait:
+            return None
+
+        body = {'error': _('Rate limit exceeded, retry in {0:.2f} '
+                           'seconds.').format(wait),
+                'retry_after': wait}
+        return response.Response(req, body, {'status': 429})
+
+    def process_batch(self, reqs):
+        """Processes a batch of requests.
+
+        Requests are processed in order, except for consecutive
+        `message_post` requests: those targeting the same queue on
+        behalf of the same client are grouped into a single storage
+        call, which is issued before the next request of any other
+        kind is processed. Each post is checked on its own before
+        being grouped, as `process_request` would.
+
+        :param reqs: Request instances to process.
+        :type reqs: list
+        :returns: A Response instance for each request, in order.
+        :rtype: list
+        """
+        resps = [None] * len(reqs)
+        posts = collections.OrderedDict()
+
+        def flush_posts():
+            for indexes in posts.values():
+                group = [reqs[index] for index in indexes]
+                results = self.v1_1_endpoints.message_post_group(group)
+                for index, resp in zip(indexes, results):
+                    resps[index] = resp
+
+            posts.clear()
+
+        for index, req in enumerate(reqs):
+            if req._action == 'message_post':
+                _route, resp = self._admit(req)
+                if resp is not None:
+                    resps[index] = resp
+                    continue
+
+                headers = req._headers
+                key = (headers.get('X-Project-ID'),
+                       req._body.get('queue_name'),
+                       headers.get('Client-ID'))
+                posts.setdefault(key, []).append(index)
+            else:
+                flush_posts()
+                resps[index] = self.process_request(req)
+
+        flush_posts()
+        return resps
+
+    def connection_closed(self, connection):
+        """Releases the state bound to a transport connection.
+
+        Transports keeping connections open must call this once
+        `connection` is closed.
+        """
+        self._fanout.remove(connection)
+        self._leases.remove(connection)
+
+        if self._limiter is not None:
+            self._limiter.release(connection)
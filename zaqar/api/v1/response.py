@@ -295,3 +295,5 @@ class ResponseSchema(api.Api):
                 'additionalProperties': False
             }
         }
+
+        super(ResponseSchema, self).__init__()
@@ -12,6 +12,12 @@
 # License for the specific language governing permissions and limitations under
 # the License.
 
+import threading
+import time
+
+from zaqar.common.api import errors as api_errors
+from zaqar.common.api import fanout as api_fanout
+from zaqar.common.api import leases as api_leases
 from zaqar.common.api import response
 from zaqar.common.api import utils as api_utils
 from zaqar.i18n import _
@@ -21,11 +27,27 @@ from zaqar.transport import validation
 
 LOG = logging.getLogger(__name__)
 
+# FIXME(vkmc): Use default TTL
+_MESSAGE_POST_SPEC = (
+    ('ttl', int, 300),
+    ('body', '*', None),
+)
+
+# Longest time, in seconds, a request may wait for messages.
+_MAX_WAIT = 30
+
+# FIXME(vkmc): Use default claim TTL and grace
+_CLAIM_SPEC = (
+    ('ttl', int, 300),
+    ('grace', int, 60),
+)
+
 
 class Endpoints(object):
     """v1.1 API Endpoints."""
 
-    def __init__(self, storage, control, validate):
+    def __init__(self, storage, control, validate, fanout=None,
+                 leases=None):
         self._queue_controller = storage.queue_controller
         self._message_controller = storage.message_controller
         self._claim_controller = storage.claim_controller
@@ -34,6 +56,10 @@ class Endpoints(object):
         self._flavors_controller = control.flavors_controller
 
         self._validate = validate
+        self._fanout = fanout or api_fanout.Registry()
+        if leases is None:
+            leases = api_leases.Keeper(self._claim_controller)
+        self._leases = leases
 
     # Queues
     @api_utils.raises_conn_error
@@ -229,11 +255,91 @@ class Endpoints(object):
             resp = response.Response(req, body, headers)
             return resp
 
+    @api_utils.raises_conn_error
+    def queue_subscribe(self, req):
+        """Subscribes the request's connection to a queue
+
+        Messages posted to the queue through this node are pushed
+        to the connection as they arrive, in responses echoing
+        the subscription request.
+
+        :param req: Request instance ready to be sent.
+        :type req: `api.common.Request`
+        :return: resp: Response instance
+        :type: resp: `api.common.Response`
+        """
+        project_id = req._headers.get('X-Project-ID')
+        queue_name = req._body.get('queue_name')
+        connection = req._connection
+
+        LOG.debug(u'Queue subscribe - queue: %(queue)s, '
+                  u'project: %(project)s',
+                  {'queue': queue_name, 'project': project_id})
+
+        if connection is None:
+            ex = _(u'Invalid request.')
+            error = _(u'Subscriptions require a persistent connection.')
+            headers = {'status': 400}
+            return api_utils.error_response(req, ex, headers, error)
+
+        try:
+            self._validate.queue_identification(queue_name, project_id)
+        except validation.ValidationFailed as ex:
+            LOG.debug(ex)
+            headers = {'status': 400}
+            return api_utils.error_response(req, ex, headers)
+
+        def push(messages):
+            body = {'queue_name': queue_name, 'messages': messages}
+            headers = {'status': 200}
+            connection.push(response.Response(req, body, headers))
+
+        if not self._fanout.subscribe(project_id, queue_name,
+                                      connection, push):
+            ex = _(u'Invalid request.')
+            error = _(u'The connection was closed.')
+            headers = {'status': 400}
+            return api_utils.error_response(req, ex, headers, error)
+
+        body = _('Subscribed to queue "%s".') % queue_name
+        headers = {'status': 201}
+        resp = response.Response(req, body, headers)
+        return resp
+
+    @api_utils.raises_conn_error
+    def queue_unsubscribe(self, req):
+        """Unsubscribes the request's connection from a queue
+
+        :param req: Request instance ready to be sent.
+        :type req: `api.common.Request`
+        :return: resp: Response instance
+        :type: resp: `api.common.Response`
+        """
+        project_id = req._headers.get('X-Project-ID')
+        queue_name = req._body.get('queue_name')
+
+        LOG.debug(u'Queue unsubscribe - queue: %(queue)s, '
+                  u'project: %(project)s',
+                  {'queue': queue_name, 'project': project_id})
+
+        if req._connection is not None:
+            self._fanout.unsubscribe(project_id, queue_name,
+                                     req._connection)
+
+        headers = {'status': 204}
+        body = {}
+        resp = response.Response(req, body, headers)
+        return resp
+
     # Messages
     @api_utils.raises_conn_error
     def message_list(self, req):
         """Gets a list of messages on a queue
 
+        When `wait` is set in the body and the queue has no messages,
+        the request waits up to that many seconds for some to be
+        posted through this node.
+
         :param req: Request instance ready to be sent.
         :type req: `api.common.Request`
         :return: resp: Response instance
@@ -262,8 +368,7 @@ class Endpoints(object):
             kwargs['include_claimed'] = ('true' ==
                                          req._body.get('include_claimed'))
 
-        try:
-            self._validate.message_listing(**kwargs)
+        def fetch():
             results = self._message_controller.list(
                 queue_name,
                 project=project_id,
@@ -272,7 +377,12 @@ class Endpoints(object):
 
             # Buffer messages
             cursor = next(results)
-            messages = list(cursor)
+            return results, list(cursor)
+
+        try:
+            self._validate.message_listing(**kwargs)
+            results, messages = self._long_poll(project_id, queue_name,
+                                                self._get_wait(req), fetch)
 
         except validation.ValidationFailed as ex:
             LOG.debug(ex)
@@ -403,78 +513,111 @@ class Endpoints(object):
         :return: resp: Response instance
         :type: resp: `api.common.Response`
         """
-        client_uuid = req._headers.get('Client-ID')
-        project_id = req._headers.get('X-Project-ID')
-        queue_name = req._body.get('queue_name')
-
-        LOG.debug(u'Messages post - queue:  %(queue)s, '
-                  u'project: %(project)s',
-                  {'queue': queue_name, 'project': project_id})
+        return self.message_post_group([req])[0]
 
-        try:
-            # Place JSON size restriction before parsing
-            self._validate.message_length(req.content_length)
-        except validation.ValidationFailed as ex:
-            LOG.debug(ex)
-            headers = {'status': 400}
-            return api_utils.error_response(req, ex, headers)
+    def message_post_group(self, reqs):
+        """Posts the messages of several requests in a single call
 
-        # Deserialize and validate the incoming messages
-        document = api_utils.deserialize(req.stream, req.content_length)
+        All the requests must target the same queue, in the same
+        project and on behalf of the same client. Their messages are
+        enqueued with a single storage call and the resulting IDs are
+        handed back to each request. This is not an action by itself,
+        `Handler.process_batch` uses it to group the posts of a batch.
 
-        if 'messages' not in document:
-            ex = _(u'Invalid request.')
-            error = _(u'No messages were found in the request body.')
-            headers = {'status': 400}
-            return api_utils.error_response(req, ex, headers, error)
+        :param reqs: Request instances ready to be sent.
+        :type reqs: list
+        :return: resps: A Response instance for each request, in order.
+        :type: resps: list
+        """
+        client_uuid = reqs[0]._headers.get('Client-ID')
+        project_id = reqs[0]._headers.get('X-Project-ID')
+        queue_name = reqs[0]._body.get('queue_name')
 
-        # FIXME(vkmc): Use default TTL
-        _message_post_spec = (
-            ('ttl', int, 300),
-            ('body', '*', None),
-        )
-        messages = api_utils.sanitize(document['messages'],
-                                      _message_post_spec,
-                                      doctype=api_utils.JSONArray)
+        LOG.debug(u'Messages post - queue:  %(queue)s, '
+                  u'project: %(project)s, requests: %(count)d',
+                  {'queue': queue_name, 'project': project_id,
+                   'count': len(reqs)})
+
+        resps = [None] * len(reqs)
+
+        # Sanitize and validate each request's messages on its own,
+        # so that a bad request doesn't fail the rest of the group.
+        accepted = []
+        for index, req in enumerate(reqs):
+            if 'messages' not in req._body:
+                ex = _(u'Invalid request.')
+                error = _(u'No messages were found in the request body.')
+                headers = {'status': 400}
+                resps[index] = api_utils.error_response(req, ex, headers,
+                                                        error)
+                continue
+
+            try:
+                messages = api_utils.sanitize(req._body['messages'],
+                                              _MESSAGE_POST_SPEC,
+                                              doctype=api_utils.JSONArray)
+                self._validate.message_posting(messages)
+            except (api_errors.BadRequest,
+                    api_errors.DocumentTypeNotSupported,
+                    validation.ValidationFailed, TypeError) as ex:
+                LOG.debug(ex)
+                headers = {'status': 400}
+                resps[index] = api_utils.error_response(req, ex, headers)
+                continue
+
+            accepted.append((index, messages))
+
+        if not accepted:
+            return resps
+
+        def fail(ex, headers, error=None):
+            for index, _messages in accepted:
+                resps[index] = api_utils.error_response(reqs[index], ex,
+                                                        headers, error)
+            return resps
+
+        posted = [message for _index, messages in accepted
+                  for message in messages]
 
         try:
-            self._validate.message_posting(messages)
-
             if not self._queue_controller.exists(queue_name, project_id):
                 self._queue_controller.create(queue_name, project=project_id)
 
             message_ids = self._message_controller.post(
                 queue_name,
-                messages=messages,
+                messages=posted,
                 project=project_id,
                 client_uuid=client_uuid)
 
-        except validation.ValidationFailed as ex:
-            LOG.debug(ex)
-            headers = {'status': 400}
-            return api_utils.error_response(req, ex, headers)
         except storage_errors.DoesNotExist as ex:
             LOG.debug(ex)
-            headers = {'status': 404}
-            return api_utils.error_response(req, ex, headers)
+            return fail(ex, {'status': 404})
         except storage_errors.MessageConflict as ex:
             LOG.exception(ex)
             error = _(u'No messages could be enqueued.')
-            headers = {'status': 500}
-            return api_utils.error_response(req, ex, headers, error)
+            return fail(ex, {'status': 500}, error)
         except Exception as ex:
             LOG.exception(ex)
             error = _(u'Messages could not be enqueued.')
-            headers = {'status': 500}
-            return api_utils.error_response(req, ex, headers, error)
+            return fail(ex, {'status': 500}, error)
 
-        # Prepare the response
-        headers = {'status': 201}
-        ids_value = ','.join(message_ids)
-        body = {'message_ids': ids_value}
+        if self._fanout.has_subscribers(project_id, queue_name):
+            pushed = [{'id': message_id, 'ttl': message['ttl'], 'age': 0,
+                       'body': message['body']}
+                      for message_id, message in zip(message_ids, posted)]
+            self._fanout.notify(project_id, queue_name, pushed)
 
-        resp = response.Response(req, body, headers)
-        return resp
+        # Prepare the responses, handing each request its own IDs
+        offset = 0
+        for index, messages in accepted:
+            ids = message_ids[offset:offset + len(messages)]
+            offset += len(messages)
+
+            headers = {'status': 201}
+            body = {'message_ids': ','.join(ids)}
+            resps[index] = response.Response(reqs[index], body, headers)
+
+        return resps
 
     @api_utils.raises_conn_error
     def message_delete(self, req):
@@ -613,4 +756,268 @@ class Endpoints(object):
         body = {'messages': messages}
 
         resp = response.Response(req, body, headers)
-        return resp
\ No newline at end of file
+        return resp
+
+    @staticmethod
+    def _get_wait(req):
+        wait = req._body.get('wait')
+        if not wait:
+            return 0
+
+        return max(0, min(int(wait), _MAX_WAIT))
+
+    def _long_poll(self, project_id, queue_name, wait, fetch):
+        """Fetches messages from a queue, waiting for them if needed.
+
+        `fetch` is called again every time messages are posted to the
+        queue through this node, until it finds some or `wait` seconds
+        have elapsed. The calling thread is blocked meanwhile, so
+        transports must bound how many requests wait at the same time.
+
+        :param wait: Seconds to wait for messages, 0 not to wait.
+        :param fetch: Callable returning a tuple whose last item is
+            the list of messages found.
+        :returns: The last result of `fetch`.
+        """
+        if not wait:
+            return fetch()
+
+        deadline = time.time() + wait
+        posted = threading.Event()
+
+        # Subscribe before fetching, so that messages posted while
+        # fetching aren't missed.
+        self._fanout.subscribe(project_id, queue_name, posted,
+                               lambda messages: posted.set())
+        try:
+            while True:
+                posted.clear()
+                result = fetch()
+
+                remaining = deadline - time.time()
+                if result[-1] or remaining <= 0:
+                    return result
+
+                posted.wait(remaining)
+        finally:
+            self._fanout.unsubscribe(project_id, queue_name, posted)
+
+    # Claims
+    @api_utils.raises_conn_error
+    def claim_create(self, req):
+        """Creates a claim
+
+        When `renew` is set in the body, the claim is leased to the
+        request's connection: its TTL is renewed for as long as the
+        connection is open, and it is released once it closes.
+
+        When `wait` is set in the body and there are no messages to
+        claim, the request waits up to that many seconds for some to
+        be posted through this node.
+
+        :param req: Request instance ready to be sent.
+        :type req: `api.common.Request`
+        :return: resp: Response instance
+        :type: resp: `api.common.Response`
+        """
+        project_id = req._headers.get('X-Project-ID')
+        queue_name = req._body.get('queue_name')
+        renew = req._body.get('renew', False)
+
+        LOG.debug(u'Claims create - queue: %(queue)s, '
+                  u'project: %(project)s',
+                  {'queue': queue_name, 'project': project_id})
+
+        if renew and req._connection is None:
+            ex = _(u'Invalid request.')
+            error = _(u'Renewed claims require a persistent connection.')
+            headers = {'status': 400}
+            return api_utils.error_response(req, ex, headers, error)
+
+        limit = req._body.get('limit')
+        claim_options = {} if limit is None else {'limit': limit}
+
+        def fetch():
+            cid, msgs = self._claim_controller.create(
+                queue_name,
+                metadata=metadata,
+                project=project_id,
+                **claim_options)
+
+            # Buffer claimed messages
+            return cid, list(msgs)
+
+        try:
+            metadata = api_utils.sanitize(req._body, _CLAIM_SPEC)
+            self._validate.claim_creation(metadata, limit=limit)
+
+            cid, resp_msgs = self._long_poll(project_id, queue_name,
+                                             self._get_wait(req), fetch)
+
+        except (api_errors.BadRequest,
+                validation.ValidationFailed) as ex:
+            LOG.debug(ex)
+            headers = {'status': 400}
+            return api_utils.error_response(req, ex, headers)
+        except storage_errors.DoesNotExist as ex:
+            LOG.debug(ex)
+            headers = {'status': 404}
+            return api_utils.error_response(req, ex, headers)
+        except Exception as ex:
+            LOG.exception(ex)
+            error = _(u'Claim could not be created.')
+            headers = {'status': 503}
+            return api_utils.error_response(req, ex, headers, error)
+
+        # Prepare response
+        if not resp_msgs:
+            headers = {'status': 204}
+            return response.Response(req, {}, headers)
+
+        if renew:
+            self._leases.hold(req._connection, project_id, queue_name,
+                              cid, metadata)
+
+        resp_msgs = [api_utils.format_message(msg) for msg in resp_msgs]
+
+        headers = {'status': 201}
+        body = {'claim_id': cid, 'messages': resp_msgs}
+
+        resp = response.Response(req, body, headers)
+        return resp
+
+    @api_utils.raises_conn_error
+    def claim_get(self, req):
+        """Gets a claim
+
+        :param req: Request instance ready to be sent.
+        :type req: `api.common.Request`
+        :return: resp: Response instance
+        :type: resp: `api.common.Response`
+        """
+        project_id = req._headers.get('X-Project-ID')
+        queue_name = req._body.get('queue_name')
+        claim_id = req._body.get('claim_id')
+
+        LOG.debug(u'Claim get - claim: %(claim_id)s, '
+                  u'queue: %(queue_name)s, project: %(project_id)s',
+                  {'queue_name': queue_name,
+                   'project_id': project_id,
+                   'claim_id': claim_id})
+        try:
+            meta, msgs = self._claim_controller.get(
+                queue_name,
+                claim_id=claim_id,
+                project=project_id)
+
+            # Buffer claimed messages
+            meta['messages'] = list(msgs)
+
+        except storage_errors.DoesNotExist as ex:
+            LOG.debug(ex)
+            headers = {'status': 404}
+            return api_utils.error_response(req, ex, headers)
+        except Exception as ex:
+            LOG.exception(ex)
+            error = _(u'Claim could not be queried.')
+            headers = {'status': 503}
+            return api_utils.error_response(req, ex, headers, error)
+
+        # Prepare response
+        meta['messages'] = [api_utils.format_message(msg)
+                            for msg in meta['messages']]
+
+        headers = {'status': 200}
+        body = meta
+
+        resp = response.Response(req, body, headers)
+        return resp
+
+    @api_utils.raises_conn_error
+    def claim_update(self, req):
+        """Updates a claim
+
+        :param req: Request instance ready to be sent.
+        :type req: `api.common.Request`
+        :return: resp: Response instance
+        :type: resp: `api.common.Response`
+        """
+        project_id = req._headers.get('X-Project-ID')
+        queue_name = req._body.get('queue_name')
+        claim_id = req._body.get('claim_id')
+
+        LOG.debug(u'Claim update - claim: %(claim_id)s, '
+                  u'queue: %(queue_name)s, project:%(project_id)s',
+                  {'queue_name': queue_name,
+                   'project_id': project_id,
+                   'claim_id': claim_id})
+
+        try:
+            metadata = api_utils.sanitize(req._body, _CLAIM_SPEC)
+            self._validate.claim_updating(metadata)
+            self._claim_controller.update(queue_name,
+                                          claim_id=claim_id,
+                                          metadata=metadata,
+                                          project=project_id)
+
+        except (api_errors.BadRequest,
+                validation.ValidationFailed) as ex:
+            LOG.debug(ex)
+            headers = {'status': 400}
+            return api_utils.error_response(req, ex, headers)
+        except storage_errors.DoesNotExist as ex:
+            LOG.debug(ex)
+            headers = {'status': 404}
+            return api_utils.error_response(req, ex, headers)
+        except Exception as ex:
+            LOG.exception(ex)
+            error = _(u'Claim could not be updated.')
+            headers = {'status': 503}
+            return api_utils.error_response(req, ex, headers, error)
+
+        # Keep renewing a leased claim with its new TTL
+        self._leases.update(project_id, queue_name, claim_id, metadata)
+
+        headers = {'status': 204}
+        body = {}
+
+        resp = response.Response(req, body, headers)
+        return resp
+
+    @api_utils.raises_conn_error
+    def claim_delete(self, req):
+        """Deletes a claim
+
+        :param req: Request instance ready to be sent.
+        :type req: `api.common.Request`
+        :return: resp: Response instance
+        :type: resp: `api.common.Response`
+        """
+        project_id = req._headers.get('X-Project-ID')
+        queue_name = req._body.get('queue_name')
+        claim_id = req._body.get('claim_id')
+
+        LOG.debug(u'Claim delete - claim: %(claim_id)s, '
+                  u'queue: %(queue_name)s, project: %(project_id)s',
+                  {'queue_name': queue_name,
+                   'project_id': project_id,
+                   'claim_id': claim_id})
+
+        self._leases.forget(project_id, queue_name, claim_id)
+
+        try:
+            self._claim_controller.delete(queue_name,
+                                          claim_id=claim_id,
+                                          project=project_id)
+
+        except Exception as ex:
+            LOG.exception(ex)
+            error = _(u'Claim could not be deleted.')
+            headers = {'status': 503}
+            return api_utils.error_response(req, ex, headers, error)
+
+        headers = {'status': 204}
+        body = {}
+
+        resp = response.Response(req, body, headers)
+        return resp
@@ -66,6 +66,48 @@ class RequestSchema(api.Api):
             'admin': True,
         },
 
+        'authenticate': {
+            'properties': {
+                'action': {'enum': ['authenticate']},
+                'headers': {
+                    'type': 'object',
+                    'properties': headers,
+                    'required': ['Client-ID', 'X-Project-ID']
+                }
+            },
+            'required': ['action', 'headers'],
+        },
+
+        'connection_list': {
+            'properties': {
+                'action': {'enum': ['connection_list']},
+                'headers': {
+                    'type': 'object',
+                    'properties': headers,
+                },
+                'body': {
+                    'type': 'object',
+                    'properties': {
+                        'limit': {'type': 'integer', 'minimum': 1},
+                    },
+                }
+            },
+            'required': ['action', 'headers'],
+            'admin': True,
+        },
+
+        'connection_stats': {
+            'properties': {
+                'action': {'enum': ['connection_stats']},
+                'headers': {
+                    'type': 'object',
+                    'properties': headers,
+                }
+            },
+            'required': ['action', 'headers'],
+            'admin': True,
+        },
+
         # Queues
         'queue_list': {
             'properties': {
@@ -126,7 +168,7 @@ class RequestSchema(api.Api):
 
         'queue_get': {
             'properties': {
-                'action': {'enum': ['queue_delete']},
+                'action': {'enum': ['queue_get']},
                 'headers': {
                     'type': 'object',
                     'properties': headers,
@@ -163,6 +205,44 @@ class RequestSchema(api.Api):
             'admin': True
         },
 
+        'queue_subscribe': {
+            'properties': {
+                'action': {'enum': ['queue_subscribe']},
+                'headers': {
+                    'type': 'object',
+                    'properties': headers,
+                    'required': ['Client-ID', 'X-Project-ID']
+                },
+                'body': {
+                    'type': 'object',
+                    'properties': {
+                        'queue_name': {'type': 'string'},
+                    },
+                    'required': ['queue_name'],
+                }
+            },
+            'required': ['action', 'headers', 'body']
+        },
+
+        'queue_unsubscribe': {
+            'properties': {
+                'action': {'enum': ['queue_unsubscribe']},
+                'headers': {
+                    'type': 'object',
+                    'properties': headers,
+                    'required': ['Client-ID', 'X-Project-ID']
+                },
+                'body': {
+                    'type': 'object',
+                    'properties': {
+                        'queue_name': {'type': 'string'},
+                    },
+                    'required': ['queue_name'],
+                }
+            },
+            'required': ['action', 'headers', 'body']
+        },
+
         # Messages
         'message_list': {
             'properties': {
@@ -180,6 +260,7 @@ class RequestSchema(api.Api):
                         'limit': {'type': 'integer'},
                         'echo': {'type': 'boolean'},
                         'include_claimed': {'type': 'boolean'},
+                        'wait': {'type': 'integer', 'minimum': 0},
                     },
                     'required': ['queue_name'],
                 }
@@ -303,7 +384,9 @@ class RequestSchema(api.Api):
                         'queue_name': {'type': 'string'},
                         'limit': {'type': 'integer'},
                         'ttl': {'type': 'integer'},
-                        'grace': {'type': 'integer'}
+                        'grace': {'type': 'integer'},
+                        'renew': {'type': 'boolean'},
+                        'wait': {'type': 'integer', 'minimum': 0}
                     },
                     'required': ['queue_name'],
                 }
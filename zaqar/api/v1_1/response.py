@@ -402,3 +402,5 @@ class ResponseSchema(api.Api):
             }
 
         }
+
+        super(ResponseSchema, self).__init__()
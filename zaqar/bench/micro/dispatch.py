@@ -0,0 +1,78 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures the overhead of dispatching requests to the endpoints.
+
+Endpoints are replaced by a function doing nothing, so the figures
+only account for looking the action up, checking the headers and,
+where noted, validating the request.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import timeit
+
+from zaqar.api import handler
+from zaqar.bench.micro import validation
+from zaqar.common.api import request
+
+
+class _Controllers(object):
+
+    def __getattr__(self, name):
+        return None
+
+
+def _noop(req):
+    return None
+
+
+def _report(name, seconds, number):
+    print('{0:<40} {1:>8.2f} us/request'.format(name,
+                                                seconds / number * 1e6))
+
+
+def main(number=200000):
+    api = handler.Handler(_Controllers(), _Controllers(), None)
+
+    actions = api._schemas[api.DEFAULT_API].schema
+    endpoints = type('_Endpoints', (object,),
+                     dict((action, staticmethod(_noop))
+                          for action in actions))()
+    for route in api._routes[api.DEFAULT_API].values():
+        route.endpoint = _noop
+
+    for action, frame in sorted(validation.FRAMES.items()):
+        req = request.Request(action=action, body=frame['body'],
+                              headers=frame['headers'])
+
+        def validate_and_dispatch():
+            api.validate(frame)
+            api.process_request(req)
+
+        timings = [
+            ('getattr', lambda: getattr(endpoints, req._action)(req)),
+            ('dispatch table', lambda: api.process_request(req)),
+            ('dispatch table, validated', validate_and_dispatch),
+        ]
+
+        print(action)
+        for name, func in timings:
+            _report('  ' + name, timeit.timeit(func, number=number), number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures websocket frames per second for each event loop policy.
+
+For every policy that can be imported, a server process answering
+frames with an empty response is forked, and a client in this process
+pipelines frames over a few connections using the default loop.
+Frames per core are computed from the CPU time the server process
+used, so the figure doesn't depend on how fast the client is.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import signal
+import socket
+import time
+
+from autobahn.asyncio import websocket
+
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio
+
+from zaqar.common.api import response
+from zaqar.openstack.common import importutils
+from zaqar.transport.websocket import driver
+from zaqar.transport.websocket import factory
+from zaqar.transport.websocket import protocol
+
+POLICIES = [None, 'uvloop']
+
+FRAME = json.dumps({
+    'action': 'queue_list',
+    'headers': {'Client-ID': '6a9a0d3c-6d4d-4f1d-a2f8-4a1e2f19d5b1',
+                'X-Project-ID': 'bench'},
+    'body': {},
+}).encode('utf-8')
+
+
+class _Handler(object):
+
+    def process_request(self, req):
+        return response.Response(req, {}, {'status': 200})
+
+    def connection_closed(self, connection):
+        pass
+
+
+class _Client(websocket.WebSocketClientProtocol):
+
+    def onOpen(self):
+        for _i in range(min(self.factory.window, self.factory.remaining)):
+            self._send()
+
+    def onMessage(self, payload, isBinary):
+        self.factory.received += 1
+        if self.factory.remaining:
+            self._send()
+        elif self.factory.received == self.factory.total:
+            self.factory.done.set_result(None)
+
+    def _send(self):
+        self.factory.remaining -= 1
+        self.sendMessage(FRAME, False)
+
+
+def _serve(sock, policy):
+    driver.set_event_loop_policy(policy)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    uri = 'ws://127.0.0.1:{0}'.format(sock.getsockname()[1])
+    fact = factory.ProtocolFactory(uri, debug=False, handler=_Handler(),
+                                   loop=loop, trusted_peers=['127.0.0.1'])
+    fact.protocol = protocol.MessagingProtocol
+
+    loop.run_until_complete(loop.create_server(fact, sock=sock))
+    loop.add_signal_handler(signal.SIGTERM, loop.stop)
+    loop.run_forever()
+
+
+def _run_client(port, total, connections, window):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    fact = websocket.WebSocketClientFactory(
+        'ws://127.0.0.1:{0}'.format(port), loop=loop)
+    fact.protocol = _Client
+    fact.total = fact.remaining = total
+    fact.received = 0
+    fact.window = window
+    fact.done = asyncio.Future(loop=loop)
+
+    started = time.time()
+    for _i in range(connections):
+        loop.run_until_complete(
+            loop.create_connection(fact, '127.0.0.1', port))
+
+    loop.run_until_complete(fact.done)
+    elapsed = time.time() - started
+    loop.close()
+    return elapsed
+
+
+def bench(policy, total, connections, window):
+    """Runs the benchmark against a server using `policy`.
+
+    :returns: A tuple with the wall clock and server CPU seconds
+        spent answering `total` frames.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(128)
+    sock.setblocking(False)
+    port = sock.getsockname()[1]
+
+    pid = os.fork()
+    if pid == 0:
+        status = 0
+        try:
+            _serve(sock, policy)
+        except BaseException:
+            status = 1
+        finally:
+            os._exit(status)
+
+    sock.close()
+
+    try:
+        elapsed = _run_client(port, total, connections, window)
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        _pid, _status, usage = os.wait4(pid, 0)
+
+    return elapsed, usage.ru_utime + usage.ru_stime
+
+
+def main(total=50000, connections=4, window=32):
+    for policy in POLICIES:
+        name = policy or 'asyncio'
+        if policy and importutils.try_import(policy) is None:
+            print('{0:<12} not installed'.format(name))
+            continue
+
+        elapsed, cpu = bench(policy, total, connections, window)
+        print('{0:<12} {1:>10.0f} frames/s {2:>10.0f} frames/s/core'.format(
+            name, total / elapsed, total / cpu))
+
+
+if __name__ == '__main__':
+    main()
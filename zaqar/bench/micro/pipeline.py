@@ -0,0 +1,99 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures the overhead of calling controllers through a pipeline.
+
+The message controller is replaced by one doing nothing, behind
+stages that do not implement the called methods, and a stage that
+implements `list` without halting the pipeline. Figures are given
+for calling the controller directly, through the pipeline, and
+through a walk of the stages looking the method up on each of them,
+the way pipelines used to be consumed.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import timeit
+
+from zaqar.common import pipeline
+
+
+class _Controller(object):
+
+    def post(self, queue, messages, client_uuid, project=None):
+        return ['0']
+
+    def list(self, queue, project=None, marker=None, limit=10,
+             echo=False, client_uuid=None, include_claimed=False):
+        return iter(())
+
+
+class _Stage(object):
+    pass
+
+
+class _ListStage(object):
+
+    def list(self, queue, project=None, **kwargs):
+        return None
+
+
+def _walk(stages, method):
+    def consumer(*args, **kwargs):
+        for stage in stages:
+            try:
+                target = getattr(stage, method)
+            except AttributeError:
+                continue
+
+            result = target(*args, **kwargs)
+            if result is not None:
+                return result
+
+    return consumer
+
+
+def _report(name, seconds, number):
+    print('{0:<40} {1:>8.2f} us/call'.format(name, seconds / number * 1e6))
+
+
+def main(number=500000):
+    controller = _Controller()
+    stages = [_Stage(), _Stage(), _ListStage(), controller]
+    pipe = pipeline.Pipeline(stages)
+
+    messages = [{'ttl': 300, 'body': {'event': 'ping'}}]
+    calls = [
+        ('post', (('q', messages, 'c'), {'project': 'p'})),
+        ('list', (('q',), {'project': 'p', 'limit': 10})),
+    ]
+
+    for method, (args, kwargs) in calls:
+        timings = [
+            ('direct', getattr(controller, method)),
+            ('pipeline', getattr(pipe, method)),
+            ('getattr walk', _walk(stages, method)),
+        ]
+
+        print(method)
+        for name, func in timings:
+            seconds = timeit.timeit(lambda: func(*args, **kwargs),
+                                    number=number)
+            _report('  ' + name, seconds, number)
+
+
+if __name__ == '__main__':
+    main()
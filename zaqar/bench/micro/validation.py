@@ -0,0 +1,66 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compares compiled API validators against plain jsonschema."""
+
+from __future__ import division
+from __future__ import print_function
+
+import timeit
+
+from jsonschema import validators
+
+from zaqar.api.v1_1 import request
+
+FRAMES = {
+    'message_post': {
+        'action': 'message_post',
+        'headers': {'Client-ID': '6a9a0d3c-6d4d-4f1d-a2f8-4a1e2f19d5b1',
+                    'X-Project-ID': 'bench'},
+        'body': {'queue_name': 'bench',
+                 'messages': [{'ttl': 300, 'body': {'event': 'x'}}]},
+    },
+    'message_list': {
+        'action': 'message_list',
+        'headers': {'Client-ID': '6a9a0d3c-6d4d-4f1d-a2f8-4a1e2f19d5b1',
+                    'X-Project-ID': 'bench'},
+        'body': {'queue_name': 'bench', 'limit': 10, 'echo': True},
+    },
+}
+
+
+def _report(name, seconds, number):
+    print('{0:<40} {1:>8.2f} us/frame'.format(name,
+                                              seconds / number * 1e6))
+
+
+def main(number=20000):
+    schema = request.RequestSchema()
+
+    for action, frame in sorted(FRAMES.items()):
+        draft4 = validators.Draft4Validator(schema.get_schema(action))
+
+        timings = [
+            ('jsonschema', lambda: draft4.is_valid(frame)),
+            ('compiled', lambda: schema.validate(action, frame)),
+        ]
+
+        print(action)
+        for name, func in timings:
+            _report('  ' + name, timeit.timeit(func, number=number), number)
+
+
+if __name__ == '__main__':
+    main()
@@ -25,6 +25,7 @@ from zaqar.openstack.common import log
 from zaqar.storage import pipeline
 from zaqar.storage import pooling
 from zaqar.storage import utils as storage_utils
+from zaqar.transport import ratelimit
 from zaqar.transport import validation
 
 LOG = log.getLogger(__name__)
@@ -98,7 +99,13 @@ class Bootstrap(object):
     def api(self):
         LOG.debug(u'Loading API handler')
         validate = validation.Validator(self.conf)
-        return handler.Handler(self.storage, self.control, validate)
+
+        limiter = ratelimit.RateLimiter(self.conf)
+        if not limiter.enabled:
+            limiter = None
+
+        return handler.Handler(self.storage, self.control, validate,
+                               limiter=limiter)
 
     @decorators.lazy_property(write=False)
     def storage(self):
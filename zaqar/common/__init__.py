@@ -15,4 +15,5 @@
 
 from zaqar.common import pipeline
 
+ObserverQueue = pipeline.ObserverQueue
 Pipeline = pipeline.Pipeline
@@ -13,9 +13,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import jsonschema
 from jsonschema import validators
+import six
 
+from zaqar.common.api import compiler
 from zaqar.common import errors
 from zaqar.i18n import _
 from zaqar.openstack.common import log
@@ -26,7 +27,13 @@ LOG = log.getLogger(__name__)
 class Api(object):
 
     schema = {}
-    validators = {}
+
+    def __init__(self):
+        # Validators are compiled once per instance, as subclasses
+        # define different schemas for the same action names.
+        self.validators = dict(
+            (action, compiler.compile_schema(schema))
+            for action, schema in six.iteritems(self.schema))
 
     def get_schema(self, action):
         """Returns the schema for an action
@@ -68,14 +75,19 @@ class Api(object):
             does not exist
         """
 
-        if action not in self.validators:
-            schema = self.get_schema(action)
-            self.validators[action] = validators.Draft4Validator(schema)
-
         try:
-            self.validators[action].validate(body)
-        except jsonschema.ValidationError as ex:
-            LOG.debug('Schema validation failed. %s.' % str(ex))
-            return False
-
-        return True
+            validator = self.validators[action]
+        except KeyError:
+            schema = self.get_schema(action)
+            validator = compiler.compile_schema(schema)
+            self.validators[action] = validator
+
+        if validator(body):
+            return True
+
+        # Only pay for jsonschema's detailed error reporting
+        # when the document is actually invalid.
+        error = validators.Draft4Validator(self.schema[action]).iter_errors
+        LOG.debug('Schema validation failed. %s.',
+                  '; '.join(ex.message for ex in error(body)))
+        return False
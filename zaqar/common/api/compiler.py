@@ -0,0 +1,235 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Compiles JSON schemas into plain validation callables.
+
+jsonschema walks the schema and dispatches every keyword through its
+validator registry on each call. The API schemas only use a handful of
+keywords, so they are turned into nested closures once, up front, and
+validating a document just runs those closures. Sub-schemas using any
+keyword this module doesn't know about are delegated to jsonschema's
+Draft4Validator, which keeps the results identical.
+"""
+
+import re
+
+from jsonschema import validators
+import six
+
+# Keys that annotate the API schemas but don't take
+# part in validation.
+_ANNOTATIONS = frozenset(['$schema', 'admin', 'default', 'description',
+                          'id', 'method', 'ref', 'title'])
+
+_SUPPORTED = frozenset(['additionalProperties', 'enum', 'items',
+                        'maxItems', 'maximum', 'maxLength', 'minItems',
+                        'minimum', 'minLength', 'pattern', 'properties',
+                        'required', 'type']) | _ANNOTATIONS
+
+
+def _is_integer(instance):
+    return (isinstance(instance, six.integer_types) and
+            not isinstance(instance, bool))
+
+
+def _is_number(instance):
+    return (isinstance(instance, six.integer_types + (float,)) and
+            not isinstance(instance, bool))
+
+
+_TYPES = {
+    'array': lambda instance: isinstance(instance, list),
+    'boolean': lambda instance: isinstance(instance, bool),
+    'integer': _is_integer,
+    'null': lambda instance: instance is None,
+    'number': _is_number,
+    'object': lambda instance: isinstance(instance, dict),
+    'string': lambda instance: isinstance(instance, six.string_types),
+}
+
+
+def compile_schema(schema):
+    """Compiles `schema` into a validation callable.
+
+    :param schema: A Draft 4 JSON schema.
+    :type schema: dict
+    :returns: A callable taking a document and returning True if it
+        is valid against `schema`, False otherwise.
+    """
+
+    if (not isinstance(schema, dict) or
+            not _SUPPORTED.issuperset(schema) or
+            not _known_types(schema.get('type', ()))):
+        return validators.Draft4Validator(schema).is_valid
+
+    checks = []
+
+    if 'type' in schema:
+        checks.append(_compile_type(schema['type']))
+
+    if 'enum' in schema:
+        enum = list(schema['enum'])
+        checks.append(lambda instance: instance in enum)
+
+    if ('properties' in schema or 'required' in schema or
+            'additionalProperties' in schema):
+        checks.append(_compile_object(schema))
+
+    if 'items' in schema or 'minItems' in schema or 'maxItems' in schema:
+        checks.append(_compile_array(schema))
+
+    if 'minimum' in schema or 'maximum' in schema:
+        checks.append(_compile_range(schema))
+
+    if ('pattern' in schema or 'minLength' in schema or
+            'maxLength' in schema):
+        checks.append(_compile_string(schema))
+
+    if not checks:
+        return lambda instance: True
+
+    if len(checks) == 1:
+        return checks[0]
+
+    checks = tuple(checks)
+    return lambda instance: all(check(instance) for check in checks)
+
+
+def _known_types(types):
+    if isinstance(types, six.string_types):
+        types = [types]
+
+    return all(name in _TYPES for name in types)
+
+
+def _compile_type(types):
+    if isinstance(types, six.string_types):
+        return _TYPES[types]
+
+    checks = tuple(_TYPES[name] for name in types)
+    return lambda instance: any(check(instance) for check in checks)
+
+
+def _compile_object(schema):
+    properties = tuple(
+        (name, compile_schema(subschema))
+        for name, subschema in six.iteritems(schema.get('properties', {})))
+    required = tuple(schema.get('required', ()))
+
+    additional = schema.get('additionalProperties', True)
+    known = frozenset(schema.get('properties', {}))
+    if additional is True:
+        check_additional = None
+    elif additional is False:
+        def check_additional(value):
+            return False
+    else:
+        check_additional = compile_schema(additional)
+
+    def validate(instance):
+        if not isinstance(instance, dict):
+            return True
+
+        for name in required:
+            if name not in instance:
+                return False
+
+        for name, check in properties:
+            if name in instance and not check(instance[name]):
+                return False
+
+        if check_additional is not None:
+            for name in instance:
+                if (name not in known and
+                        not check_additional(instance[name])):
+                    return False
+
+        return True
+
+    return validate
+
+
+def _compile_array(schema):
+    items = schema.get('items')
+    min_items = schema.get('minItems')
+    max_items = schema.get('maxItems')
+
+    if isinstance(items, list):
+        # Tuple validation is rare enough in the API schemas
+        # to just let jsonschema handle it.
+        return validators.Draft4Validator(schema).is_valid
+
+    check_item = compile_schema(items) if items is not None else None
+
+    def validate(instance):
+        if not isinstance(instance, list):
+            return True
+
+        if min_items is not None and len(instance) < min_items:
+            return False
+
+        if max_items is not None and len(instance) > max_items:
+            return False
+
+        if check_item is not None:
+            for item in instance:
+                if not check_item(item):
+                    return False
+
+        return True
+
+    return validate
+
+
+def _compile_range(schema):
+    minimum = schema.get('minimum')
+    maximum = schema.get('maximum')
+
+    def validate(instance):
+        if not _is_number(instance):
+            return True
+
+        if minimum is not None and instance < minimum:
+            return False
+
+        if maximum is not None and instance > maximum:
+            return False
+
+        return True
+
+    return validate
+
+
+def _compile_string(schema):
+    pattern = schema.get('pattern')
+    search = re.compile(pattern).search if pattern is not None else None
+    min_length = schema.get('minLength')
+    max_length = schema.get('maxLength')
+
+    def validate(instance):
+        if not isinstance(instance, six.string_types):
+            return True
+
+        if min_length is not None and len(instance) < min_length:
+            return False
+
+        if max_length is not None and len(instance) > max_length:
+            return False
+
+        if search is not None and not search(instance):
+            return False
+
+        return True
+
+    return validate
@@ -0,0 +1,155 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""In-process fan-out of posted messages to queue subscribers.
+
+Subscribers are registered per project/queue together with the owner
+they belong to, usually a transport connection. When messages are
+posted through this process, every callback registered for the queue
+is invoked with the new messages. Messages posted by other processes
+or nodes are not seen by this registry.
+
+Owners that were removed may not subscribe anymore, so that requests
+completing after their connection closed don't leave subscribers
+nothing would remove.
+"""
+
+import collections
+import threading
+import time
+
+import zaqar.openstack.common.log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Seconds during which removed owners are remembered. Must be longer
+# than requests may take to complete.
+_REMOVED_OWNER_TTL = 120
+
+
+class Registry(object):
+    """Keeps track of queue subscribers and notifies them.
+
+    All methods are thread-safe. Notifying a queue nobody is
+    subscribed to doesn't take any lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+        # (project, queue) -> {owner: callback}
+        self._subscribers = {}
+
+        # owner -> set([(project, queue), ...])
+        self._owners = collections.defaultdict(set)
+
+        # owner -> time it was removed, oldest first
+        self._removed = collections.OrderedDict()
+
+    def subscribe(self, project, queue, owner, callback):
+        """Registers `callback` for messages posted to a queue.
+
+        Subscribing the same owner twice to a queue replaces
+        the previous callback.
+
+        :param project: Project the queue belongs to.
+        :param queue: Name of the queue.
+        :param owner: Hashable object the subscription belongs to.
+        :param callback: Callable taking the list of posted messages.
+        :returns: True if subscribed, False if `owner` was removed.
+        """
+        key = (project, queue)
+
+        with self._lock:
+            if owner in self._removed:
+                return False
+
+            self._subscribers.setdefault(key, {})[owner] = callback
+            self._owners[owner].add(key)
+
+        return True
+
+    def unsubscribe(self, project, queue, owner):
+        """Removes `owner`'s subscription to a queue.
+
+        :returns: True if the owner was subscribed, False otherwise.
+        """
+        key = (project, queue)
+
+        with self._lock:
+            return self._discard(key, owner)
+
+    def remove(self, owner):
+        """Removes every subscription belonging to `owner`.
+
+        `owner` may not subscribe again afterwards.
+        """
+        now = time.time()
+
+        with self._lock:
+            while self._removed:
+                removed, removed_at = next(iter(self._removed.items()))
+                if now - removed_at < _REMOVED_OWNER_TTL:
+                    break
+                del self._removed[removed]
+
+            self._removed.pop(owner, None)
+            self._removed[owner] = now
+
+            for key in self._owners.pop(owner, ()):
+                self._discard(key, owner, purge_owner=False)
+
+    def has_subscribers(self, project, queue):
+        return (project, queue) in self._subscribers
+
+    def notify(self, project, queue, messages):
+        """Calls every callback subscribed to a queue.
+
+        Errors raised by a callback are logged and do not prevent
+        the remaining subscribers from being notified.
+
+        :returns: The number of subscribers notified.
+        """
+        if (project, queue) not in self._subscribers:
+            return 0
+
+        with self._lock:
+            callbacks = list(self._subscribers.get((project, queue),
+                                                   {}).values())
+
+        for callback in callbacks:
+            try:
+                callback(messages)
+            except Exception as ex:
+                LOG.exception(ex)
+
+        return len(callbacks)
+
+    def _discard(self, key, owner, purge_owner=True):
+        subscribers = self._subscribers.get(key)
+        if not subscribers or owner not in subscribers:
+            return False
+
+        del subscribers[owner]
+        if not subscribers:
+            del self._subscribers[key]
+
+        if purge_owner:
+            keys = self._owners.get(owner)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._owners[owner]
+
+        return True
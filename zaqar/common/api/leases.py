@@ -0,0 +1,232 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Server-side renewal of claims held by a live connection.
+
+A claim leased to an owner, usually a transport connection, has its
+TTL renewed whenever half of it has elapsed, so the owner doesn't have
+to update it. Once the owner goes away its claims are deleted, making
+the messages available to other consumers right away instead of after
+the claim expires. Claims leased to an owner that was already removed,
+e.g. by requests completing after their connection closed, are
+released right away as well.
+
+Storage calls are issued from a background thread, never from the
+caller's, so owners may be removed from an event loop.
+"""
+
+import collections
+import threading
+import time
+
+import zaqar.openstack.common.log as logging
+from zaqar.storage import errors as storage_errors
+
+LOG = logging.getLogger(__name__)
+
+# Seconds to wait for the next renewal when no claim is leased.
+_IDLE_INTERVAL = 60
+
+# Seconds to wait before retrying a renewal that failed.
+_RETRY_INTERVAL = 1
+
+# Seconds during which removed owners are remembered. Must be longer
+# than requests, long polls included, may take to complete.
+_REMOVED_OWNER_TTL = 120
+
+
+class _Lease(object):
+
+    __slots__ = ('owner', 'metadata', 'due')
+
+    def __init__(self, owner, metadata, due):
+        self.owner = owner
+        self.metadata = metadata
+        self.due = due
+
+
+class Keeper(object):
+    """Renews the claims leased to owners and releases them.
+
+    All methods are thread-safe. The renewal thread is started with
+    the first lease.
+
+    :param claim_controller: Storage controller the claims belong to.
+    """
+
+    def __init__(self, claim_controller):
+        self._claim_controller = claim_controller
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+        # (project, queue, claim_id) -> _Lease
+        self._leases = {}
+
+        # owner -> set([(project, queue, claim_id), ...])
+        self._owners = collections.defaultdict(set)
+
+        # Claims of removed owners, waiting to be deleted
+        self._released = []
+
+        # owner -> time it was removed, oldest first
+        self._removed = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._leases)
+
+    def hold(self, owner, project, queue, claim_id, metadata):
+        """Leases a claim to `owner`.
+
+        :param owner: Hashable object the claim is leased to.
+        :param project: Project the queue belongs to.
+        :param queue: Name of the queue.
+        :param claim_id: ID of the claim.
+        :param metadata: Claim's parameters, `ttl` and `grace`, to
+            renew it with.
+        """
+        key = (project, queue, claim_id)
+        due = time.time() + metadata['ttl'] / 2.0
+
+        with self._lock:
+            if owner in self._removed:
+                self._released.append(key)
+            else:
+                self._leases[key] = _Lease(owner, dict(metadata), due)
+                self._owners[owner].add(key)
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+        self._wakeup.set()
+
+    def update(self, project, queue, claim_id, metadata):
+        """Renews a leased claim with new parameters from now on.
+
+        Claims that aren't leased are ignored.
+        """
+        key = (project, queue, claim_id)
+
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is not None:
+                lease.metadata = dict(metadata)
+                lease.due = time.time() + metadata['ttl'] / 2.0
+
+        self._wakeup.set()
+
+    def forget(self, project, queue, claim_id):
+        """Stops renewing a claim without releasing it."""
+
+        key = (project, queue, claim_id)
+
+        with self._lock:
+            self._discard(key)
+
+    def remove(self, owner):
+        """Releases every claim leased to `owner`.
+
+        Claims leased to `owner` afterwards are released as well.
+        """
+        now = time.time()
+
+        with self._lock:
+            while self._removed:
+                removed, removed_at = next(iter(self._removed.items()))
+                if now - removed_at < _REMOVED_OWNER_TTL:
+                    break
+                del self._removed[removed]
+
+            self._removed.pop(owner, None)
+            self._removed[owner] = now
+
+            keys = self._owners.pop(owner, ())
+            for key in keys:
+                del self._leases[key]
+                self._released.append(key)
+
+        if keys:
+            self._wakeup.set()
+
+    def run_once(self, now):
+        """Deletes the released claims and renews the due ones.
+
+        :param now: Current time, in seconds since the epoch.
+        :returns: Seconds until the next renewal is due.
+        """
+        with self._lock:
+            released, self._released = self._released, []
+            due = [(key, dict(lease.metadata))
+                   for key, lease in self._leases.items() if lease.due <= now]
+
+        for project, queue, claim_id in released:
+            try:
+                self._claim_controller.delete(queue, claim_id=claim_id,
+                                              project=project)
+            except Exception as ex:
+                LOG.exception(ex)
+
+        for key, metadata in due:
+            project, queue, claim_id = key
+            next_due = now + metadata['ttl'] / 2.0
+            try:
+                self._claim_controller.update(queue, claim_id=claim_id,
+                                              metadata=metadata,
+                                              project=project)
+            except storage_errors.DoesNotExist as ex:
+                LOG.debug(ex)
+                with self._lock:
+                    self._discard(key)
+                continue
+            except Exception as ex:
+                # The claim is still good for half its TTL,
+                # so there is time to try again.
+                LOG.exception(ex)
+                next_due = now + _RETRY_INTERVAL
+
+            with self._lock:
+                lease = self._leases.get(key)
+                if lease is not None and lease.due <= now:
+                    lease.due = next_due
+
+        with self._lock:
+            if not self._leases:
+                return _IDLE_INTERVAL
+            return max(0, min(lease.due for lease in self._leases.values())
+                       - time.time())
+
+    def _run(self):
+        while True:
+            try:
+                timeout = self.run_once(time.time())
+            except Exception as ex:
+                LOG.exception(ex)
+                timeout = 1
+
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def _discard(self, key):
+        lease = self._leases.pop(key, None)
+        if lease is None:
+            return
+
+        keys = self._owners.get(lease.owner)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._owners[lease.owner]
@@ -33,14 +33,25 @@ class Request(object):
     :type headers: dict
     :param api: Api entry point. i.e: 'queues.v1'
     :type api: `six.text_type`.
+    :param request_id: Optional client-supplied identifier, echoed
+        back in the response so it can be matched to this request.
+        Default: None
+    :type request_id: `six.text_type` or int
+    :param connection: Transport connection the request was received
+        on, for transports that keep one open. It must provide a
+        thread-safe `push(resp)` method to send unsolicited responses
+        back to the client. Default: None
     """
 
     def __init__(self, action,
-                 body=None, headers=None, api=None):
+                 body=None, headers=None, api=None, request_id=None,
+                 connection=None):
         self._action = action
         self._body = body
         self._headers = headers or {}
         self._api = api
+        self._request_id = request_id
+        self._connection = connection
 
     @decorators.lazy_property()
     def deserialized_content(self):
@@ -53,5 +64,7 @@ class Request(object):
         action = self._action
         body = self._body
         headers = self._headers
+        request_id = self._request_id
 
-        return {'api': api, 'action': action, 'headers': headers, 'body': body}
\ No newline at end of file
+        return {'api': api, 'action': action, 'headers': headers,
+                'body': body, 'request_id': request_id}
@@ -37,10 +37,27 @@ class Response(object):
         self._body = body
         self._headers = headers or {}
 
-    def to_json(self):
-        request = self._request.to_json()
+    def get_request_summary(self):
+        """Returns the bits of the request echoed back to the client.
+
+        Only the action and, if the client supplied one, the request
+        ID are included; echoing the full request would send large
+        message bodies back over the wire.
+        """
+        summary = {'action': self._request._action}
+
+        request_id = self._request._request_id
+        if request_id is not None:
+            summary['request_id'] = request_id
+
+        return summary
+
+    def get_response(self):
+        """Returns the response as a serializable dict."""
+        request = self.get_request_summary()
         body = self._body
         headers = self._headers
-        return utils.to_json({'req': request,
-                              'headers': body,
-                              'body': headers})
+        return {'request': request, 'headers': headers, 'body': body}
+
+    def to_json(self):
+        return utils.to_json(self.get_response())
@@ -14,6 +14,8 @@
 
 import functools
 
+import six
+
 import zaqar.common.api.errors as api_errors
 import zaqar.common.api.response as response
 from zaqar.i18n import _
@@ -83,7 +85,7 @@ def sanitize(document, spec=None, doctype=JSONObject):
         If spec is None, the incoming documents will not be validated.
     :param doctype: type of document to expect; must be either
         JSONObject or JSONArray.
-    :raises: DocumentTypeNotSupported, TypeError
+    :raises: DocumentTypeNotSupported, BadRequestBody, TypeError
     :returns: A sanitized, filtered version of the document. If the
         document is a list of objects, each object will be filtered
         and returned in a new list. If, on the other hand, the document
@@ -95,7 +97,7 @@ def sanitize(document, spec=None, doctype=JSONObject):
         if not isinstance(document, JSONObject):
             raise api_errors.DocumentTypeNotSupported()
 
-        return document if spec is None else filter(document, spec)
+        return document if spec is None else _filter(document, spec)
 
     if doctype is JSONArray:
         if not isinstance(document, JSONArray):
@@ -104,11 +106,20 @@ def sanitize(document, spec=None, doctype=JSONObject):
         if spec is None:
             return document
 
-        return [filter(obj, spec) for obj in document]
+        return [_filter(obj, spec) for obj in document]
 
     raise TypeError('doctype must be either a JSONObject or JSONArray')
 
 
+def _filter(document, spec):
+    try:
+        return utils.filter_fields(document, spec)
+    except utils.UnexpectedJSONType:
+        raise api_errors.DocumentTypeNotSupported()
+    except utils.InvalidJSONField as ex:
+        raise api_errors.BadRequestBody(ex.description)
+
+
 def raises_conn_error(func):
     """Handles generic Exceptions
 
@@ -130,7 +141,7 @@ def raises_conn_error(func):
 
 
 def error_response(req, exception, headers=None, error=None):
-    body = {'exception': exception, 'error': error}
+    body = {'exception': six.text_type(exception), 'error': error}
     resp = response.Response(req, body, headers)
     return resp
 
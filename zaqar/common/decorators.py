@@ -50,7 +50,8 @@ def caches(keygen, ttl, cond=None):
     """Flags a getter method as being cached using oslo_cache.
 
     It is assumed that the containing class defines an attribute
-    named `_cache` that is an instance of an oslo_cache backend.
+    named `_cache` that is an instance of an oslo_cache backend,
+    or None to disable caching.
 
     The getter should raise an exception if the value can't be
     loaded, which will skip the caching step. Otherwise, the
@@ -89,11 +90,12 @@ def caches(keygen, ttl, cond=None):
         @functools.wraps(remover)
         def wrapper(self, *args, **kwargs):
             # First, purge from cache
-            key = keygen(*args, **kwargs)
-            del self._cache[key]
+            if self._cache is not None:
+                key = keygen(*args, **kwargs)
+                del self._cache[key]
 
             # Remove/delete from origin
-            remover(self, *args, **kwargs)
+            return remover(self, *args, **kwargs)
 
         return wrapper
 
@@ -101,6 +103,9 @@ def caches(keygen, ttl, cond=None):
 
         @functools.wraps(getter)
         def wrapper(self, *args, **kwargs):
+            if self._cache is None:
+                return getter(self, *args, **kwargs)
+
             key = keygen(*args, **kwargs)
             packed_value = self._cache.get(key)
 
@@ -27,11 +27,21 @@ that is not None.
 
 At least one of the stages has to implement the calling method. If none of
 them do, an AttributeError exception will be raised.
+
+Pipelines may also have observers: stages called once the result of the
+pipeline is known, off the caller's thread, through a bounded queue. The
+method implemented by an observer takes the result as its first argument,
+followed by the arguments the pipeline was called with. Observers can't
+alter the result, and don't delay it. They aren't notified of calls raising
+an exception.
 """
 
 import contextlib
+import threading
+import types
 
 import six
+from six.moves import queue as Queue
 
 from zaqar.common import decorators
 from zaqar.i18n import _
@@ -40,18 +50,123 @@ import zaqar.openstack.common.log as logging
 LOG = logging.getLogger(__name__)
 
 
+class ObserverQueue(object):
+    """Runs observer calls on a background thread.
+
+    Calls are dropped rather than queued past `maxsize` pending ones,
+    so that a slow observer can't hold up its callers or exhaust the
+    memory. Dropped and failed calls are counted, and a warning is
+    logged whenever the queue starts overflowing. The thread is
+    started with the first call.
+
+    :param maxsize: Number of calls allowed to be pending.
+    """
+
+    def __init__(self, maxsize=1000):
+        self._queue = Queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._overflowing = False
+
+        self.submitted = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def submit(self, func, args, kwargs):
+        """Queues a call to `func`, unless the queue is full."""
+
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run)
+                    self._thread.daemon = True
+                    self._thread.start()
+
+        try:
+            self._queue.put_nowait((func, args, kwargs))
+        except Queue.Full:
+            with self._lock:
+                self.dropped += 1
+                overflowing, self._overflowing = self._overflowing, True
+
+            if not overflowing:
+                LOG.warning(_(u'Observer queue is full, dropping calls '
+                              '(%(dropped)d dropped so far)'),
+                            {'dropped': self.dropped})
+            return
+
+        with self._lock:
+            self.submitted += 1
+            self._overflowing = False
+
+    def join(self):
+        """Waits for the pending calls to be done."""
+
+        self._queue.join()
+
+    def run_once(self, block=True):
+        """Makes the next pending call.
+
+        :returns: False if there was no call to make.
+        """
+        try:
+            func, args, kwargs = self._queue.get(block)
+        except Queue.Empty:
+            return False
+
+        try:
+            func(*args, **kwargs)
+        except Exception as ex:
+            LOG.exception(ex)
+            with self._lock:
+                self.failed += 1
+        finally:
+            self._queue.task_done()
+
+        return True
+
+    def _run(self):
+        while True:
+            self.run_once()
+
+
 class Pipeline(object):
+    """Calls the stages implementing a method until one returns a value.
 
-    def __init__(self, pipeline=None):
+    :param pipeline: Stages, in the order they are called in.
+    :param observers: Stages notified of the results, off the
+        caller's thread.
+    :param queue: `ObserverQueue` instance to notify observers
+        through; required if there are observers.
+    """
+
+    def __init__(self, pipeline=None, observers=None, queue=None):
         self._pipeline = pipeline and list(pipeline) or []
+        self._observers = observers and list(observers) or []
+        self._queue = queue
+        self._consumers = set()
 
     def append(self, stage):
         self._pipeline.append(stage)
 
+        # Consumers already built don't know about the new stage
+        for name in self._consumers:
+            delattr(self, name)
+        self._consumers.clear()
+
     @decorators.memoized_getattr
     def __getattr__(self, name):
-        with self.consumer_for(name) as consumer:
-            return consumer
+        # Don't build consumers for attributes looked up before
+        # __init__ is done, e.g. by copy or pickle.
+        if name.startswith('__') or name in ('_pipeline', '_observers',
+                                             '_queue', '_consumers'):
+            raise AttributeError(name)
+
+        self._consumers.add(name)
+        return self._build(name)
 
     @contextlib.contextmanager
     def consumer_for(self, method):
@@ -66,36 +181,81 @@ class Pipeline(object):
         :returns: A callable to consume the pipeline.
         """
 
+        yield self._build(method)
+
+    def _build(self, method):
+        consumer = self._build_chain(method)
+
+        observers = []
+        for stage in self._observers:
+            try:
+                observers.append(getattr(stage, method))
+            except AttributeError:
+                pass
+
+        if not observers:
+            return consumer
+
+        submit = self._queue.submit
+
+        def observed(*args, **kwargs):
+            result = consumer(*args, **kwargs)
+
+            # Generators can only be consumed once, by the caller
+            notified = (None if isinstance(result, types.GeneratorType)
+                        else result)
+            for observer in observers:
+                submit(observer, (notified,) + args, kwargs)
+
+            return result
+
+        return observed
+
+    def _build_chain(self, method):
+        """Builds a callable consuming the pipeline for `method`
+
+        Stages implementing `method` are looked up once, here, so
+        that stages not implementing it cost nothing when the
+        returned callable is called. If a single stage implements
+        `method`, that stage's method is returned as is.
+
+        The returned callable calls `method` on each of those
+        stages, in order, until one of them returns something
+        other than None. If none of the stages implement
+        `method`, it raises AttributeError.
+        """
+
+        targets = []
+        for stage in self._pipeline:
+            try:
+                targets.append(getattr(stage, method))
+            except AttributeError:
+                LOG.debug(u'Stage %(stage)s does not implement %(method)s',
+                          {'stage': six.text_type(stage), 'method': method})
+
+        if not targets:
+            def missing(*args, **kwargs):
+                msg = _(u'Method %s not found in any of '
+                        'the registered stages') % method
+                LOG.error(msg)
+                raise AttributeError(msg)
+
+            return missing
+
+        if len(targets) == 1:
+            return targets[0]
+
+        head = tuple(targets[:-1])
+        last = targets[-1]
+
         def consumer(*args, **kwargs):
             """Consumes the pipeline for `method`
 
-            This function walks through the pipeline and calls
-            `method` for each of the items in the pipeline. A
-            warning will be logged for each stage not implementing
-            `method` and an Attribute error will be raised if
-            none of the stages do.
-
             :param args: Positional arguments to pass to the call.
             :param kwargs: Keyword arguments to pass to the call.
-
-            :raises: AttributeError if none of the stages implement `method`
             """
-            # NOTE(flaper87): Used as a way to verify
-            # the requested method exists in at least
-            # one of the stages, otherwise AttributeError
-            # will be raised.
-            target = None
-
-            for stage in self._pipeline:
-                try:
-                    target = getattr(stage, method)
-                except AttributeError:
-                    sstage = six.text_type(stage)
-                    msgtmpl = _(u"Stage %(stage)s does not "
-                                "implement %(method)s")
-                    LOG.warning(msgtmpl, {'stage': sstage, 'method': method})
-                    continue
 
+            for target in head:
                 result = target(*args, **kwargs)
 
                 # NOTE(flaper87): Will keep going forward
@@ -104,10 +264,6 @@ class Pipeline(object):
                 if result is not None:
                     return result
 
-            if target is None:
-                msg = _(u'Method %s not found in any of '
-                        'the registered stages') % method
-                LOG.error(msg)
-                raise AttributeError(msg)
+            return last(*args, **kwargs)
 
-        yield consumer
+        return consumer
@@ -0,0 +1,80 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Message bodies kept in the encoding they were stored with."""
+
+import json
+
+import msgpack
+from oslo_utils import encodeutils
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+
+
+class RawBody(object):
+    """A message body that hasn't been decoded.
+
+    Storage drivers keeping bodies serialized may return them wrapped
+    in this class, so that transports encoding responses in the same
+    format can copy them into their output as they are. Bodies are
+    only decoded when they have to be transcoded or inspected.
+
+    :param data: The encoded body, as bytes.
+    :param fmt: Format `data` is encoded in, `JSON` or `MSGPACK`.
+    """
+
+    __slots__ = ('data', 'format', '_decoded')
+
+    def __init__(self, data, fmt):
+        self.data = data
+        self.format = fmt
+        self._decoded = None
+
+    def decode(self):
+        """Returns the body as a Python object."""
+
+        if self._decoded is None:
+            if self.format == MSGPACK:
+                self._decoded = msgpack.unpackb(self.data, encoding='utf-8')
+            else:
+                self._decoded = json.loads(
+                    encodeutils.safe_decode(self.data, 'utf-8'))
+
+        return self._decoded
+
+    def encode(self, fmt):
+        """Returns the body encoded in `fmt`, as bytes."""
+
+        if fmt == self.format:
+            return self.data
+
+        if fmt == MSGPACK:
+            return msgpack.packb(self.decode(), use_bin_type=True)
+
+        return encodeutils.safe_encode(
+            json.dumps(self.decode(), ensure_ascii=False))
+
+    def __eq__(self, other):
+        if isinstance(other, RawBody):
+            other = other.decode()
+        return self.decode() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'RawBody(%r, %r)' % (self.data, self.format)
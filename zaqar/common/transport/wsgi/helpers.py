@@ -132,6 +132,53 @@ def validate_queue_identification(validate, req, resp, params):
                                       u'name or project id is not valid.'))
 
 
+def _action_name(req, params):
+    """Maps a request to the name of the equivalent API action."""
+
+    if 'claim_id' in params:
+        return 'claim_update' if req.method == 'PATCH' else None
+
+    if 'message_id' in params:
+        return 'message_get' if req.method == 'GET' else None
+
+    collection = req.path.rstrip('/').rsplit('/', 1)[-1]
+    if collection == 'messages':
+        return {'GET': 'message_list', 'POST': 'message_post'}.get(req.method)
+
+    if collection == 'claims' and req.method == 'POST':
+        return 'claim_create'
+
+    return None
+
+
+def rate_limit(limiter, req, resp, params):
+    """Hook for throttling requests with a rate limiter.
+
+    This hook depends on the `extract_project_id` hook, which must be
+    installed upstream. Requests are only limited per project, HTTP
+    requests have no connection of their own.
+
+    :param limiter: A `zaqar.transport.ratelimit.RateLimiter`.
+        functools.partial or a closure must be used to set this
+        first arg, and expose the remaining ones as a Falcon hook
+        interface.
+    :param req: Falcon request object
+    :param resp: Falcon response object
+    :param params: Responder params dict
+    """
+    action = _action_name(req, params)
+    if action is None:
+        return
+
+    wait = limiter.check(action, params.get('project_id'))
+    if wait:
+        raise falcon.HTTPError('429 Too Many Requests',
+                               _(u'Rate limit exceeded'),
+                               _(u'Too many requests were made on behalf '
+                                 u'of this project, please retry later.'),
+                               headers={'Retry-After': str(int(wait) + 1)})
+
+
 def require_accepts_json(req, resp, params):
     """Raises an exception if the request does not accept JSON
 
@@ -25,6 +25,7 @@ import enum
 from oslo_config import cfg
 import six
 
+from zaqar.common import decorators
 import zaqar.openstack.common.log as logging
 from zaqar.storage import errors
 from zaqar.storage import utils
@@ -39,6 +40,35 @@ DEFAULT_MESSAGES_PER_CLAIM = 10
 
 LOG = logging.getLogger(__name__)
 
+# NOTE(kgriffs): E.g.: 'queuecontroller:exists:5083853/my-queue'
+_QUEUE_CACHE_PREFIX = 'queuecontroller:'
+
+# NOTE(kgriffs): This causes some race conditions, but they are
+# harmless. If a queue was deleted, but we are still returning
+# that it exists, some messages may get inserted without the
+# client getting an error. In this case, those messages would
+# be orphaned and expire eventually according to their TTL.
+#
+# What this means for the client is that they have a bug; they
+# deleted a queue and then immediately tried to post messages
+# to it. If they keep trying to use the queue, they will
+# eventually start getting an error, once the cache entry
+# expires, which should clue them in on what happened.
+#
+# TODO(kgriffs): Make dynamic?
+_QUEUE_CACHE_TTL = 5
+
+
+def _queue_exists_key(name, project=None):
+    # NOTE(kgriffs): Use string concatenation for performance,
+    # also put project first since it is guaranteed to be
+    # unique, which should reduce lookup time.
+    return _QUEUE_CACHE_PREFIX + 'exists:' + str(project) + '/' + name
+
+
+def _queue_get_key(name, project=None):
+    return _QUEUE_CACHE_PREFIX + 'get:' + str(project) + '/' + name
+
 
 @enum.unique
 class Capabilities(enum.IntEnum):
@@ -286,8 +316,18 @@ class Queue(ControllerBase):
     Storage driver implementations of this class should
     be capable of handling high workloads and huge
     numbers of queues.
+
+    Queue existence and metadata are cached for a few seconds
+    in the driver's cache, if it has one, since most operations
+    on messages and claims start by looking them up.
     """
 
+    _cache = None
+
+    def __init__(self, driver):
+        super(Queue, self).__init__(driver)
+        self._cache = getattr(driver, 'cache', None)
+
     def list(self, project=None, marker=None,
              limit=DEFAULT_QUEUES_PER_PAGE, detailed=False):
         """Base method for listing queues.
@@ -304,6 +344,7 @@ class Queue(ControllerBase):
 
     _list = abc.abstractmethod(lambda x: None)
 
+    @decorators.caches(_queue_get_key, _QUEUE_CACHE_TTL)
     def get(self, name, project=None):
         """Base method for queue metadata retrieval.
 
@@ -336,6 +377,10 @@ class Queue(ControllerBase):
         :param project: Project id
         :raises: DoesNotExist
         """
+        self._purge_cache(name, project)
+        return self._set_metadata(name, metadata, project)
+
+    def _set_metadata(self, name, metadata, project=None):
         raise NotImplementedError
 
     def create(self, name, metadata=None, project=None):
@@ -346,10 +391,14 @@ class Queue(ControllerBase):
         :returns: True if a queue was created and False
             if it was updated.
         """
+        self._purge_cache(name, project)
         return self._create(name, metadata, project)
 
     _create = abc.abstractmethod(lambda x: None)
 
+    # NOTE(kgriffs): Only cache when it exists; if it doesn't exist, and
+    # someone creates it, we want it to be immediately visible.
+    @decorators.caches(_queue_exists_key, _QUEUE_CACHE_TTL, lambda v: v)
     def exists(self, name, project=None):
         """Base method for testing queue existence.
 
@@ -368,10 +417,16 @@ class Queue(ControllerBase):
         :param name: The queue name
         :param project: Project id
         """
+        self._purge_cache(name, project)
         return self._delete(name, project)
 
     _delete = abc.abstractmethod(lambda x: None)
 
+    def _purge_cache(self, name, project=None):
+        if self._cache is not None:
+            del self._cache[_queue_exists_key(name, project)]
+            del self._cache[_queue_get_key(name, project)]
+
     def stats(self, name, project=None):
         """Base method for queue stats.
 
@@ -24,7 +24,6 @@ Field Mappings:
 from oslo_utils import timeutils
 import pymongo.errors
 
-from zaqar.common import decorators
 from zaqar.i18n import _
 import zaqar.openstack.common.log as logging
 from zaqar import storage
@@ -33,31 +32,6 @@ from zaqar.storage.mongodb import utils
 
 LOG = logging.getLogger(__name__)
 
-# NOTE(kgriffs): E.g.: 'queuecontroller:exists:5083853/my-queue'
-_QUEUE_CACHE_PREFIX = 'queuecontroller:'
-
-# NOTE(kgriffs): This causes some race conditions, but they are
-# harmless. If a queue was deleted, but we are still returning
-# that it exists, some messages may get inserted without the
-# client getting an error. In this case, those messages would
-# be orphaned and expire eventually according to their TTL.
-#
-# What this means for the client is that they have a bug; they
-# deleted a queue and then immediately tried to post messages
-# to it. If they keep trying to use the queue, they will
-# eventually start getting an error, once the cache entry
-# expires, which should clue them in on what happened.
-#
-# TODO(kgriffs): Make dynamic?
-_QUEUE_CACHE_TTL = 5
-
-
-def _queue_exists_key(queue, project=None):
-    # NOTE(kgriffs): Use string concatenation for performance,
-    # also put project first since it is guaranteed to be
-    # unique, which should reduce lookup time.
-    return _QUEUE_CACHE_PREFIX + 'exists:' + str(project) + '/' + queue
-
 
 class QueueController(storage.Queue):
     """Implements queue resource operations using MongoDB.
@@ -86,7 +60,6 @@ class QueueController(storage.Queue):
     def __init__(self, *args, **kwargs):
         super(QueueController, self).__init__(*args, **kwargs)
 
-        self._cache = self.driver.cache
         self._collection = self.driver.queues_database.queues
 
         # NOTE(flaper87): This creates a unique index for
@@ -254,18 +227,15 @@ class QueueController(storage.Queue):
         else:
             return True
 
-    # NOTE(kgriffs): Only cache when it exists; if it doesn't exist, and
-    # someone creates it, we want it to be immediately visible.
     @utils.raises_conn_error
     @utils.retries_on_autoreconnect
-    @decorators.caches(_queue_exists_key, _QUEUE_CACHE_TTL, lambda v: v)
     def _exists(self, name, project=None):
         query = _get_scoped_query(name, project)
         return self._collection.find_one(query) is not None
 
     @utils.raises_conn_error
     @utils.retries_on_autoreconnect
-    def set_metadata(self, name, metadata, project=None):
+    def _set_metadata(self, name, metadata, project=None):
         rst = self._collection.update(_get_scoped_query(name, project),
                                       {'$set': {'m': metadata}},
                                       multi=False,
@@ -276,7 +246,6 @@ class QueueController(storage.Queue):
 
     @utils.raises_conn_error
     @utils.retries_on_autoreconnect
-    @_exists.purges
     def _delete(self, name, project=None):
         self.driver.message_controller._purge_queue(name, project)
         self._collection.remove(_get_scoped_query(name, project))
@@ -32,7 +32,19 @@ _PIPELINE_CONFIGS = tuple((
                        'the storage driver\'s controller methods.')
                 .format(resource))
     for resource in _PIPELINE_RESOURCES
-))
+)) + tuple((
+    cfg.ListOpt(resource + '_observers', default=[],
+                help=_('Stages to notify of the results of {0} '
+                       'operations. They are called from a background '
+                       'thread once the storage driver\'s controller '
+                       'returned, and do not delay responses.')
+                .format(resource))
+    for resource in _PIPELINE_RESOURCES
+)) + (
+    cfg.IntOpt('observer_queue_size', default=1000,
+               help=('Number of calls to observers allowed to be '
+                     'pending. Calls are dropped past this number.')),
+)
 
 _PIPELINE_GROUP = 'storage'
 
@@ -41,7 +53,56 @@ def _config_options():
     return [(_PIPELINE_GROUP, _PIPELINE_CONFIGS)]
 
 
-def _get_storage_pipeline(resource_name, conf):
+def _load_stages(names):
+    stages = []
+    for ns in names:
+        try:
+            mgr = driver.DriverManager('zaqar.storage.stages',
+                                       ns, invoke_on_load=True)
+            stages.append(mgr.driver)
+        except RuntimeError as exc:
+            LOG.warning(_(u'Stage %(stage)s could not be imported: %(ex)s'),
+                        {'stage': ns, 'ex': str(exc)})
+            continue
+
+    return stages
+
+
+class _Bound(object):
+    """Ends a pipeline with a stage calling the rest of it itself.
+
+    Methods implemented by the stage are its own, the other ones are
+    those of the downstream pipeline.
+    """
+
+    def __init__(self, stage, downstream):
+        self._stage = stage
+        self._downstream = downstream
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name in ('_stage', '_downstream'):
+            raise AttributeError(name)
+
+        try:
+            return getattr(self._stage, name)
+        except AttributeError:
+            return getattr(self._downstream, name)
+
+
+def _bind_stages(stages, controller, conf):
+    for index, stage in enumerate(stages):
+        bind = getattr(stage, 'bind', None)
+        if bind is not None:
+            rest = _bind_stages(stages[index + 1:], controller, conf)
+            downstream = common.Pipeline(rest)
+            bind(conf, downstream)
+
+            return stages[:index] + [_Bound(stage, downstream)]
+
+    return stages + [controller]
+
+
+def _get_storage_pipeline(resource_name, conf, controller=None, queue=None):
     """Constructs and returns a storage resource pipeline.
 
     This is a helper function for any service supporting
@@ -56,8 +117,23 @@ def _get_storage_pipeline(resource_name, conf):
     to the next stage, ending with the actual storage
     controller.
 
+    Stages defining a `bind(conf, downstream)` method are passed the
+    pipeline made of the stages following them and the controller,
+    so that they may call it themselves, e.g. once on behalf of
+    several callers. Such stages are responsible for calling it for
+    the methods they implement: processing doesn't go past them,
+    even when they return None.
+
+    Observers listed in the `{resource_name}_observers` config
+    option are loaded from the same namespace as stages. They are
+    notified of the results through `queue`, and ignored if it
+    is None.
+
     :param conf: Configuration instance.
     :type conf: `cfg.ConfigOpts`
+    :param controller: Storage controller ending the pipeline.
+    :param queue: Queue to notify observers through.
+    :type queue: `zaqar.common.pipeline.ObserverQueue`
 
     :returns: A pipeline to use.
     :rtype: `Pipeline`
@@ -67,18 +143,16 @@ def _get_storage_pipeline(resource_name, conf):
 
     storage_conf = conf[_PIPELINE_GROUP]
 
-    pipeline = []
-    for ns in storage_conf[resource_name + '_pipeline']:
-        try:
-            mgr = driver.DriverManager('zaqar.storage.stages',
-                                       ns, invoke_on_load=True)
-            pipeline.append(mgr.driver)
-        except RuntimeError as exc:
-            LOG.warning(_(u'Stage %(stage)d could not be imported: %(ex)s'),
-                        {'stage': ns, 'ex': str(exc)})
-            continue
+    pipeline = _load_stages(storage_conf[resource_name + '_pipeline'])
+
+    if controller is not None:
+        pipeline = _bind_stages(pipeline, controller, conf)
 
-    return common.Pipeline(pipeline)
+    observers = []
+    if queue is not None:
+        observers = _load_stages(storage_conf[resource_name + '_observers'])
+
+    return common.Pipeline(pipeline, observers=observers, queue=queue)
 
 
 class DataDriver(base.DataDriverBase):
@@ -95,6 +169,11 @@ class DataDriver(base.DataDriverBase):
         super(DataDriver, self).__init__(conf, None)
         self._storage = storage
 
+        self.conf.register_opts(_PIPELINE_CONFIGS,
+                                group=_PIPELINE_GROUP)
+        queue_size = self.conf[_PIPELINE_GROUP].observer_queue_size
+        self._observer_queue = common.ObserverQueue(queue_size)
+
     @property
     def capabilities(self):
         return self._storage.capabilities()
@@ -107,24 +186,24 @@ class DataDriver(base.DataDriverBase):
 
     @decorators.lazy_property(write=False)
     def queue_controller(self):
-        stages = _get_storage_pipeline('queue', self.conf)
-        stages.append(self._storage.queue_controller)
-        return stages
+        return _get_storage_pipeline('queue', self.conf,
+                                     self._storage.queue_controller,
+                                     self._observer_queue)
 
     @decorators.lazy_property(write=False)
     def message_controller(self):
-        stages = _get_storage_pipeline('message', self.conf)
-        stages.append(self._storage.message_controller)
-        return stages
+        return _get_storage_pipeline('message', self.conf,
+                                     self._storage.message_controller,
+                                     self._observer_queue)
 
     @decorators.lazy_property(write=False)
     def claim_controller(self):
-        stages = _get_storage_pipeline('claim', self.conf)
-        stages.append(self._storage.claim_controller)
-        return stages
+        return _get_storage_pipeline('claim', self.conf,
+                                     self._storage.claim_controller,
+                                     self._observer_queue)
 
     @decorators.lazy_property(write=False)
     def subscription_controller(self):
-        stages = _get_storage_pipeline('subscription', self.conf)
-        stages.append(self._storage.subscription_controller)
-        return stages
+        return _get_storage_pipeline('subscription', self.conf,
+                                     self._storage.subscription_controller,
+                                     self._observer_queue)
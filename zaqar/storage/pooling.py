@@ -221,7 +221,7 @@ class QueueController(storage.Queue):
             return control.get_metadata(name, project=project)
         raise errors.QueueDoesNotExist(name, project)
 
-    def set_metadata(self, name, metadata, project=None):
+    def _set_metadata(self, name, metadata, project=None):
         control = self._get_controller(name, project)
         if control:
             return control.set_metadata(name, metadata=metadata,
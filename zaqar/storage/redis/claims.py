@@ -83,6 +83,7 @@ class ClaimController(storage.Claim, scripting.Mixin):
     def __init__(self, *args, **kwargs):
         super(ClaimController, self).__init__(*args, **kwargs)
         self._client = self.driver.connection
+        self._raw_body = self.driver.redis_conf.raw_message_bodies
 
         self._packer = msgpack.Packer(encoding='utf-8',
                                       use_bin_type=True).pack
@@ -225,7 +226,8 @@ class ClaimController(storage.Claim, scripting.Mixin):
         # basic_messages
         msg_keys = self._get_claimed_message_keys(claim_msgs_key)
         claimed_msgs = messages.Message.from_redis_bulk(msg_keys,
-                                                        self._client)
+                                                        self._client,
+                                                        self._raw_body)
         now = timeutils.utcnow_ts()
         basic_messages = [msg.to_basic(now)
                           for msg in claimed_msgs if msg]
@@ -268,7 +270,8 @@ class ClaimController(storage.Claim, scripting.Mixin):
 
         if claimed_ids:
             claimed_msgs = messages.Message.from_redis_bulk(claimed_ids,
-                                                            self._client)
+                                                            self._client,
+                                                            self._raw_body)
             claimed_msgs = [msg.to_basic(now) for msg in claimed_msgs]
 
             # NOTE(kgriffs): Perist claim records
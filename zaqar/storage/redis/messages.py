@@ -104,6 +104,7 @@ class MessageController(storage.Message, scripting.Mixin):
     def __init__(self, *args, **kwargs):
         super(MessageController, self).__init__(*args, **kwargs)
         self._client = self.driver.connection
+        self._raw_body = self.driver.redis_conf.raw_message_bodies
 
     @decorators.lazy_property(write=False)
     def _queue_ctrl(self):
@@ -247,7 +248,8 @@ class MessageController(storage.Message, scripting.Mixin):
         message_ids = client.zrange(msgset_key, start,
                                     start + (limit - 1))
 
-        messages = Message.from_redis_bulk(message_ids, client)
+        messages = Message.from_redis_bulk(message_ids, client,
+                                           self._raw_body)
 
         # NOTE(prashanthr_): Build a list of filters for checking
         # the following:
@@ -360,7 +362,8 @@ class MessageController(storage.Message, scripting.Mixin):
         if not message_id:
             raise errors.QueueIsEmpty(queue, project)
 
-        message = Message.from_redis(message_id, self._client)
+        message = Message.from_redis(message_id, self._client,
+                                     self._raw_body)
         if message is None:
             raise errors.QueueIsEmpty(queue, project)
 
@@ -373,7 +376,8 @@ class MessageController(storage.Message, scripting.Mixin):
         if not self._queue_ctrl.exists(queue, project):
             raise errors.QueueDoesNotExist(queue, project)
 
-        message = Message.from_redis(message_id, self._client)
+        message = Message.from_redis(message_id, self._client,
+                                     self._raw_body)
         now = timeutils.utcnow_ts()
 
         if message and not utils.msg_expired_filter(message, now):
@@ -397,7 +401,7 @@ class MessageController(storage.Message, scripting.Mixin):
 
         # NOTE(kgriffs): Skip messages that may have been deleted
         now = timeutils.utcnow_ts()
-        return (Message.from_hmap(msg).to_basic(now)
+        return (Message.from_hmap(msg, self._raw_body).to_basic(now)
                 for msg in messages if msg)
 
     @utils.raises_conn_error
@@ -19,6 +19,8 @@ import msgpack
 from oslo_utils import encodeutils
 from oslo_utils import timeutils
 
+from zaqar.common import raw
+
 MSGENV_FIELD_KEYS = (b'id', b't', b'cr', b'e', b'u', b'c', b'c.e')
 
 
@@ -114,6 +116,9 @@ class Message(MessageEnvelope):
         for messages that have never been claimed.
     :param claim_expires: Claim expiration as a UNIX timestamp
     :param body: Message payload. Must be serializable to mspack.
+
+    Messages read with `raw_body` set keep their body packed, wrapped
+    in a `zaqar.common.raw.RawBody`.
     """
 
     __slots__ = MessageEnvelope.__slots__ + ['body']
@@ -123,26 +128,29 @@ class Message(MessageEnvelope):
         self.body = kwargs['body']
 
     @staticmethod
-    def from_hmap(hmap):
+    def from_hmap(hmap, raw_body=False):
         kwargs = _hmap_to_msgenv_kwargs(hmap)
-        kwargs['body'] = _unpack(hmap[b'b'])
+        if raw_body:
+            kwargs['body'] = raw.RawBody(hmap[b'b'], raw.MSGPACK)
+        else:
+            kwargs['body'] = _unpack(hmap[b'b'])
 
         return Message(**kwargs)
 
     @staticmethod
-    def from_redis(mid, client):
+    def from_redis(mid, client, raw_body=False):
         hmap = client.hgetall(mid)
-        return Message.from_hmap(hmap) if hmap else None
+        return Message.from_hmap(hmap, raw_body) if hmap else None
 
     @staticmethod
-    def from_redis_bulk(message_ids, client):
+    def from_redis_bulk(message_ids, client, raw_body=False):
         with client.pipeline() as pipe:
             for mid in message_ids:
                 pipe.hgetall(mid)
 
             results = pipe.execute()
 
-        messages = [Message.from_hmap(hmap) if hmap else None
+        messages = [Message.from_hmap(hmap, raw_body) if hmap else None
                     for hmap in results]
 
         return messages
@@ -60,7 +60,14 @@ _COMMON_REDIS_OPTIONS = (
 )
 
 MANAGEMENT_REDIS_OPTIONS = _COMMON_REDIS_OPTIONS
-MESSAGE_REDIS_OPTIONS = _COMMON_REDIS_OPTIONS
+MESSAGE_REDIS_OPTIONS = _COMMON_REDIS_OPTIONS + (
+    cfg.BoolOpt('raw_message_bodies', default=False,
+                help=('Return message bodies as they are stored, packed '
+                      'with msgpack, instead of decoding them. Transports '
+                      'copy such bodies into their responses, skipping '
+                      'the decoding and encoding round trip when they '
+                      'respond with msgpack.')),
+)
 
 MANAGEMENT_REDIS_GROUP = 'drivers:management_store:redis'
 MESSAGE_REDIS_GROUP = 'drivers:message_store:redis'
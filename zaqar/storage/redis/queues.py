@@ -153,7 +153,7 @@ class QueueController(storage.Queue):
 
     @utils.raises_conn_error
     @utils.retries_on_connection_error
-    def set_metadata(self, name, metadata, project=None):
+    def _set_metadata(self, name, metadata, project=None):
         if not self.exists(name, project):
             raise errors.QueueDoesNotExist(name, project)
 
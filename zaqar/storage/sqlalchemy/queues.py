@@ -102,7 +102,7 @@ class QueueController(storage.Queue):
         res.close()
         return r is not None
 
-    def set_metadata(self, name, metadata, project):
+    def _set_metadata(self, name, metadata, project):
         if project is None:
             project = ''
 
@@ -0,0 +1,379 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Pipeline stages keeping recently read and posted messages in memory.
+
+`MessageCache` serves message gets and list pages from memory when it
+can, and stores messages as they are posted or read. Many consumers
+reading the same fresh messages then cost a single storage read.
+
+Cached entries are dropped when the messages of their queue are
+deleted or claimed through this process. That requires the
+`message_cache` stage in the message pipeline, `message_cache_claims`
+in the claim pipeline and `message_cache_queues` in the queue
+pipeline; the three of them share the same cache. Changes made
+through other processes aren't seen, so entries are only served for
+`max_age` seconds after they were stored. Claimed messages are never
+cached on their own, since their claim may expire at any time.
+"""
+
+import collections
+import threading
+import time
+import weakref
+
+from oslo_config import cfg
+
+from zaqar.storage import base
+
+_MESSAGE_CACHE_OPTIONS = (
+    cfg.IntOpt('max_entries', default=10000,
+               help=('Number of messages and pages of messages kept in '
+                     'memory. The least recently used ones are dropped '
+                     'past this number.')),
+
+    cfg.FloatOpt('max_age', default=1.0,
+                 help=('Seconds during which cached messages may be '
+                       'served. Bounds how long changes made by other '
+                       'processes may go unnoticed.')),
+)
+
+_MESSAGE_CACHE_GROUP = 'storage:message_cache'
+
+# id(conf) -> _Cache, so that the stages of a driver share a cache
+_caches = weakref.WeakValueDictionary()
+_caches_lock = threading.Lock()
+
+
+def _config_options():
+    return [(_MESSAGE_CACHE_GROUP, _MESSAGE_CACHE_OPTIONS)]
+
+
+def _get_cache(conf):
+    with _caches_lock:
+        cache = _caches.get(id(conf))
+        if cache is None:
+            cache = _caches[id(conf)] = _Cache(conf)
+
+    return cache
+
+
+def _aged(message, elapsed):
+    message = dict(message)
+    message['age'] += elapsed
+    return message
+
+
+class _Entry(object):
+
+    __slots__ = ('queue_key', 'value', 'stamp')
+
+    def __init__(self, queue_key, value, stamp):
+        self.queue_key = queue_key
+        self.value = value
+        self.stamp = stamp
+
+
+class _Cache(object):
+    """LRU store of messages and pages of messages, by queue.
+
+    Entries may only be stored by readers if the queue wasn't
+    invalidated since they started reading, which is checked by
+    comparing the counter returned by `begin` with the queue's
+    invalidation stamp. Thread-safe.
+    """
+
+    def __init__(self, conf):
+        conf.register_opts(_MESSAGE_CACHE_OPTIONS,
+                           group=_MESSAGE_CACHE_GROUP)
+        cache_conf = conf[_MESSAGE_CACHE_GROUP]
+
+        # Keeps conf, hence its id, alive along with the cache
+        self._conf = conf
+        self._max_entries = cache_conf.max_entries
+        self._max_age = cache_conf.max_age
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+        # (project, queue) -> set of keys
+        self._queues = collections.defaultdict(set)
+
+        # Count of invalidations, and the count at which each queue was
+        # last invalidated. Readers started before `_floor` are ignored.
+        self._counter = 0
+        self._stamps = {}
+        self._floor = 0
+
+    def begin(self):
+        return self._counter
+
+    def get(self, key, now):
+        """Returns the entry stored under `key`, or None."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            if now - entry.stamp > self._max_age:
+                self._remove(key)
+                return None
+
+            # Re-inserting the entry keeps the dict in LRU order
+            del self._entries[key]
+            self._entries[key] = entry
+
+        return entry
+
+    def put(self, queue_key, items, now, started=None):
+        """Stores (key, value) pairs, unless invalidated since `started`."""
+
+        with self._lock:
+            if started is not None and (
+                    started < self._floor or
+                    self._stamps.get(queue_key, 0) > started):
+                return
+
+            keys = self._queues[queue_key]
+            for key, value in items:
+                self._entries.pop(key, None)
+                self._entries[key] = _Entry(queue_key, value, now)
+                keys.add(key)
+
+            while len(self._entries) > self._max_entries:
+                key = next(iter(self._entries))
+                self._remove(key)
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate(self, queue_key, pages_only=False):
+        """Drops the entries of a queue.
+
+        :param pages_only: Drop pages of messages only, not messages.
+        """
+        with self._lock:
+            self._counter += 1
+            self._stamps[queue_key] = self._counter
+            if len(self._stamps) > self._max_entries:
+                self._stamps.clear()
+                self._floor = self._counter
+
+            for key in list(self._queues.get(queue_key, ())):
+                if not pages_only or key[0] == 'page':
+                    self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+
+        keys = self._queues[entry.queue_key]
+        keys.discard(key)
+        if not keys:
+            del self._queues[entry.queue_key]
+
+
+class _Stage(object):
+
+    def __init__(self):
+        self._cache = None
+        self._downstream = None
+
+    def bind(self, conf, downstream):
+        self._cache = _get_cache(conf)
+        self._downstream = downstream
+
+
+class MessageCache(_Stage):
+    """Message pipeline stage serving reads from memory."""
+
+    def get(self, queue, message_id, project=None):
+        queue_key = (project, queue)
+        key = ('message', project, queue, message_id)
+
+        now = time.time()
+        entry = self._cache.get(key, now)
+        if entry is not None:
+            message = _aged(entry.value, int(now - entry.stamp))
+            if message['age'] < message['ttl']:
+                return message
+
+            self._cache.discard(key)
+
+        started = self._cache.begin()
+        message = self._downstream.get(queue, message_id, project=project)
+        self._store(queue_key, [message], now, started)
+
+        return message
+
+    def bulk_get(self, queue, message_ids, project=None):
+        queue_key = (project, queue)
+        now = time.time()
+
+        found = {}
+        missing = []
+        for message_id in message_ids:
+            key = ('message', project, queue, message_id)
+            entry = self._cache.get(key, now)
+            if entry is not None:
+                message = _aged(entry.value, int(now - entry.stamp))
+                if message['age'] < message['ttl']:
+                    found[message_id] = message
+                    continue
+
+            missing.append(message_id)
+
+        if missing:
+            started = self._cache.begin()
+            fetched = list(self._downstream.bulk_get(
+                queue, message_ids=missing, project=project))
+            self._store(queue_key, fetched, now, started)
+
+            for message in fetched:
+                found[message['id']] = message
+
+        return iter([found[message_id] for message_id in message_ids
+                     if message_id in found])
+
+    def list(self, queue, project=None, marker=None,
+             limit=base.DEFAULT_MESSAGES_PER_PAGE, echo=False,
+             client_uuid=None, include_claimed=False):
+
+        queue_key = (project, queue)
+        key = ('page', project, queue, marker, limit, echo,
+               None if echo else client_uuid, include_claimed)
+
+        now = time.time()
+        entry = self._cache.get(key, now)
+        if entry is not None:
+            messages, next_marker = entry.value
+            elapsed = int(now - entry.stamp)
+            messages = [_aged(message, elapsed) for message in messages]
+
+            return self._page(messages, next_marker)
+
+        started = self._cache.begin()
+        results = self._downstream.list(
+            queue, project=project, marker=marker, limit=limit, echo=echo,
+            client_uuid=client_uuid, include_claimed=include_claimed)
+
+        messages = list(next(results))
+
+        # Drivers only know the next marker of pages having messages
+        next_marker = next(results) if messages else marker
+
+        self._cache.put(queue_key, [(key, (messages, next_marker))], now,
+                        started)
+        self._store(queue_key, messages, now, started)
+
+        return self._page(messages, next_marker)
+
+    def post(self, queue, messages, client_uuid, project=None):
+        messages = list(messages)
+        queue_key = (project, queue)
+
+        # The messages may be claimed or deleted as soon as they are
+        # stored, so they are only cached if that didn't happen yet.
+        started = self._cache.begin()
+        try:
+            message_ids = self._downstream.post(
+                queue, messages=messages, client_uuid=client_uuid,
+                project=project)
+        except Exception:
+            # Some of the messages may have been stored anyway
+            self._cache.invalidate(queue_key, pages_only=True)
+            raise
+
+        self._cache.put(queue_key, [
+            (('message', project, queue, message_id),
+             {'id': message_id, 'age': 0, 'ttl': message['ttl'],
+              'body': message.get('body', {}), 'claim_id': None})
+            for message_id, message in zip(message_ids, messages)
+        ], time.time(), started)
+
+        # New messages may belong to pages that weren't full. This
+        # comes last since it would keep the messages from being put.
+        self._cache.invalidate(queue_key, pages_only=True)
+
+        return message_ids
+
+    def delete(self, queue, message_id, project=None, claim=None):
+        try:
+            return self._downstream.delete(queue, message_id,
+                                           project=project, claim=claim)
+        finally:
+            self._cache.invalidate((project, queue))
+
+    def bulk_delete(self, queue, message_ids, project=None):
+        try:
+            return self._downstream.bulk_delete(queue, message_ids,
+                                                project=project)
+        finally:
+            self._cache.invalidate((project, queue))
+
+    def pop(self, queue, limit, project=None):
+        try:
+            return self._downstream.pop(queue, limit, project=project)
+        finally:
+            self._cache.invalidate((project, queue))
+
+    def _store(self, queue_key, messages, now, started):
+        project, queue = queue_key
+        self._cache.put(queue_key, [
+            (('message', project, queue, message['id']), message)
+            for message in messages if message.get('claim_id') is None
+        ], now, started)
+
+    @staticmethod
+    def _page(messages, next_marker):
+        yield iter(messages)
+        yield next_marker
+
+
+class ClaimInvalidation(_Stage):
+    """Claim pipeline stage dropping the messages of claimed queues."""
+
+    def create(self, queue, metadata, project=None,
+               limit=base.DEFAULT_MESSAGES_PER_CLAIM):
+        try:
+            return self._downstream.create(queue, metadata,
+                                           project=project, limit=limit)
+        finally:
+            self._cache.invalidate((project, queue))
+
+    def update(self, queue, claim_id, metadata, project=None):
+        try:
+            return self._downstream.update(queue, claim_id, metadata,
+                                           project=project)
+        finally:
+            self._cache.invalidate((project, queue))
+
+    def delete(self, queue, claim_id, project=None):
+        try:
+            return self._downstream.delete(queue, claim_id,
+                                           project=project)
+        finally:
+            self._cache.invalidate((project, queue))
+
+
+class QueueInvalidation(_Stage):
+    """Queue pipeline stage dropping the messages of deleted queues."""
+
+    def delete(self, name, project=None):
+        try:
+            return self._downstream.delete(name, project=project)
+        finally:
+            self._cache.invalidate((project, name))
@@ -0,0 +1,164 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Message pipeline stage batching concurrent posts to a queue.
+
+Posts to a queue no other post is being stored for go straight to
+the storage. Otherwise, the first post opens a batch and waits for a
+short window, during which concurrent posts to the same queue add
+their messages to it. All the messages are then posted at once, and
+each caller gets the IDs of its own messages back. Posting many
+messages in a single storage call costs about as much as posting one,
+so that producers posting a message at a time to a busy queue put
+much less load on the storage, while posts to idle queues aren't
+delayed.
+
+Messages are stored with the client UUID they were posted with, so
+only posts by the same client to the same queue are batched together.
+"""
+
+import threading
+
+from oslo_config import cfg
+
+_COALESCING_OPTIONS = (
+    cfg.FloatOpt('window', default=0.002,
+                 help=('Seconds to wait for concurrent posts to the same '
+                       'queue before posting a batch of messages.')),
+
+    cfg.IntOpt('max_messages', default=100,
+               help=('Number of messages after which a batch is posted '
+                     'without waiting for the window to end. Values '
+                     'below 1 are taken as 1.')),
+)
+
+_COALESCING_GROUP = 'storage:coalescing'
+
+
+def _config_options():
+    return [(_COALESCING_GROUP, _COALESCING_OPTIONS)]
+
+
+def _copy_error(error):
+    # Every caller of a batch gets an exception of its own, since
+    # raising one sets its traceback.
+    copy = error.__class__.__new__(error.__class__)
+    copy.__dict__.update(error.__dict__)
+    copy.args = error.args
+    return copy
+
+
+class _Batch(object):
+
+    __slots__ = ('messages', 'full', 'done', 'message_ids', 'error')
+
+    def __init__(self):
+        self.messages = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.message_ids = None
+        self.error = None
+
+
+class PostCoalescer(object):
+    """Posts the messages of concurrent calls in batches.
+
+    Must be bound to the rest of the pipeline before use; the storage
+    pipeline does it when the stage is loaded.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._downstream = None
+        self._window = None
+        self._max_messages = None
+
+        # (project, queue, client_uuid) -> _Batch
+        self._batches = {}
+
+        # (project, queue, client_uuid) -> number of posts being stored
+        self._posting = {}
+
+    def bind(self, conf, downstream):
+        conf.register_opts(_COALESCING_OPTIONS, group=_COALESCING_GROUP)
+        coalescing_conf = conf[_COALESCING_GROUP]
+
+        self._downstream = downstream
+        self._window = coalescing_conf.window
+        self._max_messages = max(1, coalescing_conf.max_messages)
+
+    def post(self, queue, messages, client_uuid, project=None):
+        messages = list(messages)
+        key = (project, queue, client_uuid)
+
+        with self._lock:
+            batch = self._batches.get(key)
+            leader = batch is None
+
+            if leader and not self._posting.get(key):
+                # Nothing to wait for
+                self._posting[key] = 1
+                batch = None
+            elif leader:
+                batch = self._batches[key] = _Batch()
+
+            if batch is not None:
+                start = len(batch.messages)
+                batch.messages.extend(messages)
+
+                # Later posts go to a new batch
+                if len(batch.messages) >= self._max_messages:
+                    del self._batches[key]
+                    batch.full.set()
+
+        if batch is None:
+            return self._post(key, messages)
+
+        if not leader:
+            batch.done.wait()
+
+            if batch.error is not None:
+                raise _copy_error(batch.error)
+
+        else:
+            batch.full.wait(self._window)
+
+            with self._lock:
+                if self._batches.get(key) is batch:
+                    del self._batches[key]
+                self._posting[key] = self._posting.get(key, 0) + 1
+
+            try:
+                batch.message_ids = self._post(key, batch.messages)
+            except Exception as ex:
+                batch.error = ex
+                raise
+            finally:
+                batch.done.set()
+
+        return batch.message_ids[start:start + len(messages)]
+
+    def _post(self, key, messages):
+        """Posts `messages`, once counted as being posted for `key`."""
+
+        project, queue, client_uuid = key
+        try:
+            return self._downstream.post(queue, messages=messages,
+                                         client_uuid=client_uuid,
+                                         project=project)
+        finally:
+            with self._lock:
+                self._posting[key] -= 1
+                if not self._posting[key]:
+                    del self._posting[key]
@@ -88,7 +88,7 @@ class QueueController(storage.Queue):
     def _exists(self, name, project=None):
         raise NotImplementedError()
 
-    def set_metadata(self, name, metadata, project=None):
+    def _set_metadata(self, name, metadata, project=None):
         raise NotImplementedError()
 
     def _delete(self, name, project=None):
@@ -83,8 +83,14 @@ class TestBase(testing.TestBase):
         headers['X-Project-ID'] = headers.get('X-Project-ID', project_id)
         kwargs['headers'] = headers
 
-        return self.app(ftest.create_environ(path=path, **kwargs),
-                        self.srmock)
+        result = self.app(ftest.create_environ(path=path, **kwargs),
+                          self.srmock)
+
+        # Join streamed bodies, so they can be read like buffered ones
+        if not isinstance(result, list):
+            result = [b''.join(result)]
+
+        return result
 
     def simulate_get(self, *args, **kwargs):
         """Simulate a GET request."""
@@ -263,6 +263,16 @@ class MessagesBaseTest(base.V2Base):
 
         self.assertEqual(self.srmock.status, falcon.HTTP_400)
 
+    def test_post_without_messages(self):
+        result = self.simulate_post(self.queue_path + '/messages',
+                                    body=jsonutils.dumps({'other': []}),
+                                    headers=self.headers)
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_400)
+        result_doc = jsonutils.loads(result[0])
+        self.assertEqual(u'No messages were found in the request body.',
+                         result_doc['description'])
+
     @ddt.data(-1, 59, 1209601)
     def test_unacceptable_ttl(self, ttl):
         doc = {'messages': [{'ttl': ttl, 'body': None}]}
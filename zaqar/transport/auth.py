@@ -15,17 +15,32 @@
 
 """Middleware for handling authorization and authentication."""
 
+import collections
+import datetime
+import io
+import threading
+import time
+
 from keystoneclient import auth
 from keystonemiddleware import auth_token
 from keystonemiddleware import opts
 
 from zaqar.openstack.common import log
+from zaqar.openstack.common import timeutils
 
 
 STRATEGIES = {}
 
 LOG = log.getLogger(__name__)
 
+# How long a validated token is trusted when the auth
+# strategy doesn't tell when it expires.
+_DEFAULT_TOKEN_TTL = 300
+
+# How long a rejected token keeps being rejected without asking
+# the auth strategy again.
+_INVALID_TOKEN_TTL = 5
+
 
 class KeystoneAuth(object):
 
@@ -59,6 +74,129 @@ class KeystoneAuth(object):
 STRATEGIES['keystone'] = KeystoneAuth
 
 
+class Identity(object):
+    """What a validated token says about its bearer.
+
+    :param project_id: Project the token is scoped to.
+    :param user_id: User the token was issued to.
+    :param roles: Roles of the user in the project.
+    :param expires: When the token expires, as a naive UTC datetime.
+    """
+
+    def __init__(self, project_id, user_id, roles, expires):
+        self.project_id = project_id
+        self.user_id = user_id
+        self.roles = roles
+        self.expires = expires
+
+    @property
+    def expired(self):
+        return timeutils.utcnow() >= self.expires
+
+
+def _token_expiry(token_info):
+    try:
+        if 'token' in token_info:
+            expires = token_info['token']['expires_at']
+        else:
+            expires = token_info['access']['token']['expires']
+
+        return timeutils.normalize_time(timeutils.parse_isotime(expires))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenValidator(object):
+    """Validates tokens outside of a WSGI request.
+
+    Tokens are validated by the middleware of the given auth
+    strategy, which is called with a bare WSGI environment holding
+    just the token. Identities are cached until their token expires,
+    so transports that see the same token over and over, like
+    websockets, only validate it once. Rejected tokens are cached
+    for a few seconds, so clients retrying with a bad token don't
+    hit the identity service every time.
+
+    :param conf: Configuration the auth strategy is installed with.
+    :param strategy_name: Name of the auth strategy.
+    :param max_entries: Maximum number of valid tokens, and of
+        rejected ones, to keep cached. The least recently used ones
+        are dropped past this number.
+    """
+
+    def __init__(self, conf, strategy_name, max_entries=1024):
+        self._app = strategy(strategy_name).install(self._confirm, conf)
+        self._max_entries = max_entries
+
+        self._lock = threading.Lock()
+
+        # token -> Identity
+        self._cache = collections.OrderedDict()
+
+        # token -> time it was rejected
+        self._rejected = collections.OrderedDict()
+
+    def validate(self, token):
+        """Returns the `Identity` of `token`'s bearer.
+
+        :returns: None if the token is not valid.
+        """
+        now = time.time()
+
+        with self._lock:
+            identity = self._cache.pop(token, None)
+            if identity is not None and not identity.expired:
+                # Re-inserting the entry keeps the dict in LRU order
+                self._cache[token] = identity
+                return identity
+
+            rejected_at = self._rejected.get(token)
+            if (rejected_at is not None and
+                    now - rejected_at < _INVALID_TOKEN_TTL):
+                return None
+
+        env = {
+            'REQUEST_METHOD': 'GET',
+            'SCRIPT_NAME': '',
+            'PATH_INFO': '/',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.0',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(),
+            'HTTP_X_AUTH_TOKEN': token,
+        }
+        self._app(env, lambda status, headers, exc_info=None: None)
+
+        identity = env.get('zaqar.identity')
+        cache = self._rejected if identity is None else self._cache
+
+        with self._lock:
+            self._rejected.pop(token, None)
+            cache[token] = now if identity is None else identity
+            while len(cache) > self._max_entries:
+                cache.popitem(last=False)
+
+        return identity
+
+    @staticmethod
+    def _confirm(env, start_response):
+        # Only reached if the middleware let the request through.
+        if env.get('HTTP_X_IDENTITY_STATUS') == 'Confirmed':
+            expires = _token_expiry(env.get('keystone.token_info'))
+            if expires is None:
+                expires = timeutils.utcnow() + datetime.timedelta(
+                    seconds=_DEFAULT_TOKEN_TTL)
+
+            roles = env.get('HTTP_X_ROLES')
+            env['zaqar.identity'] = Identity(
+                env.get('HTTP_X_PROJECT_ID'), env.get('HTTP_X_USER_ID'),
+                roles.split(',') if roles else [], expires)
+
+        start_response('204 No Content', [])
+        return []
+
+
 def strategy(strategy):
     """Returns the Auth Strategy.
 
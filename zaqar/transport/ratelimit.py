@@ -0,0 +1,174 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Token bucket rate limiting of API requests.
+
+Actions are grouped in classes, e.g. every action reading messages
+belongs to the `list` class. Each class is given a rate, in requests
+per second, both per project and per connection; a request goes
+through if neither its project's nor its connection's bucket for the
+action class is empty. Actions not belonging to any class are never
+limited.
+"""
+
+import collections
+import threading
+import time
+
+from oslo_config import cfg
+import six
+
+_RATE_LIMIT_OPTIONS = (
+    cfg.DictOpt('project_rates', default={},
+                help=('Requests per second allowed for each project, by '
+                      'action class, e.g. "post:100,list:200,claim:50". '
+                      'Action classes without a rate are not limited.')),
+
+    cfg.DictOpt('connection_rates', default={},
+                help=('Requests per second allowed for each connection, '
+                      'by action class, in the same format as '
+                      'project_rates. Only enforced by transports keeping '
+                      'connections open.')),
+
+    cfg.FloatOpt('burst_seconds', default=1.0,
+                 help=('Size of the buckets, in seconds worth of requests. '
+                       'Clients may send that many requests at once after '
+                       'being idle.')),
+
+    cfg.IntOpt('max_buckets', default=100000,
+               help=('Maximum number of buckets kept in memory. The least '
+                     'recently used ones are dropped past this number, '
+                     'which resets their limits.')),
+)
+
+_RATE_LIMIT_GROUP = 'transport:rate_limit'
+
+ACTION_CLASSES = {
+    'message_post': 'post',
+
+    'message_list': 'list',
+    'message_get': 'list',
+    'message_get_many': 'list',
+
+    'claim_create': 'claim',
+    'claim_update': 'claim',
+}
+
+
+def _config_options():
+    return [(_RATE_LIMIT_GROUP, _RATE_LIMIT_OPTIONS)]
+
+
+def _parse_rates(rates):
+    parsed = {}
+    for action_class, rate in six.iteritems(rates):
+        rate = float(rate)
+        if rate > 0:
+            parsed[action_class] = rate
+
+    return parsed
+
+
+class RateLimiter(object):
+    """Token buckets for every project and connection.
+
+    Buckets are created on first use and only hold two floats: the
+    number of tokens left and the time they were counted at. They
+    are refilled lazily, when checked. Thread-safe.
+
+    :param conf: Configuration instance.
+    """
+
+    def __init__(self, conf):
+        conf.register_opts(_RATE_LIMIT_OPTIONS, group=_RATE_LIMIT_GROUP)
+        limits_conf = conf[_RATE_LIMIT_GROUP]
+
+        self._rates = {
+            'project': _parse_rates(limits_conf.project_rates),
+            'connection': _parse_rates(limits_conf.connection_rates),
+        }
+        self._burst = limits_conf.burst_seconds
+        self._max_buckets = limits_conf.max_buckets
+
+        self._lock = threading.Lock()
+
+        # (scope, key, action class) -> [tokens, timestamp]
+        self._buckets = collections.OrderedDict()
+
+    @property
+    def enabled(self):
+        return any(self._rates.values())
+
+    def check(self, action, project=None, connection=None):
+        """Takes a token for a request, if one is available.
+
+        :param action: Name of the requested action.
+        :param project: Project the request is made on behalf of.
+        :param connection: Hashable object identifying the connection
+            the request was received on, None if there's none.
+        :returns: 0 if the request may be processed, otherwise the
+            seconds after which it may be retried.
+        """
+        action_class = ACTION_CLASSES.get(action)
+        if action_class is None:
+            return 0
+
+        checks = []
+        for scope, key in (('project', project),
+                           ('connection', connection)):
+            rate = self._rates[scope].get(action_class)
+            if rate is not None and key is not None:
+                checks.append(((scope, key, action_class), rate))
+
+        if not checks:
+            return 0
+
+        now = time.time()
+        with self._lock:
+            buckets = [(self._refill(key, rate, now), rate)
+                       for key, rate in checks]
+
+            wait = max((1 - bucket[0]) / rate for bucket, rate in buckets)
+            if wait > 0:
+                return wait
+
+            for bucket, _rate in buckets:
+                bucket[0] -= 1
+
+        return 0
+
+    def release(self, connection):
+        """Drops the buckets of a closed connection."""
+
+        with self._lock:
+            for action_class in self._rates['connection']:
+                self._buckets.pop(('connection', connection, action_class),
+                                  None)
+
+    def _refill(self, key, rate, now):
+        capacity = max(1.0, rate * self._burst)
+
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            bucket = [capacity, now]
+        else:
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+        # Re-inserting the bucket keeps the dict in LRU order
+        self._buckets[key] = bucket
+        if len(self._buckets) > self._max_buckets:
+            self._buckets.popitem(last=False)
+
+        return bucket
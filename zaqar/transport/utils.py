@@ -13,9 +13,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import binascii
+import codecs
 import json
+import os
+import re
 
+import msgpack
 from oslo_utils import encodeutils
+import six
+
+from zaqar.common import raw
+from zaqar.i18n import _
 
 
 class MalformedJSON(ValueError):
@@ -28,6 +37,94 @@ class OverflowedJSONInteger(OverflowError):
     pass
 
 
+class MissingJSONField(LookupError):
+    """JSON object lacks an expected field."""
+    pass
+
+
+class UnexpectedJSONType(TypeError):
+    """JSON value is not of the expected type."""
+    pass
+
+
+class InvalidJSONField(ValueError):
+    """JSON object field is missing or not of the expected type.
+
+    :param description: What is wrong with the field, for clients.
+    """
+
+    def __init__(self, description):
+        super(InvalidJSONField, self).__init__(description)
+        self.description = description
+
+
+def filter_fields(document, spec):
+    """Validates and retrieves typed fields from a single document.
+
+    Sanitizes a dict-like document by checking it against a
+    list of field spec, and returning only those fields
+    specified. Transports translate the errors raised into
+    their own.
+
+    :param document: dict-like object
+    :param spec: iterable describing expected fields, yielding
+        tuples with the form of: (field_name, value_type,
+        default_value). Note that value_type may either be a Python
+        type, or the special string '*' to accept any type.
+    :raises: UnexpectedJSONType if the document is not an object,
+        InvalidJSONField if any field is missing or not an instance
+        of the specified type
+    :returns: A filtered dict containing only the fields
+        listed in the spec
+    """
+
+    if not isinstance(document, dict):
+        raise UnexpectedJSONType()
+
+    filtered = {}
+    for name, value_type, default_value in spec:
+        filtered[name] = get_checked_field(document, name,
+                                           value_type, default_value)
+
+    return filtered
+
+
+def get_checked_field(document, name, value_type, default_value):
+    """Validates and retrieves a typed field from a document.
+
+    This function attempts to look up doc[name], and raises
+    InvalidJSONField if the field is missing or not an
+    instance of the given type.
+
+    :param document: dict-like object
+    :param name: field name
+    :param value_type: expected value type, or '*' to accept any type
+    :param default_value: Default value to use if the value is missing,
+        or None to make the value required.
+    :raises: InvalidJSONField if the field is missing or not an
+        instance of value_type
+    :returns: value obtained from doc[name]
+    """
+
+    try:
+        value = document[name]
+    except KeyError:
+        if default_value is not None:
+            value = default_value
+        else:
+            description = _(u'Missing "{name}" field.').format(name=name)
+            raise InvalidJSONField(description)
+
+    # PERF(kgriffs): We do our own little spec thing because it is way
+    # faster than jsonschema.
+    if value_type == '*' or isinstance(value, value_type):
+        return value
+
+    description = _(u'The value of the "{name}" field must be a {vtype}.')
+    description = description.format(name=name, vtype=value_type.__name__)
+    raise InvalidJSONField(description)
+
+
 def _json_int(s):
     """Parse a string as a base 10 64-bit signed integer."""
     i = int(s)
@@ -52,9 +149,298 @@ def read_json(stream, len):
         raise MalformedJSON(ex)
 
 
+_READ_SIZE = 16 * 1024
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class _Scanner(object):
+    """Decodes a JSON document from a stream, a little at a time.
+
+    Only as much of the stream is read as needed to decode the next
+    value, and the text already decoded is dropped, so that memory
+    use is bounded by the size of the largest value rather than by
+    the size of the whole document.
+
+    :param stream: a file-like object
+    :param length: the number of bytes to read from stream, or None
+        to read until its end
+    """
+
+    def __init__(self, stream, length):
+        self._stream = stream
+        self._remaining = length
+        self._decoder = json.JSONDecoder(parse_int=_json_int)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = u''
+        self._pos = 0
+
+    def _fill(self, size):
+        """Reads more text, returns False at the end of the stream."""
+
+        if self._remaining == 0:
+            return False
+
+        if self._remaining is not None:
+            size = min(size, self._remaining)
+
+        data = self._stream.read(size)
+        if not data:
+            self._remaining = 0
+        elif self._remaining is not None:
+            self._remaining -= len(data)
+
+        if isinstance(data, six.text_type):
+            text = data
+        else:
+            text = self._utf8.decode(data, final=self._remaining == 0)
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+
+        return bool(data)
+
+    def peek(self):
+        """Returns the next non-whitespace character, None at the end."""
+
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+
+            if not self._fill(_READ_SIZE):
+                return None
+
+    def skip(self, char):
+        """Consumes the next non-whitespace character, if it is `char`."""
+
+        if self.peek() != char:
+            raise MalformedJSON('Expecting {0!r}'.format(char))
+
+        self._pos += 1
+
+    def value(self):
+        """Decodes the next value."""
+
+        self.peek()
+        while True:
+            complete = self._remaining == 0
+            try:
+                obj, end = self._decoder.raw_decode(self._buffer, self._pos)
+
+                # A value ending with the buffer may go on past it,
+                # e.g. a number, so only trust it when more text
+                # follows it.
+                if complete or end < len(self._buffer):
+                    self._pos = end
+                    return obj
+            except ValueError:
+                if complete:
+                    raise
+
+            # Grow reads with the value so it isn't decoded many times
+            self._fill(max(_READ_SIZE, len(self._buffer) - self._pos))
+
+    def members(self):
+        """Yields the keys of the object being scanned.
+
+        Should be called right after the opening brace was skipped.
+        The caller must consume the value following each key before
+        getting the next one.
+        """
+
+        first = True
+        while True:
+            if self.peek() == u'}':
+                self._pos += 1
+                return
+
+            if not first:
+                self.skip(u',')
+            first = False
+
+            key = self.value()
+            if not isinstance(key, six.text_type):
+                raise MalformedJSON('Expecting property name')
+
+            self.skip(u':')
+            yield key
+
+    def end(self):
+        """Checks that nothing but whitespace is left."""
+
+        if self.peek() is not None:
+            raise MalformedJSON('Extra data')
+
+
+def iter_json_array(stream, len, key=None):
+    """Like read_json, but yields the items of an array one at a time.
+
+    The stream is read while the items are consumed, so that parsing
+    overlaps with network reads and the whole document never has to
+    be held in memory. The rest of the document is still read and
+    checked once the array has been consumed.
+
+    :param stream: a file-like object
+    :param len: the number of bytes to read from stream
+    :param key: name of the field of the top-level object holding the
+        array, or None if the document is the array itself
+    :raises: MalformedJSON, OverflowedJSONInteger, MissingJSONField,
+        UnexpectedJSONType
+    """
+    scanner = _Scanner(stream, len)
+
+    try:
+        if scanner.peek() is None:
+            raise MalformedJSON('Empty document')
+
+        if key is not None:
+            if scanner.peek() != u'{':
+                raise UnexpectedJSONType('Expecting an object')
+
+            scanner.skip(u'{')
+            members = scanner.members()
+            for name in members:
+                if name == key:
+                    break
+
+                scanner.value()
+            else:
+                raise MissingJSONField(key)
+
+        if scanner.peek() != u'[':
+            raise UnexpectedJSONType('Expecting an array')
+
+        scanner.skip(u'[')
+        if scanner.peek() == u']':
+            scanner.skip(u']')
+        else:
+            while True:
+                yield scanner.value()
+
+                if scanner.peek() != u',':
+                    scanner.skip(u']')
+                    break
+
+                scanner.skip(u',')
+
+        if key is not None:
+            for _name in members:
+                scanner.value()
+
+        scanner.end()
+
+    except ValueError as ex:
+        if isinstance(ex, MalformedJSON):
+            raise
+
+        raise MalformedJSON(ex)
+
+
+class _RawBodies(object):
+    """Stands in for the raw bodies of a document being encoded.
+
+    Each `raw.RawBody` found by the encoder is replaced by a string
+    placeholder, which is swapped for the encoded body afterwards.
+    Placeholders carry a random nonce so they can't be mistaken for
+    strings in the document.
+    """
+
+    def __init__(self):
+        self.bodies = []
+        self.nonce = None
+
+    def placeholder(self, obj):
+        if not isinstance(obj, raw.RawBody):
+            raise TypeError(repr(obj) + ' is not serializable')
+
+        if self.nonce is None:
+            self.nonce = binascii.hexlify(os.urandom(8)).decode('ascii')
+
+        self.bodies.append(obj)
+        return u'\x00{0}:{1}\x00'.format(self.nonce, len(self.bodies) - 1)
+
+
 def to_json(obj):
     """Like json.dumps, but outputs a UTF-8 encoded string.
 
+    Message bodies given as `raw.RawBody` are copied into the output,
+    without being decoded when they are already encoded as JSON.
+
     :param obj: a JSON-serializable object
     """
-    return json.dumps(obj, ensure_ascii=False)
+    raws = _RawBodies()
+    document = json.dumps(obj, ensure_ascii=False, default=raws.placeholder)
+    if not raws.bodies:
+        return document
+
+    pattern = r'"\\u0000{0}:(\d+)\\u0000"'.format(raws.nonce)
+    return re.sub(pattern, lambda match: encodeutils.safe_decode(
+        raws.bodies[int(match.group(1))].encode(raw.JSON), 'utf-8'),
+        document)
+
+
+_WRITE_SIZE = 16 * 1024
+
+
+def _encode_members(fields):
+    return [to_json(name) + u': ' + to_json(value)
+            for name, value in sorted(six.iteritems(fields))]
+
+
+def iter_json(key, items, head=None, tail=None):
+    """Like to_json, but yields an object holding an array piecemeal.
+
+    Each item is encoded as it is taken from `items`, so large arrays
+    start being sent before they are fully fetched, and never need to
+    be held in memory. Encoded items are yielded in chunks of a few
+    kilobytes.
+
+    :param key: name of the field holding the array
+    :param items: iterable of JSON-serializable objects
+    :param head: dict of other fields of the object, or None
+    :param tail: callable returning a dict of more fields, for values
+        only known once `items` is exhausted, or None
+    :returns: a generator yielding UTF-8 encoded bytes
+    """
+    members = _encode_members(head or {})
+    members.append(to_json(key) + u': [')
+
+    pending = [u'{' + u', '.join(members)]
+    size = 0
+    separator = u''
+
+    for item in items:
+        encoded = to_json(item)
+        pending.append(separator + encoded)
+        separator = u', '
+
+        size += len(encoded)
+        if size >= _WRITE_SIZE:
+            yield encodeutils.safe_encode(u''.join(pending))
+            pending = []
+            size = 0
+
+    members = [u']'] + _encode_members(tail() if tail else {})
+    pending.append(u', '.join(members) + u'}')
+
+    yield encodeutils.safe_encode(u''.join(pending))
+
+
+def to_msgpack(obj):
+    """Like msgpack.packb, keeping Unicode and binary strings apart.
+
+    Message bodies given as `raw.RawBody` are copied into the output,
+    without being decoded when they are already encoded as msgpack.
+
+    :param obj: a msgpack-serializable object
+    """
+    raws = _RawBodies()
+    document = msgpack.packb(obj, use_bin_type=True,
+                             default=raws.placeholder)
+    if not raws.bodies:
+        return document
+
+    # Placeholders are short enough to be packed as fixstr or str8.
+    pattern = (br'(?:[\xa0-\xbf]|\xd9.)\x00' +
+               raws.nonce.encode('ascii') + br':(\d+)\x00')
+    return re.sub(pattern, lambda match: raws.bodies[
+        int(match.group(1))].encode(raw.MSGPACK), document, flags=re.S)
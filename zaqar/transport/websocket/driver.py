@@ -13,7 +13,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from oslo.config import cfg
+from concurrent import futures
+import functools
+import signal
+import socket
+
+from oslo_config import cfg
 
 try:
     import asyncio
@@ -21,9 +26,12 @@ except ImportError:
     import trollius as asyncio
 
 from zaqar.i18n import _
+from zaqar.openstack.common import importutils
 import zaqar.openstack.common.log as logging
+from zaqar.transport import base
 from zaqar.transport.websocket import factory
 from zaqar.transport.websocket import protocol
+from zaqar.transport.websocket import workers
 
 
 _WS_OPTIONS = (
@@ -33,11 +41,141 @@ _WS_OPTIONS = (
     cfg.IntOpt('port', default=9000,
                help='Port on which the self-hosting server will listen.'),
 
-    cfg.BoolOpt('debug', default=False, help='Print debugging output')
+    cfg.BoolOpt('debug', default=False, help='Print debugging output'),
+
+    cfg.StrOpt('event_loop_policy',
+               help=('Event loop policy to run the server with. Either '
+                     '"uvloop" or the import path of an asyncio event '
+                     'loop policy class. The default asyncio policy is '
+                     'used when unset or when the policy cannot be '
+                     'imported.')),
+
+    cfg.StrOpt('dispatch_mode', default='executor',
+               choices=['executor', 'inline'],
+               help=('How requests are dispatched to the API handler. '
+                     '"executor" runs each request in a bounded thread '
+                     'pool so that blocking storage calls do not stall '
+                     'the event loop, while "inline" runs them directly '
+                     'on the event loop.')),
+
+    cfg.IntOpt('executor_pool_size', default=64,
+               help=('Maximum number of worker threads used to process '
+                     'requests when dispatch_mode is "executor".')),
+
+    cfg.IntOpt('max_inflight_requests', default=16,
+               help=('Maximum number of requests a single connection may '
+                     'have in flight at the same time. Reading from the '
+                     'connection is paused once this limit is reached.')),
+
+    cfg.IntOpt('max_waiting_requests', default=32,
+               help=('Maximum number of requests waiting for messages '
+                     'to be posted at the same time. Each of them holds '
+                     'a worker thread, so this is kept below '
+                     'executor_pool_size. Requests over this limit '
+                     'return right away instead of waiting.')),
+
+    cfg.IntOpt('max_waiting_per_connection', default=4,
+               help=('Maximum number of requests of a single connection '
+                     'waiting for messages to be posted at the same '
+                     'time.')),
+
+    cfg.ListOpt('trusted_peers', default=[],
+                help=('Addresses of trusted internal clients. Requests '
+                      'received from these peers are not validated '
+                      'against the API schema.')),
+
+    cfg.ListOpt('privileged_peers', default=[],
+                help=('Addresses of fully trusted internal clients. '
+                      'Requests received from these peers are not '
+                      'authenticated, even when an auth strategy is '
+                      'configured, and they may run admin actions such '
+                      'as connection_list and connection_stats.')),
+
+    cfg.IntOpt('max_batch_size', default=100,
+               help=('Maximum number of actions a client may send in '
+                     'a single batch frame.')),
+
+    cfg.IntOpt('write_buffer_high_watermark', default=64 * 1024,
+               help=('Size in bytes of a connection\'s outgoing buffer '
+                     'above which no more frames are read from it, until '
+                     'the buffer drains below write_buffer_low_watermark.')),
+
+    cfg.IntOpt('write_buffer_low_watermark', default=16 * 1024,
+               help=('Size in bytes the outgoing buffer of a paused '
+                     'connection must drain to before frames are read '
+                     'from it again.')),
+
+    cfg.IntOpt('max_queued_bytes', default=4 * 1024 * 1024,
+               help=('Size in bytes of a connection\'s outgoing buffer '
+                     'above which the connection is dropped. This bounds '
+                     'the memory used by clients that stop reading. '
+                     '0 means no limit.')),
+
+    cfg.IntOpt('auto_ping_interval', default=30,
+               help=('Seconds of silence from a client after which the '
+                     'server pings it, to detect dead peers and keep '
+                     'intermediaries from dropping the connection. '
+                     '0 disables pings.')),
+
+    cfg.IntOpt('auto_ping_timeout', default=15,
+               help=('Seconds a client has to answer a ping before its '
+                     'connection is dropped.')),
+
+    cfg.IntOpt('idle_timeout', default=0,
+               help=('Seconds without any request from a client after '
+                     'which its connection is closed. Pings do not '
+                     'count as requests. 0 keeps idle connections '
+                     'open.')),
+
+    cfg.BoolOpt('compression', default=False,
+                help=('Accept the permessage-deflate extension when '
+                      'clients offer it, compressing frames in both '
+                      'directions.')),
+
+    cfg.IntOpt('compression_window_bits', default=15,
+               help=('Base two logarithm of the LZ77 window size used '
+                     'to compress frames sent to clients, between 9 and '
+                     '15. Lower values use less memory per connection '
+                     'at the expense of the compression ratio.')),
+
+    cfg.IntOpt('compression_mem_level', default=8,
+               help=('zlib memory level used to compress frames sent to '
+                     'clients, between 1 and 9.')),
+
+    cfg.IntOpt('compression_min_size', default=1024,
+               help=('Frames smaller than this many bytes are sent '
+                     'uncompressed, since compressing them costs more '
+                     'CPU than the bandwidth it saves.')),
+
+    cfg.IntOpt('workers', default=1,
+               help=('Number of worker processes serving websocket '
+                     'connections. Each worker runs its own event loop, '
+                     'so this is usually set to the number of cores.')),
+
+    cfg.BoolOpt('reuse_port', default=False,
+                help=('Have each worker bind its own listening socket '
+                      'with SO_REUSEPORT, letting the kernel balance '
+                      'new connections between workers. When disabled, '
+                      'or where SO_REUSEPORT is not available, workers '
+                      'share a socket bound before forking.')),
+
+    cfg.IntOpt('worker_heartbeat_timeout', default=30,
+               help=('Seconds a worker\'s event loop may stay blocked '
+                     'before the worker is killed and replaced. '
+                     '0 disables the health check.')),
+
+    cfg.IntOpt('graceful_shutdown_timeout', default=30,
+               help=('Seconds workers are given to exit on shutdown '
+                     'before they are killed.')),
 )
 
 _WS_GROUP = 'drivers:transport:websocket'
 
+# Shorthands for the event_loop_policy option
+_EVENT_LOOP_POLICIES = {
+    'uvloop': 'uvloop.EventLoopPolicy',
+}
+
 LOG = logging.getLogger(__name__)
 
 
@@ -45,6 +183,30 @@ def _config_options():
     return [(_WS_GROUP, _WS_OPTIONS)]
 
 
+def set_event_loop_policy(name):
+    """Installs the event loop policy called `name`.
+
+    :param name: A key of `_EVENT_LOOP_POLICIES` or the import
+        path of an event loop policy class. Nothing is done if
+        it is empty.
+    :returns: True if the policy was installed, False otherwise.
+    """
+    if not name:
+        return False
+
+    path = _EVENT_LOOP_POLICIES.get(name, name)
+    try:
+        policy_class = importutils.import_class(path)
+    except ImportError as ex:
+        LOG.warning(_(u'Event loop policy %(name)s is not available, '
+                      u'falling back to the default one: %(error)s'),
+                    {'name': name, 'error': ex})
+        return False
+
+    asyncio.set_event_loop_policy(policy_class())
+    return True
+
+
 class Driver(object):
 
     def __init__(self, conf, api, cache):
@@ -52,9 +214,20 @@ class Driver(object):
         self._api = api
         self._cache = cache
 
+        self._conf.register_opts(base._GENERAL_TRANSPORT_OPTIONS)
         self._conf.register_opts(_WS_OPTIONS, group=_WS_GROUP)
         self._ws_conf = self._conf[_WS_GROUP]
 
+    def _token_validator(self):
+        if not self._conf.auth_strategy:
+            return None
+
+        # Imported here so that keystone's middleware is only
+        # needed when auth is enabled.
+        from zaqar.transport import auth
+
+        return auth.TokenValidator(self._conf, self._conf.auth_strategy)
+
     def listen(self):
         """Self-host using 'bind' and 'port' from the WS config group."""
 
@@ -62,21 +235,126 @@ class Driver(object):
         LOG.info(msgtmpl,
                  {'bind': self._ws_conf.bind, 'port': self._ws_conf.port})
 
+        if self._ws_conf.workers <= 1:
+            self._serve()
+            return
+
+        # The storage driver and the API handler are loaded
+        # before forking, so drivers must not open connections until
+        # they are first used.
+        if self._ws_conf.reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+            target = self._serve_reuse_port
+        else:
+            target = functools.partial(self._serve, self._bind())
+
+        supervisor = workers.Supervisor(
+            self._ws_conf.workers,
+            heartbeat_timeout=self._ws_conf.worker_heartbeat_timeout,
+            shutdown_timeout=self._ws_conf.graceful_shutdown_timeout)
+        supervisor.run(target)
+
+    def _bind(self, reuse_port=False):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+        sock.bind((self._ws_conf.bind, self._ws_conf.port))
+        sock.listen(socket.SOMAXCONN)
+        sock.setblocking(False)
+        return sock
+
+    def _serve_reuse_port(self, heartbeat=None):
+        self._serve(self._bind(reuse_port=True), heartbeat)
+
+    def _serve(self, sock=None, heartbeat=None):
+        """Runs the event loop until the process is asked to stop.
+
+        :param sock: Listening socket to serve on, if None one is
+            bound using 'bind' and 'port' from the WS config group.
+        :param heartbeat: `workers.Heartbeat` to beat from the event
+            loop when running as a supervised worker.
+        """
+
         uri = 'ws://' + self._ws_conf.bind + ':' + str(self._ws_conf.port)
 
-        fact = factory.ProtocolFactory(uri, debug=self._ws_conf.debug,
-                                       handler=self._api)
+        # Loops can't be shared with forked processes, so the
+        # policy is installed by every worker.
+        set_event_loop_policy(self._ws_conf.event_loop_policy)
+        loop = asyncio.get_event_loop()
+
+        executor = None
+        if self._ws_conf.dispatch_mode == 'executor':
+            executor = futures.ThreadPoolExecutor(
+                max_workers=self._ws_conf.executor_pool_size)
+
+        compression = None
+        if self._ws_conf.compression:
+            compression = {
+                'window_bits': self._ws_conf.compression_window_bits,
+                'mem_level': self._ws_conf.compression_mem_level,
+                'min_size': self._ws_conf.compression_min_size,
+            }
+
+        fact = factory.ProtocolFactory(
+            uri, debug=self._ws_conf.debug, handler=self._api,
+            loop=loop, executor=executor,
+            max_inflight=self._ws_conf.max_inflight_requests,
+            # Leave a thread to the requests not waiting
+            max_waiting=min(self._ws_conf.max_waiting_requests,
+                            self._ws_conf.executor_pool_size - 1),
+            max_waiting_per_connection=(
+                self._ws_conf.max_waiting_per_connection),
+            trusted_peers=self._ws_conf.trusted_peers,
+            privileged_peers=self._ws_conf.privileged_peers,
+            max_batch_size=self._ws_conf.max_batch_size,
+            compression=compression,
+            write_high_watermark=self._ws_conf.write_buffer_high_watermark,
+            write_low_watermark=self._ws_conf.write_buffer_low_watermark,
+            max_queued_bytes=self._ws_conf.max_queued_bytes,
+            token_validator=self._token_validator(),
+            auto_ping_interval=self._ws_conf.auto_ping_interval,
+            auto_ping_timeout=self._ws_conf.auto_ping_timeout,
+            idle_timeout=self._ws_conf.idle_timeout)
         fact.protocol = protocol.MessagingProtocol
 
-        loop = asyncio.get_event_loop()
-        coro = loop.create_server(fact, self._ws_conf.bind,
-                                  self._ws_conf.port)
+        if sock is not None:
+            coro = loop.create_server(fact, sock=sock)
+        else:
+            coro = loop.create_server(fact, self._ws_conf.bind,
+                                      self._ws_conf.port)
         server = loop.run_until_complete(coro)
 
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(signum, loop.stop)
+            except (NotImplementedError, RuntimeError):
+                # Not supported by this loop or platform, fall
+                # back to the default handlers.
+                pass
+
+        if heartbeat is not None:
+            def beat():
+                heartbeat.beat()
+                loop.call_later(heartbeat.interval, beat)
+
+            beat()
+
         try:
             loop.run_forever()
         except KeyboardInterrupt:
             pass
         finally:
+            # Stop accepting connections and let the requests being
+            # processed finish before tearing the loop down. The loop
+            # runs meanwhile, so that their responses are still sent.
             server.close()
-            loop.close()
\ No newline at end of file
+            if executor is not None:
+                drained = loop.run_in_executor(None, executor.shutdown)
+                try:
+                    loop.run_until_complete(drained)
+                except RuntimeError:
+                    # Stopped by another signal, don't wait any longer
+                    LOG.warning(_(u'Stopped before the requests being '
+                                  u'processed completed.'))
+            loop.close()
@@ -15,14 +15,88 @@
 
 from autobahn.asyncio import websocket
 
+from zaqar.transport.websocket import keepalive
+from zaqar.transport.websocket import registry
+
 
 class ProtocolFactory(websocket.WebSocketServerFactory):
+    """Builds a `MessagingProtocol` for every new connection.
+
+    :param uri: The websocket URI the server is bound to.
+    :param debug: Whether autobahn debugging output is enabled.
+    :param handler: The API handler requests are dispatched to.
+    :param loop: Event loop serving the connections.
+    :param executor: Executor used to run requests off the event
+        loop, or None to process them inline.
+    :param max_inflight: Maximum number of in-flight requests
+        per connection.
+    :param max_waiting: Maximum number of requests waiting for
+        messages at the same time, over all the connections.
+    :param max_waiting_per_connection: Maximum number of requests
+        of a single connection waiting for messages at the same time.
+    :param trusted_peers: Addresses of the clients whose requests
+        are not validated.
+    :param privileged_peers: Addresses of the clients whose requests
+        are not authenticated, and which may run admin actions.
+    :param max_batch_size: Maximum number of actions in a batch frame.
+    :param compression: permessage-deflate settings, a dict with the
+        `window_bits`, `mem_level` and `min_size` keys, or None to
+        turn down compression offers.
+    :param write_high_watermark: Size of a connection's outgoing
+        buffer above which reading from it is paused.
+    :param write_low_watermark: Size the outgoing buffer must drain
+        to before reading is resumed.
+    :param max_queued_bytes: Size of the outgoing buffer above which
+        the connection is dropped, 0 for no limit.
+    :param token_validator: `zaqar.transport.auth.TokenValidator`
+        checking the clients' tokens, or None if auth is disabled.
+    :param auto_ping_interval: Seconds of silence from a peer after
+        which it is pinged, 0 to disable pings.
+    :param auto_ping_timeout: Seconds a peer has to answer a ping
+        before its connection is dropped.
+    :param idle_timeout: Seconds without request frames after which
+        a connection is closed, 0 to keep idle connections open.
+    """
 
-    def __init__(self, uri, debug, handler):
-        websocket.WebSocketServerFactory.__init__(self, uri, debug)
+    def __init__(self, uri, debug, handler, loop=None, executor=None,
+                 max_inflight=16, max_waiting=32,
+                 max_waiting_per_connection=4, trusted_peers=(),
+                 privileged_peers=(), max_batch_size=100,
+                 compression=None, write_high_watermark=64 * 1024,
+                 write_low_watermark=16 * 1024, max_queued_bytes=0,
+                 token_validator=None, auto_ping_interval=0,
+                 auto_ping_timeout=0, idle_timeout=0):
+        websocket.WebSocketServerFactory.__init__(self, uri, debug,
+                                                  loop=loop)
         self._handler = handler
+        self.executor = executor
+        self.max_inflight = max_inflight
+        self.max_waiting = max_waiting
+        self.max_waiting_per_connection = max_waiting_per_connection
+        self.trusted_peers = frozenset(trusted_peers)
+        self.privileged_peers = frozenset(privileged_peers)
+        self.max_batch_size = max_batch_size
+        self.compression = compression
+        self.write_high_watermark = write_high_watermark
+        self.write_low_watermark = write_low_watermark
+        self.max_queued_bytes = max_queued_bytes
+        self.token_validator = token_validator
+
+        self.auto_ping_interval = auto_ping_interval
+        self.auto_ping_timeout = auto_ping_timeout
+        self.idle_timeout = idle_timeout
+
+        self.registry = registry.Registry()
+
+        # A single timer drives the keepalive checks of all the
+        # connections, rather than a timer per connection.
+        self.timers = keepalive.TimerWheel(self.loop, self._check_keepalive)
+
+    @staticmethod
+    def _check_keepalive(connection, now):
+        return connection.check_keepalive(now)
 
     def __call__(self):
         proto = self.protocol(self._handler)
         proto.factory = self
-        return proto
\ No newline at end of file
+        return proto
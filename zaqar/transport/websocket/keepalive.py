@@ -0,0 +1,110 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A timer wheel driving the keepalive checks of every connection.
+
+Instead of arming a timer per connection, connections are dropped in
+buckets of `resolution` seconds and a single event loop timer visits
+the due buckets. Traffic on a connection never touches the wheel: the
+callback looks at the connection's timestamps when its bucket comes
+up and tells when it wants to be checked next.
+"""
+
+import zaqar.openstack.common.log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class TimerWheel(object):
+    """Calls back scheduled keys once their deadline has passed.
+
+    Must only be used from the event loop thread.
+
+    :param loop: Event loop running the wheel.
+    :param callback: Callable taking a key and the current loop
+        time. It returns the loop time the key is to be called back
+        at next, or None to stop scheduling it.
+    :param resolution: Width of the buckets in seconds. Keys are
+        called back up to this late.
+    """
+
+    def __init__(self, loop, callback, resolution=1.0):
+        self._loop = loop
+        self._callback = callback
+        self._resolution = resolution
+
+        # tick -> set of keys, and the reverse
+        self._buckets = {}
+        self._ticks = {}
+
+        self._current = None
+        self._handle = None
+
+    def __len__(self):
+        return len(self._ticks)
+
+    def schedule(self, key, when):
+        """Calls back `key` at loop time `when`, or soon after.
+
+        Replaces any previous schedule of `key`.
+        """
+        self.cancel(key)
+
+        tick = int(when // self._resolution) + 1
+        if self._current is not None:
+            tick = max(tick, self._current + 1)
+
+        self._buckets.setdefault(tick, set()).add(key)
+        self._ticks[key] = tick
+
+        if self._handle is None:
+            self._current = int(self._loop.time() // self._resolution)
+            self._handle = self._loop.call_later(self._resolution,
+                                                 self._tick)
+
+    def cancel(self, key):
+        tick = self._ticks.pop(key, None)
+        if tick is None:
+            return
+
+        bucket = self._buckets[tick]
+        bucket.discard(key)
+        if not bucket:
+            del self._buckets[tick]
+
+    def _tick(self):
+        now = self._loop.time()
+        last = int(now // self._resolution)
+
+        while self._current < last and self._ticks:
+            self._current += 1
+            for key in self._buckets.pop(self._current, ()):
+                del self._ticks[key]
+
+                try:
+                    when = self._callback(key, now)
+                except Exception as ex:
+                    LOG.exception(ex)
+                    continue
+
+                if when is not None:
+                    self.schedule(key, when)
+
+        if self._ticks:
+            self._current = last
+            self._handle = self._loop.call_later(self._resolution,
+                                                 self._tick)
+        else:
+            self._handle = self._current = None
@@ -13,18 +13,78 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from autobahn.asyncio import websocket
-
+import collections
+import functools
 import json
+import threading
+
+from autobahn.asyncio import websocket
+from autobahn.websocket import compress
+import msgpack
+from oslo_utils import encodeutils
 
-from zaqar.api.v1_1 import request as schema_validator
 from zaqar.common.api import request
 from zaqar.common.api import response
+from zaqar.common.api import utils as api_utils
 from zaqar.common import errors
+from zaqar.i18n import _
 import zaqar.openstack.common.log as logging
+from zaqar.openstack.common import timeutils
+from zaqar.transport import utils
+from zaqar.transport.websocket import registry
 
 LOG = logging.getLogger(__name__)
 
+JSON = 'json'
+MSGPACK = 'msgpack'
+
+# Reasons for pausing reading from a connection
+_INFLIGHT = 'inflight'
+_WRITING = 'writing'
+
+
+# Headers bound to a connection by the authenticate action
+_BOUND_HEADERS = ('Client-ID', 'X-Project-ID')
+
+# Actions handled by the protocol itself rather than the API
+# handler, mapped to the name of the method handling them.
+_LOCAL_ACTIONS = {
+    'authenticate': '_authenticate',
+    'connection_list': '_connection_list',
+    'connection_stats': '_connection_stats',
+}
+
+
+class _Batch(object):
+    """Requests received in a single frame, processed as a unit.
+
+    :param items: A (request, response) pair per item in the frame.
+        The response is the error returned for items that failed
+        validation and None for those to be processed.
+    """
+
+    def __init__(self, items):
+        self.items = items
+
+    def process(self, handler, authorize):
+        resps = [resp if resp is not None else authorize(req)
+                 for req, resp in self.items]
+        reqs = [req for (req, _resp), resp in zip(self.items, resps)
+                if resp is None]
+
+        results = iter(handler.process_batch(reqs))
+        return [(resp if resp is not None else next(results)).get_response()
+                for resp in resps]
+
+
+def _requested_window_bits(offer):
+    # autobahn renamed the offer attributes to snake case
+    # after 0.10.
+    try:
+        return offer.request_max_window_bits
+    except AttributeError:
+        return offer.requestMaxWindowBits
+
 
 class MessagingProtocol(websocket.WebSocketServerProtocol):
 
@@ -32,46 +92,575 @@ class MessagingProtocol(websocket.WebSocketServerProtocol):
         websocket.WebSocketServerProtocol.__init__(self)
         self._handler = handler
 
+        # Requests received while the connection already has
+        # `max_inflight` requests being processed are parked
+        # here until a slot frees up.
+        self._inflight = 0
+        self._backlog = collections.deque()
+
+        # Requests in flight waiting for messages to be posted.
+        self._waiting = 0
+
+        # Reading is paused while there is any reason for it: too
+        # many requests in flight or a client not reading its
+        # responses fast enough.
+        self._pause_reasons = set()
+
+        # Wire format of the frames sent to the client. It is either
+        # negotiated through the websocket subprotocol or, if the
+        # client didn't ask for one, taken from the first frame.
+        self._codec = None
+
+        # Requests from trusted peers skip schema validation, those
+        # from privileged peers skip authentication and may run admin
+        # actions.
+        self._trusted = False
+        self._privileged = False
+
+        # Headers bound by the authenticate action, which are added
+        # to every frame, and when they stop being valid. The action
+        # runs in the executor, so they are changed under the lock.
+        self._binding_lock = threading.Lock()
+        self._bound_headers = None
+        self._bound_until = None
+        self._identity = None
+
+        self.stats = registry.ConnectionStats()
+
+        # Loop times of the last request frame, of the last sign of
+        # life of the peer, and of the ping waiting for a pong.
+        self._last_frame = None
+        self._last_seen = None
+        self._ping_sent_at = None
+
+    @property
+    def inflight(self):
+        """Number of requests being processed for this connection."""
+        return self._inflight
+
     def onConnect(self, request):
-        print("Client connecting: {0}".format(request.peer))
+        LOG.debug(u'Client connecting: %s', request.peer)
+
+        peername = self.transport.get_extra_info('peername')
+        if peername:
+            self._trusted = peername[0] in self.factory.trusted_peers
+            self._privileged = peername[0] in self.factory.privileged_peers
+
+        self.transport.set_write_buffer_limits(
+            high=self.factory.write_high_watermark,
+            low=self.factory.write_low_watermark)
+
+        # Offers are negotiated by autobahn once this returns,
+        # using the callback set here.
+        if self.factory.compression is not None:
+            self.perMessageCompressionAccept = self._accept_compression
+
+        for codec in request.protocols:
+            if codec in (JSON, MSGPACK):
+                self._codec = codec
+                return codec
+
+    def _accept_compression(self, offers):
+        """Accepts the first permessage-deflate offer we can honour."""
+
+        settings = self.factory.compression
+        accept = compress.PerMessageDeflateOfferAccept
+
+        for offer in offers:
+            if not isinstance(offer, compress.PerMessageDeflateOffer):
+                continue
+
+            window_bits = settings['window_bits']
+            requested = _requested_window_bits(offer)
+            if requested:
+                window_bits = min(window_bits, requested)
+
+            if window_bits not in accept.WINDOW_SIZE_PERMISSIBLE_VALUES:
+                continue
+
+            return accept(offer, False, 0, None, window_bits,
+                          settings['mem_level'])
+
+        return None
 
     def onOpen(self):
-        print("WebSocket connection open.")
+        LOG.debug(u'WebSocket connection open: %s', self.peer)
+        self.factory.registry.add(self)
+
+        self._last_frame = self._last_seen = self.factory.loop.time()
+        when = self.check_keepalive(self._last_seen)
+        if when is not None:
+            self.factory.timers.schedule(self, when)
 
     def onMessage(self, payload, isBinary):
-        if isBinary:
-            # NOTE(vkmc): Support binary?
-            # base85/ascii85 or BSON encoding
-            # In any case, we should do the decoding and prepare the req
-            print("Binary message received: {0} bytes".format(len(payload)))
+        self.stats.frames_in += 1
+        self.stats.bytes_in += len(payload)
+        self._last_frame = self._last_seen = self.factory.loop.time()
+
+        if self._codec is None:
+            self._codec = MSGPACK if isBinary else JSON
+
+        try:
+            pl = self._decode(payload, isBinary)
+            if not isinstance(pl, (dict, list)):
+                raise ValueError('Frames must hold an object or an array')
+        except (ValueError, msgpack.exceptions.UnpackException) as ex:
+            LOG.debug(ex)
+            req = request.Request(action=None)
+            body = {'error': _(u'Request body could not be parsed.')}
+            headers = {'status': 400}
+            self._send_response(response.Response(req, body, headers))
+            return
+
+        if isinstance(pl, list):
+            self._process_batch_frame(pl)
+            return
+
+        bound = self._bind_headers(pl)
+        req = self._create_request(pl, bound)
+
+        resp = self._validate_request(pl, req)
+        if resp is not None:
+            self._send_response(resp)
         else:
-            pl = json.loads(payload)
-            req = self._create_request(pl)
-            resp = (self._validate_request(pl, req) or
-                    self._handler.process_request(req))
-            print("Text message received: {0}".format(payload.decode('utf8')))
-        import pdb
-        pdb.set_trace()
-        self.sendMessage(json.dumps(repr(resp)), isBinary)
+            self._dispatch(req)
 
     def onClose(self, wasClean, code, reason):
-        print("WebSocket connection closed: {0}".format(reason))
+        self._backlog.clear()
+        if _WRITING in self._pause_reasons:
+            self.factory.registry.paused_connections -= 1
+        self._pause_reasons.clear()
+        self._handler.connection_closed(self)
+        self.factory.registry.remove(self)
+        self.factory.timers.cancel(self)
+        LOG.debug(u'WebSocket connection closed: %(peer)s %(reason)s',
+                  {'peer': self.peer, 'reason': reason})
+
+    def onPing(self, payload):
+        self._last_seen = self.factory.loop.time()
+        websocket.WebSocketServerProtocol.onPing(self, payload)
+
+    def onPong(self, payload):
+        self._last_seen = self.factory.loop.time()
+
+    def check_keepalive(self, now):
+        """Pings the peer and reaps the connection when it is due.
+
+        Called from the factory's timer wheel.
+
+        :param now: Current loop time.
+        :returns: Loop time of the next check, or None if the
+            connection is closed or there is nothing to check.
+        """
+        if self.state != self.STATE_OPEN:
+            return None
+
+        factory = self.factory
+        deadlines = []
+
+        if factory.idle_timeout:
+            idle_at = self._last_frame + factory.idle_timeout
+            if now >= idle_at:
+                LOG.debug(u'Closing idle websocket connection %s', self.peer)
+                factory.registry.idle_closes += 1
+                self.sendClose(self.CLOSE_STATUS_CODE_NORMAL,
+                               u'Idle timeout')
+                return None
+
+            deadlines.append(idle_at)
+
+        if factory.auto_ping_interval:
+            if (self._ping_sent_at is not None and
+                    self._last_seen < self._ping_sent_at):
+                pong_at = self._ping_sent_at + factory.auto_ping_timeout
+                if now >= pong_at:
+                    LOG.debug(u'Dropping websocket connection %s, its peer '
+                              u'did not answer a ping', self.peer)
+                    factory.registry.reaped_connections += 1
+                    self.dropConnection(abort=True)
+                    return None
+
+                deadlines.append(pong_at)
+            else:
+                self._ping_sent_at = None
+                ping_at = self._last_seen + factory.auto_ping_interval
+                if now >= ping_at:
+                    self._ping_sent_at = now
+                    self.sendPing()
+                    ping_at = now + factory.auto_ping_timeout
+
+                deadlines.append(ping_at)
+
+        return min(deadlines) if deadlines else None
+
+    def pause_writing(self):
+        """Called by the transport when its buffer goes over the high mark.
+
+        Reading from the client is paused until it has drained the
+        responses already queued for it.
+        """
+        if _WRITING not in self._pause_reasons:
+            self.factory.registry.paused_connections += 1
+            self.factory.registry.pause_count += 1
+        self._pause_reading(_WRITING)
+
+    def resume_writing(self):
+        if _WRITING in self._pause_reasons:
+            self.factory.registry.paused_connections -= 1
+        self._resume_reading(_WRITING)
+
+    def push(self, resp):
+        """Sends `resp` to the client outside of a request cycle.
+
+        This is used to deliver messages to subscribed clients and
+        may be called from any thread.
+        """
+        self.factory.loop.call_soon_threadsafe(self._push, resp)
+
+    def _push(self, resp):
+        if self.state == self.STATE_OPEN:
+            self._send_response(resp)
+
+    def _process_batch_frame(self, pl):
+        if len(pl) > self.factory.max_batch_size:
+            req = request.Request(action=None)
+            body = {'error': _(u'Too many actions in a single frame. '
+                               u'Max: {0}').format(
+                                   self.factory.max_batch_size)}
+            headers = {'status': 400}
+            self._send_response(response.Response(req, body, headers))
+            return
+
+        items = []
+        for item in pl:
+            if not isinstance(item, dict):
+                req = request.Request(action=None)
+                body = {'error': _(u'Batch items must be objects.')}
+                headers = {'status': 400}
+                resp = response.Response(req, body, headers)
+            elif item.get('action') in _LOCAL_ACTIONS:
+                req = self._create_request(item)
+                body = {'error': _(u'The {0} action can not be part of '
+                                   u'a batch.').format(item['action'])}
+                headers = {'status': 400}
+                resp = response.Response(req, body, headers)
+            else:
+                bound = self._bind_headers(item)
+                req = self._create_request(item, bound)
+                resp = self._validate_request(item, req)
+
+            items.append((req, resp))
+
+        self._dispatch(_Batch(items))
+
+    def _process(self, job):
+        """Runs `job` through the handler.
+
+        :param job: A request or a batch of requests.
+        :returns: The document to send back to the client.
+        """
+        if isinstance(job, _Batch):
+            return job.process(self._handler, self._authorize)
+
+        if job._action in _LOCAL_ACTIONS:
+            method = getattr(self, _LOCAL_ACTIONS[job._action])
+            return method(job).get_response()
+
+        resp = self._authorize(job)
+        if resp is None:
+            resp = self._handler.process_request(job)
+
+        return resp.get_response()
+
+    def _bind_headers(self, pl):
+        """Adds the headers bound to the connection to `pl`.
+
+        :returns: True if headers were bound, in which case the
+            request is authorized, False otherwise.
+        """
+
+        if pl.get('action') == 'authenticate':
+            return False
+
+        with self._binding_lock:
+            bound_headers = self._bound_headers
+            if bound_headers is None:
+                return False
+
+            if (self._bound_until is not None and
+                    timeutils.utcnow() >= self._bound_until):
+                LOG.debug(u'Authentication of %s expired', self.peer)
+                self._bound_headers = self._bound_until = None
+                self._identity = None
+                return False
+
+        headers = pl.get('headers')
+        if not isinstance(headers, dict):
+            headers = pl['headers'] = {}
+
+        headers.update(bound_headers)
+        return True
+
+    def _authenticate(self, req):
+        """Binds the identity and project in `req` to the connection.
+
+        When an auth strategy is configured, the token must be valid
+        for the project, and the binding lasts until it expires.
+        """
+        headers = req._headers
+        identity = until = None
+
+        # A failed attempt drops any previous binding.
+        with self._binding_lock:
+            self._bound_headers = self._bound_until = self._identity = None
+
+        validator = self.factory.token_validator
+        if validator is not None and not self._privileged:
+            identity, resp = self._check_token(req)
+            if resp is not None:
+                return resp
+            until = identity.expires
+
+        bound_headers = dict((name, headers[name])
+                             for name in _BOUND_HEADERS)
+
+        with self._binding_lock:
+            self._bound_headers = bound_headers
+            self._bound_until = until
+            self._identity = identity
+
+        return response.Response(req, {}, {'status': 200})
+
+    def _connection_list(self, req):
+        resp = self._authorize_admin(req)
+        if resp is not None:
+            return resp
+
+        limit = req._body.get('limit')
+        body = {'connections': self.factory.registry.list(limit)}
+        return response.Response(req, body, {'status': 200})
+
+    def _connection_stats(self, req):
+        resp = self._authorize_admin(req)
+        if resp is not None:
+            return resp
+
+        body = {'metrics': self.factory.registry.metrics()}
+        return response.Response(req, body, {'status': 200})
+
+    def _authorize_admin(self, req):
+        """Checks the connection may run admin actions.
+
+        That is the case for privileged peers and for connections that
+        authenticated with a token granting the admin role.
+        """
+        if self._privileged:
+            return None
+
+        identity = self._identity
+        if identity is not None and 'admin' in identity.roles:
+            return None
+
+        body = {'error': _(u'This action is restricted to administrators.')}
+        return response.Response(req, body, {'status': 403})
+
+    def _authorize(self, req):
+        """Checks `req` may be processed.
+
+        Requests the connection's headers were bound to, once it went
+        through the authenticate action, are already authorized.
+        Otherwise the frame must carry a token. What matters is whether
+        the headers were bound when the frame was received, since the
+        connection may have authenticated since.
+
+        :returns: An error response, or None if `req` is authorized.
+        """
+        if (self.factory.token_validator is None or self._privileged or
+                getattr(req, '_bound', False)):
+            return None
+
+        return self._check_token(req)[1]
+
+    def _check_token(self, req):
+        token = req._headers.get('X-Auth-Token')
+        identity = None
+        if token:
+            identity = self.factory.token_validator.validate(token)
+
+        if identity is None:
+            body = {'error': _(u'Authentication required.')}
+            return None, response.Response(req, body, {'status': 401})
+
+        if identity.project_id != req._headers.get('X-Project-ID'):
+            body = {'error': _(u'The token is not valid for this project.')}
+            return None, response.Response(req, body, {'status': 403})
+
+        return identity, None
+
+    def _dispatch(self, job):
+        """Hands a request or a batch over to the API handler.
+
+        When the factory has no executor, the job is processed
+        inline. Otherwise it runs in the executor and the response
+        is sent back from the event loop once it is ready.
+        """
+        executor = self.factory.executor
+        if executor is None:
+            self._send(self._process(job))
+            return
+
+        if self._inflight >= self.factory.max_inflight:
+            self._backlog.append(job)
+            self._pause_reading(_INFLIGHT)
+            return
+
+        self._inflight += 1
+        waiting = self._admit_waits(job)
+        future = self.factory.loop.run_in_executor(
+            executor, self._process, job)
+        future.add_done_callback(functools.partial(self._on_processed, job,
+                                                   waiting))
+
+    def _admit_waits(self, job):
+        """Lets the requests of `job` wait for messages, within limits.
+
+        A request waiting for messages holds an executor thread, so
+        only so many of them may wait at the same time, per connection
+        and in total. Requests over these limits don't wait.
+
+        :returns: The number of requests allowed to wait.
+        """
+        if isinstance(job, _Batch):
+            reqs = [req for req, resp in job.items if resp is None]
+        else:
+            reqs = [job]
+
+        factory = self.factory
+        registry = factory.registry
+        admitted = 0
+
+        for req in reqs:
+            body = req._body
+            if not isinstance(body, dict) or not body.get('wait'):
+                continue
+
+            if (self._waiting < factory.max_waiting_per_connection and
+                    registry.waiting_requests < factory.max_waiting):
+                self._waiting += 1
+                registry.waiting_requests += 1
+                admitted += 1
+            else:
+                body['wait'] = 0
+
+        return admitted
+
+    def _on_processed(self, job, waiting, future):
+        self._inflight -= 1
+        self._waiting -= waiting
+        self.factory.registry.waiting_requests -= waiting
+
+        try:
+            document = future.result()
+        except Exception as ex:
+            LOG.exception(ex)
+            if isinstance(job, _Batch):
+                job = request.Request(action=None)
+
+            error = _(u'Unexpected error.')
+            headers = {'status': 500}
+            resp = api_utils.error_response(job, ex, headers, error)
+            document = resp.get_response()
+
+        if self.state == self.STATE_OPEN:
+            self._send(document)
+
+        while self._backlog and self._inflight < self.factory.max_inflight:
+            self._dispatch(self._backlog.popleft())
+
+        if not self._backlog:
+            self._resume_reading(_INFLIGHT)
+
+    def _pause_reading(self, reason):
+        if not self._pause_reasons:
+            self.transport.pause_reading()
+        self._pause_reasons.add(reason)
+
+    def _resume_reading(self, reason):
+        if reason not in self._pause_reasons:
+            return
+
+        self._pause_reasons.discard(reason)
+        if not self._pause_reasons:
+            self.transport.resume_reading()
+
+    def _send_response(self, resp):
+        self._send(resp.get_response())
+
+    def _send(self, document):
+        # Responses may be sent in a different order than the
+        # requests were received; clients match them back using
+        # the request ID they sent along with each frame.
+        if self._codec == MSGPACK:
+            payload = utils.to_msgpack(document)
+            is_binary = True
+        else:
+            payload = encodeutils.safe_encode(utils.to_json(document))
+            is_binary = False
+
+        self.stats.frames_out += 1
+        self.stats.bytes_out += len(payload)
+
+        compression = self.factory.compression
+        if compression is not None and len(payload) < compression['min_size']:
+            self.sendMessage(payload, is_binary, doNotCompress=True)
+        else:
+            self.sendMessage(payload, is_binary)
+
+        # Responses to requests in flight and pushed messages are
+        # still queued while reading is paused, so a client that
+        # never reads could make the buffer grow without bound.
+        max_queued = self.factory.max_queued_bytes
+        if max_queued and self.transport.get_write_buffer_size() > max_queued:
+            LOG.warning(_(u'Dropping websocket connection from %(peer)s, '
+                          u'more than %(max)d bytes are queued for it'),
+                        {'peer': self.peer, 'max': max_queued})
+            self.factory.registry.overflow_closes += 1
+            self.dropConnection(abort=True)
 
     @staticmethod
-    def _create_request(pl):
+    def _decode(payload, isBinary):
+        if isBinary:
+            return msgpack.unpackb(payload, encoding='utf-8')
+
+        return json.loads(payload.decode('utf8'))
+
+    def _create_request(self, pl, bound=False):
         action = pl.get('action')
         body = pl.get('body') or {}
         headers = pl.get('headers')
+        request_id = pl.get('request_id')
+        api = pl.get('api')
 
-        return request.Request(action=action, body=body,
-                               headers=headers)
+        # Waiting for messages would stall the event loop when
+        # requests are processed on it.
+        if (self.factory.executor is None and isinstance(body, dict) and
+                body.get('wait')):
+            body['wait'] = 0
+
+        req = request.Request(action=action, body=body,
+                              headers=headers, api=api,
+                              request_id=request_id, connection=self)
+
+        # Whether the connection's headers were bound to the frame
+        req._bound = bound
+        return req
+
+    def _validate_request(self, pl, req):
+        if self._trusted:
+            return None
 
-    @staticmethod
-    def _validate_request(pl, req):
         try:
-            action = pl.get('action')
-            validator = schema_validator.RequestSchema()
-            is_valid = validator.validate(action=action, body=pl)
+            is_valid = self._handler.validate(pl)
         except errors.InvalidAction as ex:
             body = {'error': str(ex)}
             headers = {'status': 400}
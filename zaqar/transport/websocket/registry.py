@@ -0,0 +1,159 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Bookkeeping of the live websocket connections."""
+
+import threading
+import time
+
+
+class ConnectionStats(object):
+    """Traffic counters of a single connection."""
+
+    __slots__ = ('peer', 'opened_at', 'frames_in', 'frames_out',
+                 'bytes_in', 'bytes_out')
+
+    def __init__(self):
+        self.peer = None
+        self.opened_at = None
+        self.frames_in = 0
+        self.frames_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def to_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+class Registry(object):
+    """Keeps track of the connections served by a factory.
+
+    Connections are added once their handshake completes and removed
+    when they close. Counters are updated from the event loop, while
+    the registry may be queried from any thread.
+
+    Besides the live connections, the registry keeps the totals of
+    the closed ones and the flow control counters, so the metrics it
+    exports are monotonic.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._closed = ConnectionStats()
+        self._closed_count = 0
+
+        # Connections currently paused because their client is slow
+        # to read, how many times connections were paused for that
+        # reason, and how many were dropped for going over the
+        # queued bytes cap.
+        self.paused_connections = 0
+        self.pause_count = 0
+        self.overflow_closes = 0
+
+        # Connections closed for being idle, and dropped because
+        # their peer stopped answering pings.
+        self.idle_closes = 0
+        self.reaped_connections = 0
+
+        # Requests currently waiting for messages to be posted.
+        self.waiting_requests = 0
+
+    def __len__(self):
+        return len(self._connections)
+
+    def add(self, connection):
+        """Starts tracking `connection`.
+
+        :param connection: A protocol instance, exposing its
+            `ConnectionStats` as `stats` and the number of requests
+            it has in flight as `inflight`.
+        """
+        stats = connection.stats
+        stats.peer = connection.peer
+        stats.opened_at = time.time()
+
+        with self._lock:
+            self._connections[connection] = stats
+
+    def remove(self, connection):
+        with self._lock:
+            stats = self._connections.pop(connection, None)
+            if stats is None:
+                return
+
+            self._closed_count += 1
+            self._closed.frames_in += stats.frames_in
+            self._closed.frames_out += stats.frames_out
+            self._closed.bytes_in += stats.bytes_in
+            self._closed.bytes_out += stats.bytes_out
+
+    def list(self, limit=None):
+        """Lists the live connections, busiest first.
+
+        :param limit: Maximum number of connections to list.
+        :returns: A list of dicts with the counters of each connection,
+            its age in seconds and its requests in flight.
+        """
+        with self._lock:
+            connections = list(self._connections.items())
+
+        now = time.time()
+        details = []
+        for connection, stats in connections:
+            detail = stats.to_dict()
+            detail['age'] = now - stats.opened_at
+            detail['inflight'] = connection.inflight
+            details.append(detail)
+
+        details.sort(key=lambda detail: detail['bytes_in'] +
+                     detail['bytes_out'], reverse=True)
+        return details[:limit]
+
+    def metrics(self):
+        """Aggregates the counters of every connection.
+
+        :returns: A flat dict of metric names to values. Traffic
+            counters include the connections already closed.
+        """
+        with self._lock:
+            connections = list(self._connections.items())
+            metrics = self._closed.to_dict()
+            opened = self._closed_count
+
+        del metrics['peer']
+        del metrics['opened_at']
+
+        inflight = 0
+        for connection, stats in connections:
+            metrics['frames_in'] += stats.frames_in
+            metrics['frames_out'] += stats.frames_out
+            metrics['bytes_in'] += stats.bytes_in
+            metrics['bytes_out'] += stats.bytes_out
+            inflight += connection.inflight
+
+        metrics.update({
+            'connections': len(connections),
+            'connections_opened': opened + len(connections),
+            'inflight': inflight,
+            'paused_connections': self.paused_connections,
+            'pause_count': self.pause_count,
+            'overflow_closes': self.overflow_closes,
+            'idle_closes': self.idle_closes,
+            'reaped_connections': self.reaped_connections,
+            'waiting_requests': self.waiting_requests,
+        })
+
+        return metrics
@@ -0,0 +1,240 @@
+# Copyright (c) 2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pre-forked worker processes for the websocket transport.
+
+The supervisor forks a fixed number of workers, each one running its
+own event loop on a shared listening socket, and restarts the ones
+that die. Workers report they are alive by writing to a pipe from
+their event loop; a worker whose loop stops beating, e.g. because a
+request blocked it, is killed and replaced.
+"""
+
+import errno
+import fcntl
+import os
+import select
+import signal
+import time
+
+from zaqar.i18n import _
+import zaqar.openstack.common.log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Minimum time a worker must have been running to be
+# restarted right away, this avoids a fork loop when
+# workers die on start.
+_RESPAWN_DELAY = 1
+
+
+class Heartbeat(object):
+    """Worker side of the health check pipe.
+
+    :param fd: Write end of the pipe.
+    :param interval: Seconds between beats.
+    """
+
+    def __init__(self, fd, interval):
+        self._fd = fd
+        self.interval = interval
+
+    def beat(self):
+        try:
+            os.write(self._fd, b'.')
+        except OSError as ex:
+            # A full pipe means the supervisor has not read the
+            # previous beats yet, which is as good as a beat.
+            if ex.errno != errno.EAGAIN:
+                raise
+
+
+class _Worker(object):
+
+    def __init__(self, slot, pid, fd):
+        self.slot = slot
+        self.pid = pid
+        self.fd = fd
+        self.started = self.last_beat = time.time()
+
+
+class Supervisor(object):
+    """Forks the worker processes and keeps them running.
+
+    :param count: Number of workers.
+    :param heartbeat_timeout: Seconds a worker may go without
+        beating before it is killed. 0 disables the health check.
+    :param shutdown_timeout: Seconds workers are given to exit
+        once asked to stop, before they are killed.
+    """
+
+    def __init__(self, count, heartbeat_timeout=30, shutdown_timeout=30):
+        self._count = count
+        self._heartbeat_timeout = heartbeat_timeout
+        self._shutdown_timeout = shutdown_timeout
+
+        self._workers = {}
+        self._stop_deadline = None
+
+    @property
+    def stopping(self):
+        return self._stop_deadline is not None
+
+    def run(self, target):
+        """Runs `target` in every worker until asked to stop.
+
+        Blocks until all the workers have exited. SIGTERM and SIGINT
+        trigger a graceful shutdown: workers are sent SIGTERM and
+        killed if they are still running after `shutdown_timeout`.
+
+        :param target: Callable run in each worker, taking a
+            `Heartbeat` instance or None if health checks are
+            disabled. The worker exits when it returns.
+        """
+        handlers = dict((signum, signal.signal(signum, self._on_signal))
+                        for signum in (signal.SIGTERM, signal.SIGINT))
+
+        try:
+            for slot in range(self._count):
+                self._spawn(slot, target)
+
+            while self._workers:
+                self._read_beats()
+                self._reap(target)
+                self._check_health()
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+    def stop(self):
+        """Asks every worker to exit."""
+
+        if self.stopping:
+            return
+
+        LOG.info(_(u'Stopping %d websocket workers'), len(self._workers))
+        self._stop_deadline = time.time() + self._shutdown_timeout
+        self._kill_all(signal.SIGTERM)
+
+    def _on_signal(self, signum, frame):
+        self.stop()
+
+    def _spawn(self, slot, target):
+        rfd, wfd = os.pipe()
+
+        pid = os.fork()
+        if pid == 0:
+            os.close(rfd)
+            for worker in self._workers.values():
+                os.close(worker.fd)
+
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, signal.SIG_DFL)
+
+            status = 0
+            try:
+                heartbeat = None
+                if self._heartbeat_timeout > 0:
+                    flags = fcntl.fcntl(wfd, fcntl.F_GETFL)
+                    fcntl.fcntl(wfd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+                    heartbeat = Heartbeat(wfd, self._heartbeat_timeout / 3.0)
+
+                target(heartbeat)
+            except BaseException as ex:
+                LOG.exception(ex)
+                status = 1
+            finally:
+                os._exit(status)
+
+        os.close(wfd)
+        self._workers[pid] = _Worker(slot, pid, rfd)
+        LOG.info(_(u'Started websocket worker %(slot)d (pid %(pid)d)'),
+                 {'slot': slot, 'pid': pid})
+
+    def _read_beats(self):
+        fds = dict((worker.fd, worker) for worker in self._workers.values())
+
+        try:
+            readable = select.select(list(fds), [], [], 1.0)[0]
+        except select.error as ex:
+            if ex.args[0] != errno.EINTR:
+                raise
+            return
+
+        now = time.time()
+        for fd in readable:
+            if os.read(fd, 4096):
+                fds[fd].last_beat = now
+
+    def _reap(self, target):
+        while self._workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as ex:
+                if ex.errno != errno.ECHILD:
+                    raise
+                self._workers.clear()
+                return
+
+            if pid == 0:
+                return
+
+            worker = self._workers.pop(pid, None)
+            if worker is None:
+                continue
+
+            os.close(worker.fd)
+            if self.stopping:
+                continue
+
+            LOG.warning(_(u'Websocket worker %(slot)d (pid %(pid)d) exited '
+                          u'with status %(status)d, restarting it'),
+                        {'slot': worker.slot, 'pid': pid, 'status': status})
+
+            if time.time() - worker.started < _RESPAWN_DELAY:
+                time.sleep(_RESPAWN_DELAY)
+
+            self._spawn(worker.slot, target)
+
+    def _check_health(self):
+        now = time.time()
+
+        if self.stopping:
+            if now > self._stop_deadline:
+                self._kill_all(signal.SIGKILL)
+            return
+
+        if self._heartbeat_timeout <= 0:
+            return
+
+        for worker in self._workers.values():
+            if now - worker.last_beat > self._heartbeat_timeout:
+                LOG.error(_(u'Websocket worker %(slot)d (pid %(pid)d) '
+                            u'stopped responding, killing it'),
+                          {'slot': worker.slot, 'pid': worker.pid})
+                self._kill(worker.pid, signal.SIGKILL)
+                worker.last_beat = now
+
+    def _kill_all(self, signum):
+        for pid in list(self._workers):
+            self._kill(pid, signum)
+
+    @staticmethod
+    def _kill(pid, signum):
+        try:
+            os.kill(pid, signum)
+        except OSError as ex:
+            if ex.errno != errno.ESRCH:
+                raise
@@ -25,6 +25,7 @@ from zaqar.i18n import _
 import zaqar.openstack.common.log as logging
 from zaqar import transport
 from zaqar.transport import auth
+from zaqar.transport import ratelimit
 from zaqar.transport import validation
 from zaqar.transport.wsgi import v1_0
 from zaqar.transport.wsgi import v1_1
@@ -56,6 +57,7 @@ class Driver(transport.DriverBase):
         self._conf.register_opts(_WSGI_OPTIONS, group=_WSGI_GROUP)
         self._wsgi_conf = self._conf[_WSGI_GROUP]
         self._validate = validation.Validator(self._conf)
+        self._limiter = ratelimit.RateLimiter(self._conf)
 
         self.app = None
         self._init_routes()
@@ -64,7 +66,7 @@ class Driver(transport.DriverBase):
     @decorators.lazy_property(write=False)
     def before_hooks(self):
         """Exposed to facilitate unit testing."""
-        return [
+        hooks = [
             helpers.require_accepts_json,
             helpers.require_client_id,
             helpers.extract_project_id,
@@ -78,6 +80,13 @@ class Driver(transport.DriverBase):
                               self._validate.queue_identification)
         ]
 
+        # Depends on project_id being extracted, above
+        if self._limiter.enabled:
+            hooks.append(functools.partial(helpers.rate_limit,
+                                           self._limiter))
+
+        return hooks
+
     def _init_routes(self):
         """Initialize hooks and URI routes to resources."""
 
@@ -12,6 +12,9 @@
 # License for the specific language governing permissions and limitations under
 # the License.
 
+import itertools
+import types
+
 import falcon
 import jsonschema
 
@@ -73,6 +76,61 @@ def deserialize(stream, len):
         raise errors.HTTPServiceUnavailable(description)
 
 
+def deserialize_array(stream, len, key=None):
+    """Deserializes a JSON array from a file-like stream, item by item.
+
+    Like `deserialize`, but returns a generator yielding the items of
+    the array as they are parsed, which may be passed to `sanitize`
+    in place of a list. Errors are raised while the generator is
+    consumed. Only the raw text held while parsing is bounded;
+    `sanitize` still collects the decoded items into a list.
+
+    A missing `key` field raises `MissingJSONField` instead of an HTTP
+    error, so that callers can report it in their own terms.
+
+    :param stream: file-like object from which to read the array.
+    :param len: number of bytes to read from stream
+    :param key: name of the field of the top-level object holding the
+        array, or None if the document is the array itself
+    :raises: HTTPBadRequest, HTTPServiceUnavailable, MissingJSONField
+    """
+
+    if len is None:
+        description = _(u'Request body can not be empty')
+        raise errors.HTTPBadRequestBody(description)
+
+    return _translate_errors(utils.iter_json_array(stream, len, key))
+
+
+def _translate_errors(items):
+    try:
+        for item in items:
+            yield item
+
+    except utils.MalformedJSON as ex:
+        LOG.debug(ex)
+        description = _(u'Request body could not be parsed.')
+        raise errors.HTTPBadRequestBody(description)
+
+    except utils.OverflowedJSONInteger as ex:
+        LOG.debug(ex)
+        description = _(u'JSON contains integer that is too large.')
+        raise errors.HTTPBadRequestBody(description)
+
+    except utils.MissingJSONField:
+        raise
+
+    except utils.UnexpectedJSONType as ex:
+        LOG.debug(ex)
+        raise errors.HTTPDocumentTypeNotSupported()
+
+    except Exception as ex:
+        # Error while reading from the network/server
+        LOG.exception(ex)
+        description = _(u'Request body could not be read.')
+        raise errors.HTTPServiceUnavailable(description)
+
+
 def sanitize(document, spec=None, doctype=JSONObject):
     """Validates a document and drops undesired fields.
 
@@ -89,7 +147,11 @@ def sanitize(document, spec=None, doctype=JSONObject):
 
         If spec is None, the incoming documents will not be validated.
     :param doctype: type of document to expect; must be either
-        JSONObject or JSONArray.
+        JSONObject or JSONArray. A generator, such as the one returned
+        by `deserialize_array`, is accepted as a JSONArray, and is
+        consumed one object at a time. The filtered objects are still
+        collected into a list, since validation and the storage
+        drivers need the whole batch.
     :raises: HTTPBadRequestBody
     :returns: A sanitized, filtered version of the document. If the
         document is a list of objects, each object will be filtered
@@ -105,10 +167,12 @@ def sanitize(document, spec=None, doctype=JSONObject):
         return document if spec is None else filter(document, spec)
 
     if doctype is JSONArray:
-        if not isinstance(document, JSONArray):
+        if isinstance(document, types.GeneratorType):
+            if spec is None:
+                return list(document)
+        elif not isinstance(document, JSONArray):
             raise errors.HTTPDocumentTypeNotSupported()
-
-        if spec is None:
+        elif spec is None:
             return document
 
         return [filter(obj, spec) for obj in document]
@@ -119,63 +183,40 @@ def sanitize(document, spec=None, doctype=JSONObject):
 def filter(document, spec):
     """Validates and retrieves typed fields from a single document.
 
-    Sanitizes a dict-like document by checking it against a
-    list of field spec, and returning only those fields
-    specified.
-
-    :param document: dict-like object
-    :param spec: iterable describing expected fields, yielding
-        tuples with the form of: (field_name, value_type). Note that
-        value_type may either be a Python type, or the special
-        string '*' to accept any type.
-    :raises: HTTPBadRequest if any field is missing or not an
-        instance of the specified type
+    Like `zaqar.transport.utils.filter_fields`, but raises HTTP
+    errors.
+
+    :raises: HTTPBadRequest if the document is not an object, or
+        if any field is missing or not an instance of the specified
+        type
     :returns: A filtered dict containing only the fields
         listed in the spec
     """
 
-    filtered = {}
-    for name, value_type, default_value in spec:
-        filtered[name] = get_checked_field(document, name,
-                                           value_type, default_value)
-
-    return filtered
+    try:
+        return utils.filter_fields(document, spec)
+    except utils.UnexpectedJSONType:
+        raise errors.HTTPDocumentTypeNotSupported()
+    except utils.InvalidJSONField as ex:
+        raise errors.HTTPBadRequestBody(ex.description)
 
 
 def get_checked_field(document, name, value_type, default_value):
     """Validates and retrieves a typed field from a document.
 
-    This function attempts to look up doc[name], and raises
-    appropriate HTTP errors if the field is missing or not an
-    instance of the given type.
+    Like `zaqar.transport.utils.get_checked_field`, but raises
+    HTTP errors.
 
-    :param document: dict-like object
-    :param name: field name
-    :param value_type: expected value type, or '*' to accept any type
-    :param default_value: Default value to use if the value is missing,
-        or None to make the value required.
     :raises: HTTPBadRequest if the field is missing or not an
         instance of value_type
     :returns: value obtained from doc[name]
     """
 
     try:
-        value = document[name]
-    except KeyError:
-        if default_value is not None:
-            value = default_value
-        else:
-            description = _(u'Missing "{name}" field.').format(name=name)
-            raise errors.HTTPBadRequestBody(description)
-
-    # PERF(kgriffs): We do our own little spec thing because it is way
-    # faster than jsonschema.
-    if value_type == '*' or isinstance(value, value_type):
-        return value
-
-    description = _(u'The value of the "{name}" field must be a {vtype}.')
-    description = description.format(name=name, vtype=value_type.__name__)
-    raise errors.HTTPBadRequestBody(description)
+        return utils.get_checked_field(document, name, value_type,
+                                       default_value)
+    except utils.InvalidJSONField as ex:
+        raise errors.HTTPBadRequestBody(ex.description)
 
 
 def load(req):
@@ -214,6 +255,25 @@ def validate(validator, document):
         )
 
 
+def prefetch(iterable):
+    """Fetches the first item of an iterable, e.g. a storage cursor.
+
+    Responses streamed from a cursor are sent once their first item
+    is fetched, so storage errors can only be turned into an error
+    status before that. Fetching the first item while errors are
+    still handled also tells whether the cursor is empty.
+
+    :param iterable: iterable to fetch the first item of
+    :returns: an iterator over all the items, or None if there
+        are none
+    """
+    iterator = iter(iterable)
+    for first in iterator:
+        return itertools.chain((first,), iterator)
+
+    return None
+
+
 def message_url(message, base_path, claim_id=None):
     path = "/".join([base_path, 'messages', message['id']])
     if claim_id:
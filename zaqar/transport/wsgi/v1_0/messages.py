@@ -142,7 +142,8 @@ class CollectionResource(object):
             raise wsgi_errors.HTTPBadRequestAPI(six.text_type(ex))
 
         # Deserialize and validate the request body
-        document = wsgi_utils.deserialize(req.stream, req.content_length)
+        document = wsgi_utils.deserialize_array(req.stream,
+                                                req.content_length)
         messages = wsgi_utils.sanitize(document, MESSAGE_POST_SPEC,
                                        doctype=wsgi_utils.JSONArray)
 
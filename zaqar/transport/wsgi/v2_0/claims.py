@@ -84,9 +84,8 @@ class CollectionResource(object):
                 project=project_id,
                 **claim_options)
 
-            # Buffer claimed messages
-            # TODO(kgriffs): optimize, along with serialization (below)
-            resp_msgs = list(msgs)
+            # Claimed messages are encoded as they are read
+            resp_msgs = wsgi_utils.prefetch(msgs)
 
         except validation.ValidationFailed as ex:
             LOG.debug(ex)
@@ -99,13 +98,13 @@ class CollectionResource(object):
 
         # Serialize claimed messages, if any. This logic assumes
         # the storage driver returned well-formed messages.
-        if len(resp_msgs) != 0:
+        if resp_msgs is not None:
             base_path = req.path.rpartition('/')[0]
-            resp_msgs = [wsgi_utils.format_message_v1_1(msg, base_path, cid)
-                         for msg in resp_msgs]
+            resp_msgs = (wsgi_utils.format_message_v1_1(msg, base_path, cid)
+                         for msg in resp_msgs)
 
             resp.location = req.path + '/' + cid
-            resp.body = utils.to_json({'messages': resp_msgs})
+            resp.stream = utils.iter_json('messages', resp_msgs)
             resp.status = falcon.HTTP_201
         else:
             resp.status = falcon.HTTP_204
@@ -137,9 +136,8 @@ class ItemResource(object):
                 claim_id=claim_id,
                 project=project_id)
 
-            # Buffer claimed messages
-            # TODO(kgriffs): Optimize along with serialization (see below)
-            meta['messages'] = list(msgs)
+            # Claimed messages are encoded as they are read
+            msgs = wsgi_utils.prefetch(msgs) or ()
 
         except storage_errors.DoesNotExist as ex:
             LOG.debug(ex)
@@ -150,16 +148,14 @@ class ItemResource(object):
             raise wsgi_errors.HTTPServiceUnavailable(description)
 
         # Serialize claimed messages
-        # TODO(kgriffs): Optimize
         base_path = req.path.rsplit('/', 2)[0]
-        meta['messages'] = [wsgi_utils.format_message_v1_1(msg, base_path,
-                                                           claim_id)
-                            for msg in meta['messages']]
+        msgs = (wsgi_utils.format_message_v1_1(msg, base_path, claim_id)
+                for msg in msgs)
 
         meta['href'] = req.path
         del meta['id']
 
-        resp.body = utils.to_json(meta)
+        resp.stream = utils.iter_json('messages', msgs, head=meta)
         # status defaults to 200
 
     def on_patch(self, req, resp, project_id, queue_name, claim_id):
@@ -75,14 +75,14 @@ class CollectionResource(object):
             raise wsgi_errors.HTTPServiceUnavailable(description)
 
         # Prepare response
-        messages = list(messages)
-        if not messages:
+        messages = wsgi_utils.prefetch(messages)
+        if messages is None:
             return None
 
-        messages = [wsgi_utils.format_message_v1_1(m, base_path, m['claim_id'])
-                    for m in messages]
+        messages = (wsgi_utils.format_message_v1_1(m, base_path, m['claim_id'])
+                    for m in messages)
 
-        return {'messages': messages}
+        return utils.iter_json('messages', messages)
 
     def _get(self, req, project_id, queue_name):
         client_uuid = wsgi_helpers.get_client_uuid(req)
@@ -103,9 +103,9 @@ class CollectionResource(object):
                 client_uuid=client_uuid,
                 **kwargs)
 
-            # Buffer messages
+            # Messages are encoded as they are read from the cursor
             cursor = next(results)
-            messages = list(cursor)
+            messages = wsgi_utils.prefetch(cursor)
 
         except validation.ValidationFailed as ex:
             LOG.debug(ex)
@@ -120,26 +120,32 @@ class CollectionResource(object):
             description = _(u'Messages could not be listed.')
             raise wsgi_errors.HTTPServiceUnavailable(description)
 
-        if not messages:
-            messages = []
+        found = messages is not None
+        if not found:
+            messages = ()
 
         else:
             # Found some messages, so prepare the response
-            kwargs['marker'] = next(results)
             base_path = req.path.rsplit('/', 1)[0]
-            messages = [wsgi_utils.format_message_v1_1(m, base_path,
+            messages = (wsgi_utils.format_message_v1_1(m, base_path,
                                                        m['claim_id'])
-                        for m in messages]
-
-        return {
-            'messages': messages,
-            'links': [
-                {
-                    'rel': 'next',
-                    'href': req.path + falcon.to_query_str(kwargs)
-                }
-            ]
-        }
+                        for m in messages)
+
+        def links():
+            # The marker is only known once the cursor is exhausted
+            if found:
+                kwargs['marker'] = next(results)
+
+            return {
+                'links': [
+                    {
+                        'rel': 'next',
+                        'href': req.path + falcon.to_query_str(kwargs)
+                    }
+                ]
+            }
+
+        return utils.iter_json('messages', messages, tail=links)
 
     # ----------------------------------------------------------------------
     # Interface
@@ -159,17 +165,18 @@ class CollectionResource(object):
             LOG.debug(ex)
             raise wsgi_errors.HTTPBadRequestAPI(six.text_type(ex))
 
-        # Deserialize and validate the incoming messages
-        document = wsgi_utils.deserialize(req.stream, req.content_length)
-
-        if 'messages' not in document:
+        # Deserialize and validate the incoming messages, one at a time
+        document = wsgi_utils.deserialize_array(req.stream,
+                                                req.content_length,
+                                                key='messages')
+        try:
+            messages = wsgi_utils.sanitize(document,
+                                           self._message_post_spec,
+                                           doctype=wsgi_utils.JSONArray)
+        except utils.MissingJSONField:
             description = _(u'No messages were found in the request body.')
             raise wsgi_errors.HTTPBadRequestAPI(description)
 
-        messages = wsgi_utils.sanitize(document['messages'],
-                                       self._message_post_spec,
-                                       doctype=wsgi_utils.JSONArray)
-
         try:
             self._validate.message_posting(messages)
 
@@ -230,7 +237,7 @@ class CollectionResource(object):
             resp.status = falcon.HTTP_404
 
         else:
-            resp.body = utils.to_json(response)
+            resp.stream = response
         # status defaults to 200
 
     def on_delete(self, req, resp, project_id, queue_name):